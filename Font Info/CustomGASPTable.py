@@ -4,24 +4,16 @@ __doc__="""
 (GUI) Allows setting custom sizes and values for the GASP table in the custom parameter. *Important* Do not try to edit the custom parameter with the default dialogue afterwards.
 """
 
+import os
+import sys
 from AppKit import NSImage, NSPasteboard, NSArray
 import vanilla
 import GlyphsApp
 
-GASP_GRIDFIT = 0x01
-GASP_DOGRAY = 0x02
-GASP_SYMMETRIC_GRIDFIT = 0x04
-GASP_SYMMETRIC_SMOOTHING = 0x08
+# the shared fkett package lives next to the script folders
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fkett.gasp import GASP_TEMPLATES, CP_NAME_GASP_TABLE, parseBitMask, joinBitMask
 
-GASP_TEMPLATES = (
-  {'title': 'Glyphs standard', 'values': ((8, 0x0A), (20, 0x07), (65535, 0X0F))},
-  {'title': 'Microsoft ClearType', 'values': ((9, 0x0A), (19, 0x07), (65535, 0X0F))},
-  {'title': 'Microsoft', 'values': ((8, 0x02), (16, 0x01), (65535, 0X03))},
-  {'title': 'URW ClearType', 'values': ((65535, 0X0F),)},
-  {'title': 'URW', 'values': ((8, 0x02), (65535, 0X03))}
-)
-
-CP_NAME_GASP_TABLE = 'GASP Table'
 CP_VALUE_NEW_VALUE = 'New Value'
 CP_VALUE_STD_GASP = GASP_TEMPLATES[0]['values']
 
@@ -367,20 +359,10 @@ class CustomGASPTable(object):
     return s
   
   def parseBitMask(self, value):
-    return bool(value & GASP_GRIDFIT), bool(value & GASP_DOGRAY), bool(value & GASP_SYMMETRIC_GRIDFIT), bool(value & GASP_SYMMETRIC_SMOOTHING)
+    return parseBitMask(value)
   
   def joinBitMask(self, gridfit, dogray, symmetric_gridfit, symmetric_smoothing):
-    value = 0x00
-    if gridfit:
-      value |= GASP_GRIDFIT
-    if dogray:
-      value |= GASP_DOGRAY
-    if symmetric_gridfit:
-      value |= GASP_SYMMETRIC_GRIDFIT
-    if symmetric_smoothing:
-      value |= GASP_SYMMETRIC_SMOOTHING
-    
-    return value
+    return joinBitMask(gridfit, dogray, symmetric_gridfit, symmetric_smoothing)
   
   def writeCPToLocation(self, pointer):
     pointer[CP_NAME_GASP_TABLE] = self.generateCPFromTableList(self.w.tableEntries)
@@ -1,19 +1,28 @@
 #MenuTitle: Change glyph width (symmetrically)
 # -*- coding: utf-8 -*-
 __doc__="""
-(GUI) Changes the width of selected glyphs symmetrically (the increase is distributed on LSB/RSB evenly).
+(GUI) Changes the width of selected glyphs symmetrically (the increase is distributed on LSB/RSB evenly), in the selected or in all masters. Widths can also come from a rules file (.json or .csv) that maps glyph names or patterns to widths, per master if needed, see fkett/widthrules.py. Optionally, composites move along with their changed components.
 """
 
+import os
+import sys
 import vanilla
 import GlyphsApp
 
+# the shared fkett package lives next to the script folders
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fkett.components import ComponentGraph
+from fkett.metrics import changeWidthsSymmetrically, changeWidthsWithComponents, masterLayers
+from fkett.widthrules import WidthRuleError, loadRules, targetWidths
+
 class ChangeGlyphWidthSym(object):
   def __init__(self, defaultWidth = 600):
     m = 10
     t = (150, 17)
     i = (150, 22)
+    c = (150, 20)
     b = (100, 20)
-    s = (max(t[0], i[0]) + 2 * m, t[1] + i[1] + b[1] + 7 * m)
+    s = (max(t[0], i[0], c[0], 2 * b[0] + m) + 2 * m, t[1] + i[1] + 2 * c[1] + b[1] + 9 * m)
     
     self.w = vanilla.FloatingWindow(
       s, # window size
@@ -33,6 +42,24 @@ class ChangeGlyphWidthSym(object):
       str(defaultWidth),
       sizeStyle = "regular"
     )
+    self.w.allMasters = vanilla.CheckBox(
+      (m, t[1] + i[1] + 3 * m, c[0], c[1]),
+      "All masters",
+      value = False,
+      sizeStyle = "regular"
+    )
+    self.w.composites = vanilla.CheckBox(
+      (m, t[1] + i[1] + c[1] + 4 * m, c[0], c[1]),
+      "Move composites",
+      value = False,
+      sizeStyle = "regular"
+    )
+    self.w.rules = vanilla.Button(
+      (m, -m - b[1], b[0], b[1]),
+      "Rules…",
+      sizeStyle = "regular",
+      callback = self.applyRules
+    )
     self.w.run = vanilla.Button(
       (-m - b[0], -m - b[1], b[0], b[1]),
       "Change",
@@ -40,16 +67,56 @@ class ChangeGlyphWidthSym(object):
       callback = self.resizeWidths
     )
     self.w.setDefaultButton(self.w.run)
+    # the component graph is built once per font while the window is open
+    self.graph = None
+    self.graphFont = None
     self.w.open()
     self.w.makeKey()
   
+  def selectedLayers(self):
+    font = Glyphs.font
+    if self.w.allMasters.get():
+      glyphs = dict((l.parent.name, l.parent) for l in font.selectedLayers)
+      return masterLayers(glyphs.values())
+    return font.selectedLayers
+
+  def componentGraph(self, font):
+    if self.graph is None or self.graphFont is not font:
+      self.graph = ComponentGraph(font.glyphs)
+      self.graphFont = font
+    return self.graph
+
+  def changeWidths(self, layers, widths):
+    font = Glyphs.font
+    font.disableUpdateInterface()
+    try:
+      if self.w.composites.get():
+        return changeWidthsWithComponents(layers, widths, self.componentGraph(font), font.glyphs)
+      else:
+        return changeWidthsSymmetrically(layers, widths)
+    finally:
+      font.enableUpdateInterface()
+
   def resizeWidths(self, sender):
-    for e in Glyphs.font.selectedLayers:
-      d = int(self.w.input.get()) - e.width
-      p = int(d / 2)
-      r = d % 2
-      
-      e.LSB += p + r
-      e.RSB += p
+    self.changeWidths(self.selectedLayers(), int(self.w.input.get()))
+
+  def applyRules(self, sender):
+    path = GlyphsApp.GetOpenFile(message = "Width rules", filetypes = ["json", "csv"])
+    if not path:
+      return
+
+    font = Glyphs.font
+    selected = self.selectedLayers()
+    glyphs = dict((l.parent.name, l.parent) for l in selected)
+    masters = [m for m in font.masters if m.id in set(l.associatedMasterId for l in selected)]
+
+    try:
+      layers, widths = targetWidths(loadRules(path), glyphs.values(), masters, font.glyphs)
+    except (WidthRuleError, IOError, ValueError) as e:
+      print("Width rules: %s" % e)
+      return
+
+    changed = self.changeWidths(layers, widths)
+    print("Width rules: changed %d of %d layers" % (changed, len(selected)))
 
 ChangeGlyphWidthSym()
\ No newline at end of file
@@ -1,18 +1,54 @@
 #MenuTitle: Round Kerning to nearest 5
 # -*- coding: utf-8 -*-
 __doc__="""
-Round Kerning values of the selected Master to the nearest 5 (e.g. -7 > -10, 17 > 15, 23 > 25).
+Round Kerning values of the selected Master (or all Masters) to the nearest 5 (e.g. -7 > -10, 17 > 15, 23 > 25).
 """
 
+import io
+import os
+import sys
+
+# the shared fkett package lives next to the script folders
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fkett.kerning import QuantizePolicy, quantizeKerning, quantizeKerningIncremental, refreshFingerprints, buildGroupIndex, dependentLeftIds, compactKerning, applyKerning
+
 PRECISION = 5
+MODE = 'round' # 'round' (halves to even), 'halfAwayFromZero', 'floor', 'ceil' or 'towardZero'
+PAIR_PRECISION = {} # e.g. {('@MMK_L_T', '@MMK_R_o'): 10}
+REMOVE_ZERO = False # remove pairs that are rounded to 0
+THRESHOLD = None # remove pairs whose rounded absolute value is below this, e.g. 5
+ALL_MASTERS = False # round the kerning of all masters in one go, not just the selected one
+COMPACT = True # remove exceptions that are equal to the group kerning they would inherit after rounding
+INCREMENTAL = True # only round rows that changed since the last run (fingerprints are kept in the font's userData)
+
+FINGERPRINTS_KEY = 'com.fkett.RoundKerningToNearestFive.fingerprints'
 
 font = Glyphs.font
-masterId = font.selectedFontMaster.id
-newKerning = list()
-
-for leftId, kerningPair in font.kerning[masterId].items():
-  for rightId, kerningValue in kerningPair.items():
-    if kerningValue % PRECISION:
-      newKerningValue = round(kerningValue / PRECISION) * PRECISION
-      print('%s%s: was %s, now %s' % (leftId, rightId, kerningValue, newKerningValue))
-      font.kerning[masterId][leftId][rightId] = newKerningValue
\ No newline at end of file
+masterIds = [m.id for m in font.masters if m.id in font.kerning] if ALL_MASTERS else [font.selectedFontMaster.id]
+policy = QuantizePolicy(PRECISION, MODE, PAIR_PRECISION, REMOVE_ZERO, THRESHOLD)
+log = io.StringIO()
+
+if INCREMENTAL:
+  newKerning, dirtyLeftIds, fingerprints = quantizeKerningIncremental(font.kerning, font.userData[FINGERPRINTS_KEY], masterIds, policy, log)
+else:
+  newKerning = quantizeKerning(font.kerning, masterIds, policy, log)
+  dirtyLeftIds = dict((m, None) for m in newKerning)
+
+removed = 0
+if COMPACT:
+  # in incremental runs only the changed rows are compacted, and the glyph rows that inherit from a changed group row
+  leftGroups, rightGroups = buildGroupIndex(font.glyphs)
+  for masterId in list(newKerning.keys()):
+    dirtyLeftIds[masterId] = dependentLeftIds(newKerning[masterId], dirtyLeftIds[masterId], leftGroups)
+    compacted, n = compactKerning(newKerning, leftGroups, rightGroups, [masterId], log, dirtyLeftIds[masterId])
+    newKerning[masterId] = compacted[masterId]
+    removed += n
+
+applyKerning(font, newKerning)
+if INCREMENTAL:
+  refreshFingerprints(fingerprints, newKerning, dirtyLeftIds)
+  font.userData[FINGERPRINTS_KEY] = fingerprints
+
+print(log.getvalue())
+if COMPACT:
+  print('Removed %d redundant exceptions' % removed)
\ No newline at end of file
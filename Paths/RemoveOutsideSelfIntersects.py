@@ -1,39 +1,104 @@
 #MenuTitle: Remove Outside Self-Intertsections
 # -*- coding: utf-8 -*-
 __doc__="""
-Finds self-intersections on the outside (mind the correct path direction) of the selected glyphs and removes them.
+Finds self-intersections on the outside (mind the correct path direction) of the selected glyphs and removes them. Set REPORT at the top of the script for a dry run that only writes what would change, and APPLY_REPORT to apply such a report.
 """
 
-from GlyphsApp import GSPathPen
+import collections
+import io
+import os
+import sys
+from GlyphsApp import GSNode, GSPath
+
+# the shared fkett package lives next to the script folders
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fkett.overlaps import applyReport, cleanLayers, contourArea, contoursHash, readReport, removeOutsideLoops, writeReport
+
+REPORT = None # dry run: change nothing, write every contour that would change to this file (JSON lines), e.g. '~/Desktop/overlaps.jsonl'
+APPLY_REPORT = None # change only the contours listed in this report (written by a dry run), not the selected glyphs
 
 changedGlyphs = []
+# contours that cannot cross themselves are skipped before the geometry is done
+stats = collections.Counter()
 
-for thisLayer in Font.selectedLayers:
-	testString = thisLayer.compareString()
+def layerContours(thisLayer):
+	return [([(n.x, n.y, n.type, n.smooth) for n in p.nodes], p.closed) for p in thisLayer.paths]
 
-	layerPaths = [p for p in thisLayer.paths]
-	
-	thisLayer.paths = []
+def replaceContours(thisLayer, changes):
+	changedNodes = dict((i, nodes) for i, nodes, loops, areaChange in changes)
+	newPaths = []
 
-	for eachPath in layerPaths:
-		specialSituation = False
-		
-		if eachPath.nodeAtIndex_(-1).type == CURVE:
-			specialSituation = True
-		
-		pen = GSPathPen.alloc().init()
-		eachPath.drawInPen_(pen)
-		eachPath = pen.layer().paths
-		eachPath = eachPath[0]
-		eachPath.makeNodeFirst_(eachPath.nodeAtIndex_(0))
-		if specialSituation:
-			eachPath.removeNodeCheckKeepShape_(eachPath.nodeAtIndex_(-2))
-		thisLayer.addPath_(eachPath)
+	for i, eachPath in enumerate(thisLayer.paths):
+		if i in changedNodes:
+			eachPath = GSPath()
+			for x, y, nodeType, smooth in changedNodes[i]:
+				node = GSNode((x, y), nodeType)
+				node.smooth = smooth
+				eachPath.nodes.append(node)
+			eachPath.closed = True
+		newPaths.append(eachPath)
 
+	thisLayer.paths = []
+	for eachPath in newPaths:
+		thisLayer.addPath_(eachPath)
 	thisLayer.checkConnections()
+	changedGlyphs.append(thisLayer.parent.name)
+
+if APPLY_REPORT:
+	with io.open(os.path.expanduser(APPLY_REPORT), encoding = "utf-8") as f:
+		for (glyphName, layerId), records in readReport(f):
+			glyph = Font.glyphs[glyphName]
+			thisLayer = glyph.layers[layerId] if glyph else None
+			if thisLayer is None:
+				stats['stale'] += len(records)
+				continue
+			
+			# contours edited since the report was written are left alone
+			changes, stale = applyReport(layerContours(thisLayer), records)
+			stats['stale'] += len(stale)
+			if changes:
+				replaceContours(thisLayer, changes)
 	
-	if testString != thisLayer.compareString():
-		changedGlyphs.append(thisLayer.parent.name)
+	print("Applied %s, %d contours were edited since and skipped" % (APPLY_REPORT, stats['stale']))
+
+else:
+	report = io.open(os.path.expanduser(REPORT), "w", encoding = "utf-8") if REPORT else None
+
+	for thisLayer in Font.selectedLayers:
+		contours = layerContours(thisLayer)
+
+		# layers that were left clean by an earlier run and not edited since have the same hash
+		layerKey = (Font.filepath or Font.familyName, thisLayer.parent.name, thisLayer.layerId)
+		layerHash = contoursHash(contours)
+		if cleanLayers.get(layerKey) == layerHash:
+			stats['unchanged'] += 1
+			continue
+
+		changes = []
+		for i, (nodes, closed) in enumerate(contours):
+			newNodes, loops = removeOutsideLoops(nodes, closed, stats = stats)
+			if loops:
+				changes.append((i, newNodes, loops, contourArea(newNodes) - contourArea(nodes)))
+
+		if report is not None:
+			# written right away, so the report of a large run does not pile up in memory
+			writeReport(report, thisLayer.parent.name, thisLayer.associatedMasterId, thisLayer.layerId, contours, changes)
+			if changes:
+				changedGlyphs.append(thisLayer.parent.name)
+			continue
+
+		newContours = list(contours)
+		for i, newNodes, loops, areaChange in changes:
+			newContours[i] = (newNodes, contours[i][1])
+		newHash = contoursHash(newContours)
+		if newHash != layerHash:
+			replaceContours(thisLayer, changes)
+		cleanLayers[layerKey] = newHash
+
+	if report is not None:
+		report.close()
+		print("Dry run, nothing was changed. Report written to %s" % REPORT)
+	print("Skipped %d clean contours, checked %d; %d layers unchanged since the last run" % (stats['skipped'], stats['processed'], stats['unchanged']))
 
 if changedGlyphs:
 	tabString = "/"+"/".join(set(changedGlyphs))
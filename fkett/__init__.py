@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Shared helpers for the scripts in this collection. Nothing in here depends on the Glyphs app, so the modules can also be used headless."""
@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+"""Headless avar solver: maps the proprietary axis values of the instances to CSS compliant values. Works on plain font data, see fontData():
+
+  {
+    'axes': [{'name': 'Weight', 'tag': 'wght'}],
+    'customParameters': {'Variable Font Origin': 'm02'},
+    'masters': [{'id': 'm01', 'name': 'Thin', 'axes': [100], 'customParameters': {'Axis Location': [{'Axis': 'Weight', 'Location': 100}]}}],
+    'instances': [{'name': 'Thin', 'active': True, 'axes': [100]}],
+  }
+
+Target values are given per axis as dict( instance index: CSS compliant value ), like the script collects them."""
+
+import bisect
+import collections
+import concurrent.futures
+import hashlib
+import io
+import json
+import math
+import os
+import struct
+
+from fkett import glyphsfile, sfnt
+
+AvarFactors = collections.namedtuple('AvarFactors', 'fromValue toValue')
+
+DEFAULT_FACTORS = (AvarFactors(-1, -1), AvarFactors(0, 0), AvarFactors(1, 1))
+
+# factors closer than this are merged into one mapping, well below the F2Dot14 resolution of the table (1 / 16384)
+EPSILON = 1e-6
+
+class AvarError(ValueError):
+  pass
+
+class TargetValueData(object):
+  def __init__(self, **kwargs):
+    self.default = float()
+    self.minimum = None
+    self.maximum = None
+    self.values = list()
+
+    if 'default' in kwargs:
+      self.default = float(kwargs['default'])
+    if 'minimum' in kwargs:
+      self.minimum = float(kwargs['minimum'])
+    if 'maximum' in kwargs:
+      self.maximum = float(kwargs['maximum'])
+    if 'values' in kwargs:
+      self.values = list(kwargs['values'])
+
+# TARGET_VALUE_DATA: [axis tag].values[target value] = list( name parts )
+TARGET_VALUE_DATA = {
+  'wght': TargetValueData(
+    default = 400,
+    minimum = 1,
+    maximum = 1000,
+    values = (
+      (50, ('hairline', 'extrathin', 'ultrathin',)),
+      (100, ('thin',)),
+      (200, ('extralight', 'ultralight',)),
+      (300, ('light',)),
+      (400, ('regular', 'normal',)),
+      (500, ('medium',)),
+      (600, ('semibold', 'demibold',)),
+      (700, ('bold',)),
+      (800, ('extrabold', 'ultrabold',)),
+      (900, ('black', 'heavy',)),
+      (950, ('extrablack', 'ultrablack',)),
+    )
+  ),
+  'wdth': TargetValueData(
+    default = 100,
+    minimum = 0.1,
+    values = (
+      (50, ('compressed', 'extracondensed', 'ultracondensed',)),
+      (75, ('condensed',)),
+      (90, ('narrow',)),
+      (100, ('',)),
+      (110, ('wide',)),
+      (125, ('extended',)),
+      (150, ('expanded', 'extraextended', 'ultraextended',)),
+    )
+  ),
+  'opsz': TargetValueData(
+    default = 12,
+    minimum = 0.1,
+    values = (
+      (6, ('caption',)),
+      (12, ('text',)),
+      (24, ('subhead',)),
+      (36, ('display',)),
+    )
+  ),
+}
+
+class TargetValueClassifier(object):
+  """Finds the CSS compliant values an instance name suggests, e.g. 700 for wght and 75 for wdth in "Condensed Bold". The vocabulary is compiled once into dict( words: list( (axis tag, rank, value) ) ), and each name is split into words and looked up once. Names of several words ("extra bold") match consecutive words, on each axis the value listed first wins."""
+
+  def __init__(self, targetValueData = TARGET_VALUE_DATA):
+    # targetValueData: dict( axis tag: TargetValueData ), see TARGET_VALUE_DATA and loadTargetValueData()
+    self.targetValueData = targetValueData
+    self.words = dict()
+    self.maxWords = 1
+    for tag, axisTargetValueData in targetValueData.items():
+      for rank, (targetValue, targetNames) in enumerate(axisTargetValueData.values):
+        for n in targetNames:
+          key = tuple(n.lower().split())
+          if key:
+            self.words.setdefault(key, list()).append((tag, rank, targetValue))
+            self.maxWords = max(self.maxWords, len(key))
+    # cache: dict( instance name: dict( axis tag: value ) )
+    self.cache = dict()
+
+  def classify(self, instanceName):
+    """Returns dict( axis tag: value ) of the axes the name has a word for."""
+    found = self.cache.get(instanceName)
+    if found is not None:
+      return found
+
+    words = instanceName.lower().split()
+    # best: dict( axis tag: (rank, value) )
+    best = dict()
+    for start in range(len(words)):
+      for end in range(start + 1, min(start + self.maxWords, len(words)) + 1):
+        for tag, rank, value in self.words.get(tuple(words[start:end]), ()):
+          if tag not in best or rank < best[tag][0]:
+            best[tag] = (rank, value)
+
+    found = dict((tag, value) for tag, (rank, value) in best.items())
+    self.cache[instanceName] = found
+    return found
+
+  def targetValues(self, instanceName, axisTags):
+    """Returns the value of each axis: the one the name suggests, the axis default if none, None for axes without vocabulary."""
+    found = self.classify(instanceName)
+    values = list()
+    for tag in axisTags:
+      if tag in found:
+        values.append(found[tag])
+      elif tag in self.targetValueData:
+        values.append(self.targetValueData[tag].default)
+      else:
+        values.append(None)
+    return values
+
+def loadTargetValueData(path, targetValueData = TARGET_VALUE_DATA):
+  """Returns targetValueData extended by the vocabulary in a JSON file. Its names are tried before the ones of targetValueData, new axis tags are added:
+
+  {
+    "wght": {"values": {"350": ["book"], "450": ["text", "buch"]}},
+    "GRAD": {"default": 0, "minimum": -200, "maximum": 150, "values": {"-100": ["lowgrade"], "100": ["highgrade"]}}
+  }"""
+  with io.open(path, encoding = 'utf-8-sig') as f:
+    vocabulary = json.load(f)
+  if not isinstance(vocabulary, dict):
+    raise AvarError('%s: the vocabulary must be a JSON object of axis tags' % path)
+
+  merged = dict(targetValueData)
+  for tag, entry in vocabulary.items():
+    if not isinstance(entry, dict) or not isinstance(entry.get('values', {}), dict):
+      raise AvarError('%s: %s must be an object with "values": {value: [names]}' % (path, tag))
+    values = list()
+    for value, names in entry.get('values', {}).items():
+      try:
+        value = float(value)
+      except ValueError:
+        raise AvarError('%s: %s value "%s" is not a number' % (path, tag, value))
+      values.append((int(value) if value.is_integer() else value, tuple(n.lower() for n in ([names] if isinstance(names, str) else names))))
+
+    base = targetValueData.get(tag)
+    kwargs = dict()
+    for key in ('default', 'minimum', 'maximum'):
+      if key in entry:
+        kwargs[key] = entry[key]
+      elif base is not None and getattr(base, key) is not None:
+        kwargs[key] = getattr(base, key)
+    merged[tag] = TargetValueData(values = values + (base.values if base is not None else []), **kwargs)
+
+  return merged
+
+CLASSIFIER = TargetValueClassifier()
+
+ORIGIN_PARAMETERS = ('Variable Font Origin', 'Variation Font Origin')
+
+def plainParameters(customParameters, names):
+  parameters = dict()
+  for name in names:
+    if name in customParameters:
+      parameters[name] = customParameters[name]
+  return parameters
+
+def plainAxisLocation(value):
+  # the app gives NSArray( NSDictionary ), .glyphs files give lists of dicts with strings or numbers
+  if value is None:
+    return None
+  return [{'Axis': str(l['Axis']), 'Location': float(l['Location'])} for l in value]
+
+def fontData(font):
+  """Returns the plain data of an app font or a fkett.glyphsfile.Font that the solver needs."""
+  data = {
+    'axes': [{'name': str(x['Name']), 'tag': str(x['Tag'])} for x in font.axes],
+    'customParameters': dict((k, str(v)) for k, v in plainParameters(font.customParameters, ORIGIN_PARAMETERS).items()),
+    'masters': list(),
+    'instances': list(),
+  }
+  for m in font.masters:
+    master = {'id': str(m.id), 'name': str(m.name), 'axes': [float(v) for v in m.axes], 'customParameters': dict()}
+    if 'Axis Location' in m.customParameters:
+      master['customParameters']['Axis Location'] = plainAxisLocation(m.customParameters['Axis Location'])
+    data['masters'].append(master)
+  for i in font.instances:
+    data['instances'].append({'name': str(i.name), 'active': bool(i.active), 'axes': [float(v) for v in i.axes]})
+  return data
+
+def originMaster(data):
+  """Returns the master set as Variable Font Origin or None."""
+  for name in ORIGIN_PARAMETERS:
+    masterId = data['customParameters'].get(name)
+    if masterId is not None:
+      # the app also accepts master names
+      for m in data['masters']:
+        if m['id'] == masterId or m['name'] == masterId:
+          return m
+      raise AvarError('%s "%s" is not a master' % (name, masterId))
+  return None
+
+def axisLocation(master, a, axisName):
+  """Returns the Axis Location of a master on axis a or None."""
+  locations = master['customParameters'].get('Axis Location')
+  if not locations:
+    return None
+  for l in locations:
+    if l['Axis'] == axisName:
+      return float(l['Location'])
+  # unnamed entries, in the order of the axes
+  if a < len(locations):
+    return float(locations[a]['Location'])
+  return None
+
+def extremeMasters(data, a):
+  """Returns the masters with the smallest and the largest value on axis a."""
+  return min(data['masters'], key = lambda m: m['axes'][a]), max(data['masters'], key = lambda m: m['axes'][a])
+
+def hasVariableFontOrigin(data):
+  return any(name in data['customParameters'] for name in ORIGIN_PARAMETERS)
+
+def hasAxisLocationOnOrigin(data):
+  origin = originMaster(data)
+  return origin is not None and 'Axis Location' in origin['customParameters']
+
+def hasAxisLocationOnExtremes(data):
+  for a, _ in enumerate(data['axes']):
+    for m in extremeMasters(data, a):
+      if 'Axis Location' not in m['customParameters']:
+        return False
+  return True
+
+def defaultTargetValues(data, classifier = None):
+  """Returns list( axis index: dict( instance index: CSS compliant value ) ) for the active instances, from their names."""
+  # classifier: TargetValueClassifier, default: the built-in vocabulary
+  classifier = classifier or CLASSIFIER
+  tags = [x['tag'] for x in data['axes']]
+  targetValues = [dict() for _ in tags]
+  for j, i in enumerate(data['instances']):
+    if i['active']:
+      for a, value in enumerate(classifier.targetValues(i['name'], tags)):
+        targetValues[a][j] = value
+  return targetValues
+
+class AxisMap(object):
+  """One axis of the font: its masters as breakpoints, sorted by design coordinate, each with its Axis Location."""
+
+  def __init__(self, name, breakpoints, designDefault, userDefault):
+    # breakpoints: list( (design coordinate, Axis Location) ), sorted
+    self.name = name
+    self.designs = [d for d, _ in breakpoints]
+    self.users = [u for _, u in breakpoints]
+    self.designDefault = designDefault
+    self.userDefault = userDefault
+
+  def userValue(self, design):
+    """Returns the Axis Location of a design coordinate, piecewise linear between the masters."""
+    i = bisect.bisect_left(self.designs, design)
+    if i < len(self.designs) and self.designs[i] == design:
+      return self.users[i]
+    # outside the masters, the outer segments go on
+    i = min(max(i, 1), len(self.designs) - 1)
+    d0, d1 = self.designs[i - 1], self.designs[i]
+    u0, u1 = self.users[i - 1], self.users[i]
+    return u0 + (design - d0) * (u1 - u0) / (d1 - d0)
+
+  def normalizeDesign(self, design):
+    return normalize(design, self.designDefault, self.designs[0], self.designs[-1])
+
+  def normalizeUser(self, user):
+    return normalize(user, self.userDefault, self.users[0], self.users[-1])
+
+  def denormalizeUser(self, value):
+    return denormalize(value, self.userDefault, self.users[0], self.users[-1])
+
+  def breakpointFactors(self):
+    """Returns the AvarFactors of the masters."""
+    return [AvarFactors(self.normalizeUser(u), self.normalizeDesign(d)) for d, u in zip(self.designs, self.users)]
+
+def normalize(value, default, minimum, maximum):
+  # -1 … 0 … 1, each side on its own scale
+  if value < default:
+    return (value - default) / (default - minimum) if default > minimum else -1.0
+  if value > default:
+    return (value - default) / (maximum - default) if maximum > default else 1.0
+  return 0.0
+
+def denormalize(value, default, minimum, maximum):
+  # the inverse of normalize
+  if value < 0:
+    return default + value * (default - minimum)
+  return default + value * (maximum - default)
+
+def axisMaps(data):
+  """Returns list( AxisMap ), one per axis, from one pass over the masters."""
+  origin = originMaster(data)
+  if origin is None:
+    raise AvarError('Variable Font Origin is not set')
+
+  names = [x['name'] for x in data['axes']]
+  # locations: list( axis index: dict( design coordinate: Axis Location ) )
+  locations = [dict() for _ in names]
+  extremes = [[None, None] for _ in names]
+  for m in data['masters']:
+    for a, name in enumerate(names):
+      design = float(m['axes'][a])
+      if extremes[a][0] is None or design < extremes[a][0]:
+        extremes[a][0] = design
+      if extremes[a][1] is None or design > extremes[a][1]:
+        extremes[a][1] = design
+
+      user = axisLocation(m, a, name)
+      if user is None:
+        continue
+      if locations[a].setdefault(design, user) != user:
+        raise AvarError('Masters at %s %g have different Axis Locations: %g and %g' % (name, design, locations[a][design], user))
+
+  maps = list()
+  for a, name in enumerate(names):
+    designDefault = float(origin['axes'][a])
+    if designDefault not in locations[a]:
+      raise AvarError('Axis Location of %s is not set on the Variable Font Origin master' % name)
+    if extremes[a][0] not in locations[a] or extremes[a][1] not in locations[a]:
+      raise AvarError('Axis Location of %s is not set on the extreme masters' % name)
+
+    breakpoints = sorted(locations[a].items())
+    if len(breakpoints) < 2:
+      raise AvarError('All masters are at %s %g, the axis has no range' % (name, breakpoints[0][0]))
+    for (d0, u0), (d1, u1) in zip(breakpoints, breakpoints[1:]):
+      if u1 < u0:
+        raise AvarError('Axis Locations of %s decrease from %g to %g between the masters at %g and %g' % (name, u0, u1, d0, d1))
+    maps.append(AxisMap(name, breakpoints, designDefault, locations[a][designDefault]))
+
+  return maps
+
+def axisFactors(axisMap, originValues, targetValues):
+  """Returns list( AvarFactors ) for parallel lists of design coordinates and target values on one axis. A target value of None keeps the Axis Location of the design coordinate."""
+  factors = list()
+  for originValue, targetValue in zip(originValues, targetValues):
+    if targetValue is None:
+      targetValue = axisMap.userValue(originValue)
+    factors.append(AvarFactors(axisMap.normalizeUser(targetValue), axisMap.normalizeDesign(originValue)))
+  return factors
+
+def quantizedFactors(factors, epsilon):
+  # dict key of factors that are equal within epsilon
+  return (int(round(factors.fromValue / epsilon)), int(round(factors.toValue / epsilon)))
+
+def mergeFactors(instances, factors, epsilon = EPSILON, fixed = DEFAULT_FACTORS):
+  """Merges instances whose factors are equal within epsilon and adds the fixed factors. Returns list( (list( instance index ), AvarFactors) ), sorted by factors."""
+  # fixed: factors that are always mapped, e.g. DEFAULT_FACTORS
+  # merged: dict( quantized factors: (list( instance index ), AvarFactors) ), the fixed factors first, so instances on them keep their exact values
+  merged = dict()
+  for d in fixed:
+    merged.setdefault(quantizedFactors(d, epsilon), (list(), d))
+
+  for j, f in zip(instances, factors):
+    key = quantizedFactors(f, epsilon)
+    if key in merged:
+      merged[key][0].append(j)
+    else:
+      merged[key] = ([j], f)
+
+  return [merged[key] for key in sorted(merged)]
+
+def instanceColumns(data, targetValues = None):
+  """Returns the active instances as columns: (list( instance index ), list( axis index: list( design coordinate ) ), list( axis index: list( target value or None ) ))."""
+  # targetValues: list( axis index: dict( instance index: CSS compliant value or None ) ), default: from the instance names
+  if targetValues is None:
+    targetValues = defaultTargetValues(data)
+
+  instances = [j for j, i in enumerate(data['instances']) if i['active']]
+  coordinates = list()
+  targets = list()
+  for a, _ in enumerate(data['axes']):
+    coordinates.append([float(data['instances'][j]['axes'][a]) for j in instances])
+    targets.append([None if targetValues[a].get(j) is None else float(targetValues[a][j]) for j in instances])
+  return instances, coordinates, targets
+
+def solveAvar(data, targetValues = None, epsilon = EPSILON):
+  """Returns the avar mapping of every axis: list( axis index: list( (list( instance index ), AvarFactors) ) ), each sorted by factors.
+
+Each instance maps its target value to its design coordinate, both normalized. Masters with an Axis Location between the extremes are mapped as well, unless an instance already maps their design coordinate or their Axis Location. Every from value is mapped once; target values that would have to map to two design coordinates raise AvarError."""
+  instances, coordinates, targets = instanceColumns(data, targetValues)
+
+  mapping = list()
+  for a, axisMap in enumerate(axisMaps(data)):
+    factors = axisFactors(axisMap, coordinates[a], targets[a])
+
+    keys = [quantizedFactors(f, epsilon) for f in factors]
+    mappedFrom = set(k[0] for k in keys)
+    mappedTo = set(k[1] for k in keys)
+    breakpoints = [f for f in axisMap.breakpointFactors() if quantizedFactors(f, epsilon)[0] not in mappedFrom and quantizedFactors(f, epsilon)[1] not in mappedTo]
+    merged = mergeFactors(instances, factors, epsilon, list(DEFAULT_FACTORS) + breakpoints)
+
+    # merged is sorted by factors, mappings of one from value are neighbours
+    for (i0, f0), (i1, f1) in zip(merged, merged[1:]):
+      if quantizedFactors(f0, epsilon)[0] == quantizedFactors(f1, epsilon)[0]:
+        labels = [(", ").join([data['instances'][j]['name'] for j in i]) or 'the masters' for i in (i0, i1)]
+        raise AvarError('%s and %s map %s %g to different design coordinates' % (labels[0], labels[1], axisMap.name, axisMap.denormalizeUser(f0.fromValue)))
+    mapping.append(merged)
+
+  return mapping
+
+def avarTTX(data, mapping):
+  """Returns the avar mapping as TTX XML."""
+  output = list()
+  output.append("  <avar>")
+
+  for a, f in enumerate(mapping):
+    output.append("    <segment axis=\"%s\">   <!-- %s -->" % (data['axes'][a]['tag'], data['axes'][a]['name']))
+
+    for i, v in f:
+      output.append("      <mapping from=\"%f\" to=\"%f\"/>   <!-- %s -->" % (v.fromValue, v.toValue, (", ").join([data['instances'][j]['name'] for j in i])))
+
+    output.append("    </segment>")
+
+  output.append("  </avar>")
+  return ("\n").join(output)
+
+def f2Dot14(value):
+  # rounded like fontTools, clamped to the F2Dot14 range
+  return max(-0x8000, min(0x7FFF, int(math.floor(value * 16384 + 0.5))))
+
+def segmentMap(factors):
+  """Returns the sorted list( (from, to) ) in F2Dot14 units of the factors of one axis. Mappings that round onto one from value keep the first one, the default factors are kept exactly."""
+  # factors: list( (list( instance index ), AvarFactors) )
+  pairs = dict()
+  for _, f in factors:
+    pairs.setdefault(f2Dot14(f.fromValue), f2Dot14(f.toValue))
+  for d in DEFAULT_FACTORS:
+    pairs[f2Dot14(d.fromValue)] = f2Dot14(d.toValue)
+  return sorted(pairs.items())
+
+def compileAvar(data, mapping, axisTags = None):
+  """Returns the avar mapping as binary avar table (version 1.0)."""
+  # axisTags: the axes of the fvar table in their order, default: the axes of data; axes without mapping keep the identity
+  segments = dict((data['axes'][a]['tag'], f) for a, f in enumerate(mapping))
+  if axisTags is None:
+    axisTags = [x['tag'] for x in data['axes']]
+
+  out = [struct.pack('>HHHH', 1, 0, 0, len(axisTags))]
+  for tag in axisTags:
+    pairs = segmentMap(segments.get(tag, ()))
+    out.append(struct.pack('>H', len(pairs)))
+    out.append(b''.join(struct.pack('>hh', fromValue, toValue) for fromValue, toValue in pairs))
+  return b''.join(out)
+
+def mapF2Dot14(pairs, froms, value):
+  """Maps a normalized coordinate in F2Dot14 units through one segment map like a renderer does: clamped to -1 … 1, piecewise linear, rounded to F2Dot14."""
+  # pairs: segmentMap(), froms: its from values
+  value = max(-0x4000, min(0x4000, value))
+  i = bisect.bisect_left(froms, value)
+  if froms[i] == value:
+    return pairs[i][1]
+  (from0, to0), (from1, to1) = pairs[i - 1], pairs[i]
+  return int(math.floor(to0 + (to1 - to0) * (value - from0) / float(from1 - from0) + 0.5))
+
+InstanceCheck = collections.namedtuple('InstanceCheck', 'instance axis expected actual error')
+
+# errors up to two F2Dot14 units are rounding
+TOLERANCE = 2.0 / 16384
+
+def verifyAvar(data, mapping, targetValues = None):
+  """Sends every active instance's target value through the compiled segment maps and compares the result with its normalized design coordinate. Returns list( InstanceCheck ), axis by axis; expected, actual and error are normalized, after F2Dot14 quantization."""
+  # targetValues: the ones mapping was solved with
+  instances, coordinates, targets = instanceColumns(data, targetValues)
+
+  checks = list()
+  for a, axisMap in enumerate(axisMaps(data)):
+    pairs = segmentMap(mapping[a])
+    froms = [f for f, _ in pairs]
+    for j, design, target in zip(instances, coordinates[a], targets[a]):
+      if target is None:
+        target = axisMap.userValue(design)
+      expected = axisMap.normalizeDesign(design)
+      actual = mapF2Dot14(pairs, froms, f2Dot14(axisMap.normalizeUser(target))) / 16384.0
+      checks.append(InstanceCheck(j, a, expected, actual, abs(actual - expected)))
+
+  return checks
+
+def verificationReport(data, checks, tolerance = TOLERANCE):
+  """Returns the maximum error and the instances off by more than tolerance as text lines. Quantizing both ends of a mapping to F2Dot14 alone can cost a little more than one unit (1 / 16384)."""
+  if not checks:
+    return ['no active instances']
+  worst = max(checks, key = lambda c: c.error)
+  lines = ['maximum error %.6f (%.2f F2Dot14 units) at %s, %s' % (worst.error, worst.error * 16384, data['instances'][worst.instance]['name'], data['axes'][worst.axis]['tag'])]
+  for c in checks:
+    if c.error > tolerance:
+      lines.append('%s, %s: %.6f instead of %.6f (error %.6f)' % (data['instances'][c.instance]['name'], data['axes'][c.axis]['tag'], c.actual, c.expected, c.error))
+  return lines
+
+def fvarAxisTags(fvar):
+  """Returns the axis tags of a binary fvar table in their order."""
+  axesArrayOffset, _, axisCount, axisSize = struct.unpack_from('>HHHH', fvar, 4)
+  return [fvar[axesArrayOffset + i * axisSize:axesArrayOffset + i * axisSize + 4].decode('latin-1') for i in range(axisCount)]
+
+def injectAvar(path, data, mapping, output = None):
+  """Writes the avar mapping into the exported variable font at path (TTF or OTF), replacing its avar table. Only the table directory and the head checksum adjustment change besides it. Returns the axis tags in the order of the table."""
+  fvar = sfnt.readTable(path, 'fvar')
+  if fvar is None:
+    raise AvarError('%s is not a variable font (no fvar table)' % path)
+  axisTags = fvarAxisTags(fvar)
+
+  missing = [x['tag'] for x in data['axes'] if x['tag'] not in axisTags]
+  if missing:
+    raise AvarError('%s has no axis %s' % (path, ', '.join(missing)))
+
+  sfnt.replaceTable(path, 'avar', compileAvar(data, mapping, axisTags), output)
+  return axisTags
+
+# batch
+# -----
+
+def instanceTargetValues(data, overrides = None, classifier = None):
+  """Returns the target values from the instance names, with overrides applied."""
+  # overrides: dict( instance name: dict( axis tag: CSS compliant value or None ) ), None keeps the Axis Location
+  targetValues = defaultTargetValues(data, classifier)
+  tags = [x['tag'] for x in data['axes']]
+  for j, i in enumerate(data['instances']):
+    if i['active'] and overrides and i['name'] in overrides:
+      for tag, value in overrides[i['name']].items():
+        if tag not in tags:
+          raise AvarError('Unknown axis %s in the targets of %s' % (tag, i['name']))
+        targetValues[tags.index(tag)][j] = value
+  return targetValues
+
+def fontOverrides(targets, path, familyName):
+  """Returns the overrides of one font from a targets file: those for all fonts ('*'), for its family name, its file name and its path, the later ones win."""
+  # targets: dict( '*' or family name or file name or path: dict( instance name: dict( axis tag: value ) ) )
+  overrides = dict()
+  for key in ('*', familyName, os.path.basename(path), path):
+    for name, values in ((targets or {}).get(key) or {}).items():
+      overrides.setdefault(name, dict()).update(values)
+  return overrides
+
+def dataHash(*values):
+  """Returns a hash of plain data (anything JSON can write), stable between runs and machines."""
+  h = hashlib.blake2b(digest_size = 16)
+  h.update(json.dumps(values, sort_keys = True).encode('utf-8'))
+  return h.hexdigest()
+
+def ttxDocument(data, mapping):
+  """Returns the avar mapping as TTX file, e.g. for ttx -m Font.ttf Font.avar.ttx."""
+  return '<?xml version="1.0" encoding="UTF-8"?>\n<ttFont>\n%s\n</ttFont>\n' % avarTTX(data, mapping)
+
+AvarTask = collections.namedtuple('AvarTask', 'path targets vocabulary format output into cachedHash')
+AvarResult = collections.namedtuple('AvarResult', 'path hash written report failed error')
+
+def buildAvarFile(task):
+  """Computes the avar table of one .glyphs file and writes it to task.output (format 'ttx' or 'binary') and into the exported font task.into, if given. Nothing is written if the axis, master and instance data and the target values hash to task.cachedHash and the output exists. Runs in a worker process, returns an AvarResult."""
+  # task.targets: see fontOverrides, task.vocabulary: dict( axis tag: TargetValueData ) or None
+  try:
+    with glyphsfile.Font(task.path) as font:
+      data = fontData(font)
+      familyName = font.familyName
+
+    classifier = TargetValueClassifier(task.vocabulary) if task.vocabulary else None
+    targetValues = instanceTargetValues(data, fontOverrides(task.targets, task.path, familyName), classifier)
+    h = dataHash(data, [sorted(t.items()) for t in targetValues], task.format)
+    if h == task.cachedHash and os.path.exists(task.output) and not task.into:
+      return AvarResult(task.path, h, False, [], 0, None)
+
+    mapping = solveAvar(data, targetValues)
+    checks = verifyAvar(data, mapping, targetValues)
+
+    if task.format == 'ttx':
+      with io.open(task.output, 'w', encoding = 'utf-8') as f:
+        f.write(ttxDocument(data, mapping))
+    else:
+      with open(task.output, 'wb') as f:
+        f.write(compileAvar(data, mapping))
+    if task.into:
+      injectAvar(task.into, data, mapping)
+
+    return AvarResult(task.path, h, True, verificationReport(data, checks), len([c for c in checks if c.error > TOLERANCE]), None)
+  except (glyphsfile.GlyphsFileError, AvarError, sfnt.SfntError, KeyError, IOError, OSError) as e:
+    return AvarResult(task.path, None, False, [], 0, str(e))
+  except Exception as e:
+    # malformed font data, e.g. masters without a value for an axis; the other fonts of the batch still build
+    return AvarResult(task.path, None, False, [], 0, '%s: %s' % (type(e).__name__, e))
+
+def buildAvarFiles(tasks, workers = None):
+  """Runs buildAvarFile for many fonts on a process pool. Returns the AvarResults in the order of the tasks."""
+  # workers: number of processes, None for one per CPU, 1 to run everything in this process
+  if workers == 1 or len(tasks) < 2:
+    return [buildAvarFile(t) for t in tasks]
+  with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+    return list(executor.map(buildAvarFile, tasks))
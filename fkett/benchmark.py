@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks the scripts against synthetic fonts (see fkett.mockfont), no Glyphs app required.
+
+  python -m fkett.benchmark                          # 10k, 100k and 1M pairs, 1k, 10k and 100k contours, 10, 100 and 1000 instances
+  python -m fkett.benchmark --pairs 10000 --contours 1000 --instances 10 --save baseline.json
+  python -m fkett.benchmark --baseline baseline.json # compare against a saved run
+
+Reports wall time, peak Python memory (tracemalloc) and the number of writes to app objects per benchmark and size. The size is the number of kerning pairs, contours or instances (per master), depending on the benchmark."""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import os
+import runpy
+import sys
+import time
+import tracemalloc
+
+from fkett import avar, gasp, kerning, metrics, overlaps
+from fkett.mockfont import mockGlyphsModule, syntheticFont
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+def runScript(path, font):
+  """Runs a script file the way the Script menu does, with Glyphs.font replaced by font. Console output is discarded."""
+  module = mockGlyphsModule(font)
+  previous = sys.modules.get('GlyphsApp')
+  sys.modules['GlyphsApp'] = module
+
+  try:
+    with contextlib.redirect_stdout(io.StringIO()):
+      runpy.run_path(path, init_globals = dict(vars(module)), run_name = '__main__')
+  finally:
+    if previous is None:
+      del sys.modules['GlyphsApp']
+    else:
+      sys.modules['GlyphsApp'] = previous
+
+def benchmarkRoundKerningScript(font):
+  runScript(os.path.join(SCRIPTS_FOLDER, 'Metrics', 'RoundKerningToNearestFive.py'), font)
+
+def benchmarkRoundKerningScriptRerun(font):
+  # the first run is part of the setup, only the second one is measured
+  path = os.path.join(SCRIPTS_FOLDER, 'Metrics', 'RoundKerningToNearestFive.py')
+  runScript(path, font)
+  # restart the tracing so the peak of the setup run is dropped (tracemalloc.reset_peak needs Python 3.9)
+  tracemalloc.stop()
+  tracemalloc.start()
+  font.resetWrites()
+  start = time.perf_counter()
+  runScript(path, font)
+  return time.perf_counter() - start
+
+def benchmarkRoundKerningAllMasters(font):
+  kerning.applyKerning(font, kerning.roundKerning(font.kerning))
+
+def benchmarkRoundKerningParallel(font):
+  kerning.applyKerning(font, kerning.quantizeKerningParallel(font.kerning))
+
+def benchmarkChangeWidthsAllMasters(font):
+  metrics.changeWidthsSymmetrically(metrics.masterLayers(font.glyphs), 600)
+
+def benchmarkRemoveOverlapsScript(font):
+  # the clean layer cache of the script outlives a run, the fonts of earlier runs must not hit it
+  overlaps.cleanLayers.clear()
+  runScript(os.path.join(SCRIPTS_FOLDER, 'Paths', 'RemoveOutsideSelfIntersects.py'), font)
+
+def benchmarkRemoveOverlapsScriptRerun(font):
+  # the first run is part of the setup, the second one only finds clean layers
+  overlaps.cleanLayers.clear()
+  path = os.path.join(SCRIPTS_FOLDER, 'Paths', 'RemoveOutsideSelfIntersects.py')
+  runScript(path, font)
+  tracemalloc.stop()
+  tracemalloc.start()
+  font.resetWrites()
+  start = time.perf_counter()
+  runScript(path, font)
+  return time.perf_counter() - start
+
+def layerItems(font):
+  for layer in metrics.masterLayers(font.glyphs):
+    yield layer, [([(n.x, n.y, n.type, n.smooth) for n in p.nodes], p.closed) for p in layer.paths]
+
+def benchmarkCleanLayersAllMasters(font):
+  for _ in overlaps.iterCleanLayers(layerItems(font), 1):
+    pass
+
+def benchmarkCleanLayersParallel(font):
+  for _ in overlaps.iterCleanLayers(layerItems(font)):
+    pass
+
+def benchmarkAvar(font):
+  data = avar.fontData(font)
+  # the synthetic names carry no weight, the CSS values follow a curve over the instances
+  n = max(1, len(data['instances']) - 1)
+  targetValues = [dict((j, 100 + 800 * (j / float(n)) ** 1.2) for j, _ in enumerate(data['instances']))]
+  mapping = avar.solveAvar(data, targetValues)
+  avar.compileAvar(data, mapping)
+  avar.verifyAvar(data, mapping, targetValues)
+
+def benchmarkGaspAllInstances(font):
+  # what the dialog writes and reads back for every location
+  for template, instance in zip(itertools.cycle(gasp.GASP_TEMPLATES), font.instances):
+    instance.customParameters[gasp.CP_NAME_GASP_TABLE] = gasp.gaspTableFromPairs(template['values'])
+  for instance in font.instances:
+    [gasp.parseBitMask(v) for v in instance.customParameters[gasp.CP_NAME_GASP_TABLE].values()]
+
+# benchmarks: dict( name: (function( font ), size) ), a function may return its own wall time to exclude its setup
+# size: what the sizes count, 'pairs', 'contours' or 'instances'
+BENCHMARKS = {
+  'RoundKerningToNearestFive': (benchmarkRoundKerningScript, 'pairs'),
+  'RoundKerningToNearestFive rerun': (benchmarkRoundKerningScriptRerun, 'pairs'),
+  'roundKerning (all masters)': (benchmarkRoundKerningAllMasters, 'pairs'),
+  'quantizeKerningParallel': (benchmarkRoundKerningParallel, 'pairs'),
+  'changeWidthsSymmetrically': (benchmarkChangeWidthsAllMasters, 'pairs'),
+  'RemoveOutsideSelfIntersects': (benchmarkRemoveOverlapsScript, 'contours'),
+  'RemoveOutsideSelfIntersects rerun': (benchmarkRemoveOverlapsScriptRerun, 'contours'),
+  'iterCleanLayers (all masters)': (benchmarkCleanLayersAllMasters, 'contours'),
+  'iterCleanLayers parallel': (benchmarkCleanLayersParallel, 'contours'),
+  'CalculateAvarTableForCSSMapping': (benchmarkAvar, 'instances'),
+  'CustomGASPTable (all instances)': (benchmarkGaspAllInstances, 'instances'),
+}
+
+def benchmarkFont(size, count, masters):
+  """Returns a synthetic font for a benchmark of the given size."""
+  if size == 'pairs':
+    return syntheticFont(masters = masters, glyphs = max(500, math.isqrt(2 * count)), pairs = count)
+  if size == 'contours':
+    # a few contours per glyph, like letters
+    return syntheticFont(masters = masters, glyphs = max(1, count // 4), pairs = 0, contours = count)
+  return syntheticFont(masters = masters, glyphs = 10, pairs = 0, instances = count)
+
+def measure(function, font):
+  """Returns (wall time in seconds, peak memory in bytes, writes) of one call of function(font)."""
+  font.resetWrites()
+  tracemalloc.start()
+  start = time.perf_counter()
+
+  duration = function(font)
+
+  if duration is None:
+    duration = time.perf_counter() - start
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  return duration, peak, font.writes
+
+def runBenchmarks(sizes, masters = 2, names = None, repeat = 1):
+  """Returns dict( benchmark name: dict( size: dict( time, peak, writes ) ) ), keeping the fastest of repeat runs."""
+  # sizes: dict( 'pairs', 'contours' or 'instances': list( count ) )
+  results = dict()
+
+  for name, (function, size) in BENCHMARKS.items():
+    if names and name not in names:
+      continue
+
+    for count in sizes.get(size, ()):
+      best = None
+      for _ in range(repeat):
+        # every run gets a fresh font, as the scripts change it
+        font = benchmarkFont(size, count, masters)
+        result = measure(function, font)
+        if best is None or result[0] < best[0]:
+          best = result
+
+      results.setdefault(name, dict())[str(count)] = {'time': best[0], 'peak': best[1], 'writes': best[2]}
+
+  return results
+
+def formatReport(results, baseline = None):
+  lines = list()
+  lines.append('%-36s %10s %10s %10s %12s' % ('Benchmark', 'Size', 'Time (s)', 'Peak (MB)', 'Writes'))
+
+  for name, sizes in results.items():
+    for pairs, r in sizes.items():
+      line = '%-36s %10s %10.3f %10.1f %12d' % (name, pairs, r['time'], r['peak'] / 1048576.0, r['writes'])
+      if baseline and pairs in baseline.get(name, {}):
+        b = baseline[name][pairs]
+        line += '   %.2fx time, %.2fx peak' % (r['time'] / max(b['time'], 1e-9), r['peak'] / float(max(b['peak'], 1)))
+      lines.append(line)
+
+  return '\n'.join(lines)
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(prog = 'python -m fkett.benchmark', description = 'Benchmarks the scripts against synthetic fonts.')
+  parser.add_argument('--pairs', type = int, nargs = '+', default = [10000, 100000, 1000000], help = 'kerning pairs per master')
+  parser.add_argument('--contours', type = int, nargs = '+', default = [1000, 10000, 100000], help = 'contours per master, a tenth of them with an outside loop')
+  parser.add_argument('--instances', type = int, nargs = '+', default = [10, 100, 1000])
+  parser.add_argument('--masters', type = int, default = 2)
+  parser.add_argument('--repeat', type = int, default = 1, help = 'runs per benchmark, the fastest is reported')
+  parser.add_argument('--only', nargs = '+', choices = sorted(BENCHMARKS), help = 'run only these benchmarks')
+  parser.add_argument('--save', help = 'write the results to this JSON file')
+  parser.add_argument('--baseline', help = 'compare against the results in this JSON file')
+  args = parser.parse_args(argv)
+
+  baseline = None
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+
+  results = runBenchmarks({'pairs': args.pairs, 'contours': args.contours, 'instances': args.instances}, args.masters, args.only, args.repeat)
+  print(formatReport(results, baseline))
+
+  if args.save:
+    with open(args.save, 'w') as f:
+      json.dump(results, f, indent = 2, sort_keys = True)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Geometry helpers for outlines given as plain node lists.
+
+A node is a tuple (x, y, type) with type 'line', 'curve', 'qcurve' or 'offcurve', like GSNode. A closed contour starts with the segment that ends in its first node, so its last node is the start point, just like in Glyphs."""
+
+import math
+
+ON_CURVE = ('line', 'curve', 'qcurve')
+
+def contourSegments(nodes, closed = True):
+  """Returns the segments of a contour as a list of point tuples: 2 points for lines, 3 for quadratic ('qcurve') and 4 for cubic ('curve') curves."""
+  # nodes: list( (x, y, type) )
+
+  if not nodes:
+    return list()
+
+  if closed:
+    last = len(nodes) - 1
+    while last >= 0 and nodes[last][2] not in ON_CURVE:
+      last -= 1
+    if last < 0:
+      # only off-curve points (TrueType), not supported
+      return list()
+    if last != len(nodes) - 1:
+      nodes = nodes[last + 1:] + nodes[:last + 1]
+    previous = (nodes[-1][0], nodes[-1][1])
+    todo = nodes
+  else:
+    previous = (nodes[0][0], nodes[0][1])
+    todo = nodes[1:]
+
+  segments = list()
+  offcurves = list()
+
+  for x, y, nodeType in ((n[0], n[1], n[2]) for n in todo):
+    if nodeType == 'offcurve':
+      offcurves.append((x, y))
+      continue
+
+    point = (x, y)
+    if not offcurves or nodeType == 'line':
+      segments.append((previous, point))
+    elif nodeType == 'curve' and len(offcurves) == 1:
+      # a cubic node with a single handle draws the quadratic curve; kept cubic, so it is written back as 'curve'
+      segments.append(elevateQuadratic((previous, offcurves[0], point)))
+    elif nodeType == 'qcurve':
+      # TrueType curves with implied on-curve points between the off-curves
+      start = previous
+      for i, c in enumerate(offcurves):
+        end = point if i == len(offcurves) - 1 else ((c[0] + offcurves[i + 1][0]) / 2.0, (c[1] + offcurves[i + 1][1]) / 2.0)
+        segments.append((start, c, end))
+        start = end
+    else:
+      segments.append((previous, offcurves[0], offcurves[-1], point))
+
+    offcurves = list()
+    previous = point
+
+  return segments
+
+def elevateQuadratic(segment):
+  """Returns the cubic segment that draws the same curve as a quadratic one."""
+  (x0, y0), (x1, y1), (x2, y2) = segment
+  return ((x0, y0), (x0 + 2 * (x1 - x0) / 3.0, y0 + 2 * (y1 - y0) / 3.0), (x2 + 2 * (x1 - x2) / 3.0, y2 + 2 * (y1 - y2) / 3.0), (x2, y2))
+
+def pointAt(segment, t):
+  """Returns the point at parameter t of a segment."""
+  if len(segment) == 2:
+    (x0, y0), (x1, y1) = segment
+    return (x0 + (x1 - x0) * t, y0 + (y1 - y0) * t)
+  if len(segment) == 3:
+    (x0, y0), (x1, y1), (x2, y2) = segment
+    u = 1 - t
+    return (u * u * x0 + 2 * u * t * x1 + t * t * x2, u * u * y0 + 2 * u * t * y1 + t * t * y2)
+  (x0, y0), (x1, y1), (x2, y2), (x3, y3) = segment
+  u = 1 - t
+  return (
+    u * u * u * x0 + 3 * u * u * t * x1 + 3 * u * t * t * x2 + t * t * t * x3,
+    u * u * u * y0 + 3 * u * u * t * y1 + 3 * u * t * t * y2 + t * t * t * y3,
+  )
+
+def extremaParameters(segment, axis):
+  """Returns the parameters 0 < t < 1 where the segment has a local extreme in the given axis (0: x, 1: y)."""
+  if len(segment) == 2:
+    return list()
+
+  if len(segment) == 3:
+    p0, p1, p2 = [p[axis] for p in segment]
+    d = p0 - 2 * p1 + p2
+    if d == 0:
+      return list()
+    t = (p0 - p1) / float(d)
+    return [t] if 0 < t < 1 else list()
+
+  p0, p1, p2, p3 = [p[axis] for p in segment]
+  # derivative / 3 = a t^2 + b t + c
+  a = -p0 + 3 * p1 - 3 * p2 + p3
+  b = 2 * (p0 - 2 * p1 + p2)
+  c = p1 - p0
+
+  if abs(a) < 1e-12:
+    if b == 0:
+      return list()
+    roots = [-c / float(b)]
+  else:
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+      return list()
+    root = math.sqrt(discriminant)
+    roots = [(-b + root) / (2.0 * a), (-b - root) / (2.0 * a)]
+
+  return [t for t in roots if 0 < t < 1]
+
+def segmentBounds(segment):
+  """Returns the exact bounds (xMin, yMin, xMax, yMax) of a segment."""
+  points = [segment[0], segment[-1]]
+  for axis in (0, 1):
+    for t in extremaParameters(segment, axis):
+      points.append(pointAt(segment, t))
+
+  xs = [p[0] for p in points]
+  ys = [p[1] for p in points]
+  return (min(xs), min(ys), max(xs), max(ys))
+
+def unionBounds(bounds):
+  """Returns the union of a list of bounds, or None if the list is empty."""
+  bounds = [b for b in bounds if b is not None]
+  if not bounds:
+    return None
+  return (min(b[0] for b in bounds), min(b[1] for b in bounds), max(b[2] for b in bounds), max(b[3] for b in bounds))
+
+def transformPoint(point, transform):
+  a, b, c, d, tx, ty = transform
+  x, y = point
+  return (a * x + c * y + tx, b * x + d * y + ty)
+
+def transformSegments(segments, transform):
+  return [tuple(transformPoint(p, transform) for p in segment) for segment in segments]
+
+def multiplyTransforms(first, second):
+  """Returns the transform that applies first, then second."""
+  a1, b1, c1, d1, x1, y1 = first
+  a2, b2, c2, d2, x2, y2 = second
+  return (
+    a1 * a2 + b1 * c2,
+    a1 * b2 + b1 * d2,
+    c1 * a2 + d1 * c2,
+    c1 * b2 + d1 * d2,
+    x1 * a2 + y1 * c2 + x2,
+    x1 * b2 + y1 * d2 + y2,
+  )
+
+def derivativeAt(segment, t):
+  """Returns the first derivative (dx/dt, dy/dt) of a segment at parameter t."""
+  if len(segment) == 2:
+    (x0, y0), (x1, y1) = segment
+    return (x1 - x0, y1 - y0)
+  if len(segment) == 3:
+    (x0, y0), (x1, y1), (x2, y2) = segment
+    u = 1 - t
+    return (2 * u * (x1 - x0) + 2 * t * (x2 - x1), 2 * u * (y1 - y0) + 2 * t * (y2 - y1))
+  (x0, y0), (x1, y1), (x2, y2), (x3, y3) = segment
+  u = 1 - t
+  return (
+    3 * u * u * (x1 - x0) + 6 * u * t * (x2 - x1) + 3 * t * t * (x3 - x2),
+    3 * u * u * (y1 - y0) + 6 * u * t * (y2 - y1) + 3 * t * t * (y3 - y2),
+  )
+
+def splitSegment(segment, t):
+  """Splits a segment at parameter t (de Casteljau) and returns the two halves."""
+  points = list(segment)
+  left = [points[0]]
+  right = [points[-1]]
+  while len(points) > 1:
+    points = [(p[0] + (q[0] - p[0]) * t, p[1] + (q[1] - p[1]) * t) for p, q in zip(points, points[1:])]
+    left.append(points[0])
+    right.append(points[-1])
+  return tuple(left), tuple(reversed(right))
+
+def segmentPart(segment, t0, t1):
+  """Returns the part of a segment between the parameters t0 < t1."""
+  if t1 < 1:
+    segment = splitSegment(segment, t1)[0]
+  if t0 > 0:
+    segment = splitSegment(segment, t0 / t1)[1]
+  return segment
+
+def flattenSegment(segment, tolerance = 1.0):
+  """Returns list( (t, point) ) along the segment, including both ends, with a step count that grows with the length of the control polygon."""
+  if len(segment) == 2:
+    return [(0.0, segment[0]), (1.0, segment[1])]
+
+  length = sum(math.hypot(q[0] - p[0], q[1] - p[1]) for p, q in zip(segment, segment[1:]))
+  steps = max(4, min(64, int(math.ceil(math.sqrt(length / tolerance)))))
+  return [(i / float(steps), pointAt(segment, i / float(steps))) for i in range(steps + 1)]
+
+def polygonArea(points):
+  """Returns the signed area of a closed polygon, positive if counter-clockwise."""
+  area = 0.0
+  x0, y0 = points[-1]
+  for x1, y1 in points:
+    area += x0 * y1 - x1 * y0
+    x0, y0 = x1, y1
+  return area / 2.0
+
+def segmentsArea(segments, tolerance = 1.0):
+  """Returns the signed area of a closed contour given as segments, positive if counter-clockwise."""
+  points = list()
+  for segment in segments:
+    points.extend(p for _, p in flattenSegment(segment, tolerance)[1:])
+  return polygonArea(points) if len(points) > 2 else 0.0
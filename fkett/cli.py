@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""Runs the logic of the scripts on .glyphs files, without the Glyphs app.
+
+  python -m fkett round-kerning Font.glyphs [--precision 5] [--mode round] [--masters Bold] [--jobs 4]
+  python -m fkett round-kerning Font.glyphs --fingerprints Font.kerning.json   # only rows changed since the last run
+  python -m fkett change-width Font.glyphs --width 600 --glyphs zero one two
+  python -m fkett change-width Font.glyphs --rules widths.csv
+  python -m fkett remove-overlaps Font.glyphs [--glyphs A B] [--masters Bold] [--jobs 4]
+  python -m fkett remove-overlaps Font.glyphs --report changes.jsonl   # dry run
+  python -m fkett remove-overlaps Font.glyphs --apply changes.jsonl
+  python -m fkett gasp Font.glyphs --template "Glyphs standard" [--instance Regular]
+  python -m fkett avar A.glyphs B.glyphs [--targets targets.json] [--format binary] [--cache avar-cache.json] [--jobs 0] [--check]
+
+Files are changed in place unless --output is given; avar leaves them as they are and writes the table next to each file."""
+
+import argparse
+import collections
+import io
+import json
+import os
+import sys
+
+from fkett import avar, components, gasp, kerning, metrics, overlaps, widthrules
+from fkett.glyphsfile import Font, GlyphsFileError, Node
+
+def selectMasters(font, names):
+  """Returns the masters whose name or id is in names, all masters if names is empty."""
+  if not names:
+    return list(font.masters)
+
+  masters = [m for m in font.masters if m.name in names or m.id in names]
+  found = set([m.name for m in masters] + [m.id for m in masters])
+  missing = [n for n in names if n not in found]
+  if missing:
+    raise ValueError('Unknown master(s): %s' % ', '.join(missing))
+
+  return masters
+
+def selectGlyphs(font, names):
+  """Returns the glyphs with the given names, all glyphs if names is empty."""
+  if not names:
+    return list(font.glyphs)
+
+  glyphs = list()
+  for name in names:
+    glyph = font.glyphs[name]
+    if glyph is None:
+      raise ValueError('Unknown glyph: %s' % name)
+    glyphs.append(glyph)
+  return glyphs
+
+def commandRoundKerning(font, args, log):
+  masterIds = [m.id for m in selectMasters(font, args.masters) if m.id in font.kerning]
+  policy = kerning.QuantizePolicy(args.precision, args.mode, None, args.remove_zero, args.threshold)
+
+  if args.fingerprints:
+    if len(args.files) > 1:
+      raise ValueError('--fingerprints can only be used with a single file')
+    if args.jobs != 1:
+      raise ValueError('--fingerprints cannot be used with --jobs, the changed rows are rounded in this process')
+    newKerning, dirtyLeftIds, fingerprints = kerning.quantizeKerningIncremental(font.kerning, kerning.loadFingerprints(args.fingerprints), masterIds, policy, log)
+  else:
+    if args.jobs == 1:
+      newKerning = kerning.quantizeKerning(font.kerning, masterIds, policy, log)
+    else:
+      newKerning = kerning.quantizeKerningParallel(font.kerning, masterIds, policy, log, args.jobs)
+    dirtyLeftIds = dict((m, None) for m in newKerning)
+
+  removed = 0
+  if args.compact:
+    # in incremental runs only the changed rows are compacted, and the glyph rows that inherit from a changed group row
+    leftGroups, rightGroups = kerning.buildGroupIndex(font.glyphs)
+    for masterId in list(newKerning.keys()):
+      dirtyLeftIds[masterId] = kerning.dependentLeftIds(newKerning[masterId], dirtyLeftIds[masterId], leftGroups)
+      compacted, n = kerning.compactKerning(newKerning, leftGroups, rightGroups, [masterId], log, dirtyLeftIds[masterId])
+      newKerning[masterId] = compacted[masterId]
+      removed += n
+
+  kerning.applyKerning(font, newKerning)
+  if args.fingerprints:
+    kerning.refreshFingerprints(fingerprints, newKerning, dirtyLeftIds)
+    kerning.saveFingerprints(args.fingerprints, fingerprints)
+  return 'Rounded kerning of %d master(s), removed %d redundant exceptions' % (len(masterIds), removed)
+
+def commandChangeWidth(font, args, log):
+  masterIds = set(m.id for m in selectMasters(font, args.masters))
+
+  if (args.width is None) == (args.rules is None):
+    raise ValueError('Use either --width or --rules')
+  if args.width is not None and not args.glyphs:
+    raise ValueError('--width needs --glyphs')
+
+  glyphs = selectGlyphs(font, args.glyphs)
+
+  if args.rules:
+    masters = [m for m in font.masters if m.id in masterIds]
+    layers, widths = widthrules.targetWidths(widthrules.loadRules(args.rules), glyphs, masters, font.glyphs)
+  else:
+    layers = metrics.masterLayers(glyphs, masterIds)
+    widths = [args.width] * len(layers)
+
+  if args.verbose:
+    for layer, width in zip(layers, widths):
+      if layer.width != width:
+        log.write('%s (%s): width was %s, now %s\n' % (layer.parent.name, layer.layerId, layer.width, width))
+
+  if args.composites:
+    changed = metrics.changeWidthsWithComponents(layers, widths, components.ComponentGraph(font.glyphs), font.glyphs)
+  else:
+    changed = metrics.changeWidthsSymmetrically(layers, widths)
+  return 'Changed the width of %d layer(s)' % changed
+
+def replaceContours(layer, changes, log):
+  """Applies changes from fkett.overlaps to the paths of layer and returns the number of removed loops."""
+  paths = layer.paths
+  removed = 0
+  for i, nodes, loops, _ in changes:
+    path = paths[i]
+    # keep the nodes that did not move, with their extra data
+    original = dict(((n.x, n.y, n.type), n) for n in path.nodes)
+    path.nodes = [original.get((x, y, t)) or Node(x, y, t, smooth) for x, y, t, smooth in nodes]
+    path.changed = True
+    log.write('%s (%s): removed %d loop(s) from contour %d\n' % (layer.parent.name, layer.layerId, loops, i))
+    removed += loops
+  return removed
+
+def layerContours(layer):
+  return [([(n.x, n.y, n.type, n.smooth) for n in path.nodes], path.closed) for path in layer.paths]
+
+def applyOverlapsReport(font, args, log):
+  changed = 0
+  removed = 0
+  stale = 0
+
+  with io.open(args.apply, encoding = 'utf-8') as f:
+    for (glyphName, layerId), records in overlaps.readReport(f):
+      glyph = font.glyphs[glyphName]
+      layers = [l for l in glyph.layers if l.layerId == layerId] if glyph is not None else []
+      if not layers:
+        log.write('%s (%s): not found, skipped\n' % (glyphName, layerId))
+        stale += len(records)
+        continue
+
+      changes, staleRecords = overlaps.applyReport(layerContours(layers[0]), records)
+      for record in staleRecords:
+        log.write('%s (%s): contour %d changed since the report, skipped\n' % (glyphName, layerId, record['contour']))
+      removed += replaceContours(layers[0], changes, log)
+      changed += len(changes)
+      stale += len(staleRecords)
+
+  return 'Removed %d outside self-intersection(s) from %d path(s) listed in %s; %d stale' % (removed, changed, args.apply, stale)
+
+def commandRemoveOverlaps(font, args, log):
+  if args.report and args.apply:
+    raise ValueError('Use either --report or --apply')
+  if args.apply:
+    return applyOverlapsReport(font, args, log)
+
+  masterIds = set(m.id for m in selectMasters(font, args.masters))
+  report = None
+  if args.report:
+    # dry run: only the report is written
+    args.save = False
+    report = io.open(args.report, 'w', encoding = 'utf-8')
+
+  def items():
+    for glyph in (selectGlyphs(font, args.glyphs) if args.glyphs else font.glyphs):
+      for layer in metrics.masterLayers([glyph], masterIds):
+        contours = layerContours(layer)
+        yield (layer, contours), contours
+      if report is not None:
+        # nothing is changed, so every glyph can be forgotten once it is read
+        font.glyphs.unload(glyph)
+
+  changed = 0
+  removed = 0
+  stats = collections.Counter()
+
+  try:
+    # in the order of the layers, whatever order the workers finished in
+    for (layer, contours), changes in overlaps.iterCleanLayers(items(), args.jobs, stats = stats):
+      if report is not None:
+        overlaps.writeReport(report, layer.parent.name, layer.associatedMasterId, layer.layerId, contours, changes)
+        removed += sum(c[2] for c in changes)
+      else:
+        removed += replaceContours(layer, changes, log)
+      changed += len(changes)
+  finally:
+    if report is not None:
+      report.close()
+
+  summary = '%s %d outside self-intersection(s) from %d path(s); skipped %d clean contours, checked %d' % ('Would remove' if report else 'Removed', removed, changed, stats['skipped'], stats['processed'])
+  if report is not None:
+    summary += '; report written to %s' % args.report
+  return summary
+
+def parseGaspEntry(entry):
+  # SIZE=VALUE, e.g. 8=0x0A
+  size, _, value = entry.partition('=')
+  return int(size), int(value, 0)
+
+def commandGasp(font, args, log):
+  if args.template:
+    pairs = gasp.getTemplate(args.template)
+  elif args.entry:
+    pairs = [parseGaspEntry(e) for e in args.entry]
+  else:
+    raise ValueError('Use --template or --entry')
+
+  if args.instance:
+    instances = [i for i in font.instances if i.name == args.instance]
+    if not instances:
+      raise ValueError('Unknown instance: %s' % args.instance)
+    customParameters = instances[0].customParameters
+  else:
+    customParameters = font.customParameters
+
+  customParameters[gasp.CP_NAME_GASP_TABLE] = gasp.gaspTableFromPairs(pairs, True)
+  return 'Wrote %s to %s' % (gasp.CP_NAME_GASP_TABLE, args.instance or 'font')
+
+def readJSON(path, default = None):
+  if not path:
+    return default
+  with io.open(path, encoding = 'utf-8-sig') as f:
+    return json.load(f)
+
+def fileStat(path):
+  stat = os.stat(path)
+  return [stat.st_size, stat.st_mtime_ns]
+
+def commandAvar(args):
+  """Computes the avar tables of all files on a process pool; the .glyphs files are only read."""
+  if args.into and len(args.into) != len(args.files):
+    sys.stderr.write('--into needs one font per FILE\n')
+    return 2
+
+  try:
+    targets = readJSON(args.targets, {})
+    vocabulary = avar.loadTargetValueData(args.vocabulary) if args.vocabulary else None
+    # cache: dict( path: dict( 'hash': data hash, 'stat': [size, mtime], 'settings': hash of the options ) )
+    cache = readJSON(args.cache, {}) if args.cache and os.path.exists(args.cache) else {}
+    settings = avar.dataHash(targets, readJSON(args.vocabulary), args.format)
+  except (avar.AvarError, ValueError, IOError, OSError) as e:
+    sys.stderr.write('%s\n' % e)
+    return 1
+
+  tasks = list()
+  skipped = list()
+  for k, path in enumerate(args.files):
+    output = args.output or '%s.avar%s' % (os.path.splitext(path)[0], '.ttx' if args.format == 'ttx' else '')
+    into = args.into[k] if args.into else None
+    entry = cache.get(os.path.abspath(path)) or {}
+    # unchanged files are not even read, changed ones are skipped if their axis, master and instance data are the same
+    if not into and entry.get('settings') == settings and os.path.exists(path) and entry.get('stat') == fileStat(path) and os.path.exists(output):
+      skipped.append(path)
+      continue
+    tasks.append(avar.AvarTask(path, targets, vocabulary, args.format, output, into, entry.get('hash') if entry.get('settings') == settings else None))
+
+  status = 0
+  for result in avar.buildAvarFiles(tasks, args.jobs):
+    if result.error:
+      sys.stderr.write('%s: %s\n' % (result.path, result.error))
+      status = 1
+      continue
+    if result.failed:
+      # instances that miss their design coordinate are checked again next time
+      cache.pop(os.path.abspath(result.path), None)
+    else:
+      cache[os.path.abspath(result.path)] = {'hash': result.hash, 'stat': fileStat(result.path), 'settings': settings}
+    if not result.written:
+      print('%s: avar data unchanged, skipped' % result.path)
+      continue
+    print('%s: wrote avar table, %s' % (result.path, result.report[0]))
+    if args.verbose or result.failed:
+      sys.stdout.write(''.join('  %s\n' % l for l in result.report[1:]))
+    if args.check and result.failed:
+      status = 1
+  for path in skipped:
+    print('%s: unchanged, skipped' % path)
+
+  if args.cache:
+    with io.open(args.cache, 'w', encoding = 'utf-8') as f:
+      json.dump(cache, f, sort_keys = True, indent = 1)
+
+  return status
+
+def buildParser():
+  parser = argparse.ArgumentParser(prog = 'python -m fkett', description = 'Runs the logic of the scripts on .glyphs files.')
+  commands = parser.add_subparsers(dest = 'command')
+  commands.required = True
+
+  def addCommand(name, function, help):
+    command = commands.add_parser(name, help = help)
+    command.add_argument('files', nargs = '+', metavar = 'FILE', help = '.glyphs file(s)')
+    command.add_argument('-o', '--output', help = 'write to this file instead of changing FILE (one file only)')
+    command.add_argument('-v', '--verbose', action = 'store_true', help = 'print every change')
+    command.set_defaults(function = function, save = True, batch = False)
+    return command
+
+  c = addCommand('round-kerning', commandRoundKerning, 'round kerning values (RoundKerningToNearestFive)')
+  c.add_argument('--precision', type = int, default = 5)
+  c.add_argument('--mode', default = 'round', choices = sorted(kerning.QUANTIZE_MODES))
+  c.add_argument('--remove-zero', action = 'store_true', help = 'remove pairs that are rounded to 0')
+  c.add_argument('--threshold', type = float, help = 'remove pairs whose rounded absolute value is below this')
+  c.add_argument('--no-compact', dest = 'compact', action = 'store_false', help = 'keep exceptions equal to their group kerning')
+  c.add_argument('--masters', nargs = '+', metavar = 'MASTER', help = 'names or ids of the masters, default: all')
+  c.add_argument('--jobs', type = int, default = 1, help = 'worker processes, one per master at most; 0 for one per CPU')
+  c.add_argument('--fingerprints', metavar = 'PATH', help = 'JSON file with the rows of the last run, only rows that changed since are rounded (one file only, not with --jobs)')
+
+  c = addCommand('change-width', commandChangeWidth, 'change glyph widths symmetrically (ChangeGlyphWidthSym)')
+  c.add_argument('--width', type = int)
+  c.add_argument('--rules', metavar = 'RULES', help = '.json or .csv file with widths per glyph name or pattern, see fkett/widthrules.py')
+  c.add_argument('--glyphs', nargs = '+', metavar = 'GLYPH', help = 'default with --rules: all glyphs')
+  c.add_argument('--composites', action = 'store_true', help = 'move composites along with their changed components')
+  c.add_argument('--masters', nargs = '+', metavar = 'MASTER', help = 'names or ids of the masters, default: all')
+
+  c = addCommand('remove-overlaps', commandRemoveOverlaps, 'remove outside self-intersections (RemoveOutsideSelfIntersects)')
+  c.add_argument('--glyphs', nargs = '+', metavar = 'GLYPH', help = 'default: all glyphs')
+  c.add_argument('--masters', nargs = '+', metavar = 'MASTER', help = 'names or ids of the masters, default: all')
+  c.add_argument('--jobs', type = int, default = 1, help = 'worker processes; 0 for one per CPU; the result is the same for any number')
+  c.add_argument('--report', metavar = 'REPORT', help = 'dry run: write what would change to REPORT (JSON lines) and leave the file as it is')
+  c.add_argument('--apply', metavar = 'REPORT', help = 'change only the contours listed in REPORT')
+
+  c = addCommand('gasp', commandGasp, 'set the GASP Table custom parameter (CustomGASPTable)')
+  c.add_argument('--template', help = 'one of: %s' % ', '.join(t['title'] for t in gasp.GASP_TEMPLATES))
+  c.add_argument('--entry', nargs = '+', metavar = 'SIZE=VALUE', help = 'e.g. 8=0x0A 20=0x07 65535=0x0F')
+  c.add_argument('--instance', help = 'write to this instance instead of the font')
+
+  c = addCommand('avar', commandAvar, 'compute avar tables for CSS compliant axis values (CalculateAvarTableForCSSMapping)')
+  c.set_defaults(batch = True, save = False)
+  c.add_argument('--targets', metavar = 'JSON', help = 'CSS values per instance that override the ones from the instance names: {"*" or family or file name: {instance: {axis tag: value}}}')
+  c.add_argument('--vocabulary', metavar = 'JSON', help = 'additional instance names per axis, see fkett.avar.loadTargetValueData')
+  c.add_argument('--format', default = 'ttx', choices = ('ttx', 'binary'), help = 'write FILE.avar.ttx (for ttx -m) or the binary table FILE.avar')
+  c.add_argument('--into', nargs = '+', metavar = 'FONT', help = 'also write the table into these exported variable fonts, one per FILE')
+  c.add_argument('--cache', metavar = 'JSON', help = 'skip files whose axis, master and instance data did not change since the last run')
+  c.add_argument('--check', action = 'store_true', help = 'fail if an instance does not map to its design coordinate')
+  c.add_argument('--jobs', type = int, default = 1, help = 'worker processes, one per file at most; 0 for one per CPU')
+
+  return parser
+
+def main(argv = None):
+  args = buildParser().parse_args(argv)
+  if getattr(args, 'jobs', 1) == 0:
+    args.jobs = None
+
+  if args.output and len(args.files) > 1:
+    sys.stderr.write('--output can only be used with a single file\n')
+    return 2
+  if args.batch:
+    return args.function(args)
+
+  for path in args.files:
+    log = io.StringIO()
+    try:
+      font = Font(path)
+      summary = args.function(font, args, log)
+      if args.save:
+        font.save(args.output or path)
+    except (GlyphsFileError, ValueError, KeyError, IOError, OSError) as e:
+      sys.stderr.write('%s: %s\n' % (path, e))
+      return 1
+
+    if args.verbose:
+      sys.stdout.write(log.getvalue())
+    print('%s: %s' % (path, summary))
+
+  return 0
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Which glyphs use which glyphs as components, for changing bases and their composites together."""
+
+import collections
+import heapq
+
+class ComponentCycleError(ValueError):
+  pass
+
+class ComponentGraph(object):
+  """Component dependencies of a set of glyphs, over all their master layers. Build it once and keep it as long as no components are added or removed."""
+
+  def __init__(self, glyphs):
+    # bases: dict( composite name: set( base names ) )
+    # dependents: dict( base name: set( composite names ) )
+    self.bases = dict()
+    self.dependents = collections.defaultdict(set)
+
+    for glyph in glyphs:
+      names = set()
+      for layer in glyph.layers:
+        if layer.layerId == layer.associatedMasterId:
+          names.update(c.componentName for c in layer.components)
+      if names:
+        self.bases[glyph.name] = names
+        for name in names:
+          self.dependents[name].add(glyph.name)
+
+  def affected(self, names):
+    """Returns names and all glyphs that use any of them as (nested) component, each base before the composites that use it."""
+    reached = set(names)
+    todo = list(names)
+    while todo:
+      for composite in self.dependents.get(todo.pop(), ()):
+        if composite not in reached:
+          reached.add(composite)
+          todo.append(composite)
+
+    # Kahn's algorithm, sorted by name so the order does not depend on set ordering
+    pending = dict((n, len(self.bases.get(n, set()) & reached)) for n in reached)
+    ready = [n for n, count in pending.items() if count == 0]
+    heapq.heapify(ready)
+    order = list()
+
+    while ready:
+      name = heapq.heappop(ready)
+      order.append(name)
+      for composite in self.dependents.get(name, ()):
+        pending[composite] -= 1
+        if pending[composite] == 0:
+          heapq.heappush(ready, composite)
+
+    if len(order) < len(reached):
+      raise ComponentCycleError('Components refer to each other: %s' % ', '.join(sorted(n for n in reached if pending[n] > 0)))
+
+    return order
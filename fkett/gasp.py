@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""GASP table values as stored in the "GASP Table" custom parameter."""
+
+GASP_GRIDFIT = 0x01
+GASP_DOGRAY = 0x02
+GASP_SYMMETRIC_GRIDFIT = 0x04
+GASP_SYMMETRIC_SMOOTHING = 0x08
+
+GASP_TEMPLATES = (
+  {'title': 'Glyphs standard', 'values': ((8, 0x0A), (20, 0x07), (65535, 0X0F))},
+  {'title': 'Microsoft ClearType', 'values': ((9, 0x0A), (19, 0x07), (65535, 0X0F))},
+  {'title': 'Microsoft', 'values': ((8, 0x02), (16, 0x01), (65535, 0X03))},
+  {'title': 'URW ClearType', 'values': ((65535, 0X0F),)},
+  {'title': 'URW', 'values': ((8, 0x02), (65535, 0X03))}
+)
+
+CP_NAME_GASP_TABLE = 'GASP Table'
+
+def parseBitMask(value):
+  """Returns (gridfit, dogray, symmetric_gridfit, symmetric_smoothing) of a GASP value."""
+  return bool(value & GASP_GRIDFIT), bool(value & GASP_DOGRAY), bool(value & GASP_SYMMETRIC_GRIDFIT), bool(value & GASP_SYMMETRIC_SMOOTHING)
+
+def joinBitMask(gridfit, dogray, symmetric_gridfit, symmetric_smoothing):
+  value = 0x00
+  if gridfit:
+    value |= GASP_GRIDFIT
+  if dogray:
+    value |= GASP_DOGRAY
+  if symmetric_gridfit:
+    value |= GASP_SYMMETRIC_GRIDFIT
+  if symmetric_smoothing:
+    value |= GASP_SYMMETRIC_SMOOTHING
+
+  return value
+
+def getTemplate(title):
+  """Returns the (size, value) pairs of the template with the given title."""
+  for template in GASP_TEMPLATES:
+    if template['title'].lower() == title.lower():
+      return template['values']
+  raise KeyError('Unknown GASP template "%s", use one of: %s' % (title, ', '.join(t['title'] for t in GASP_TEMPLATES)))
+
+def gaspTableFromPairs(pairs, stringKeys = False):
+  """Returns the custom parameter value for a list of (size, value) pairs, sorted by size."""
+  # stringKeys: .glyphs files store the sizes as strings
+  d = dict()
+  for size, value in sorted(pairs, key = lambda p: int(p[0])):
+    d[str(int(size)) if stringKeys else int(size)] = int(value)
+  return d
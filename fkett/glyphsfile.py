@@ -0,0 +1,1130 @@
+# -*- coding: utf-8 -*-
+"""Reads and writes .glyphs files (format 2 and 3) without the Glyphs app.
+
+The file is memory-mapped and only scanned when it is opened: every value stays a byte range of the source until it is asked for. Glyphs are found by name through an index of byte offsets, and each layer of a glyph is again a byte range of its own, so reading the kerning does not parse a single glyph and changing one layer does not parse its siblings. On saving, only the changed regions are replaced; everything else is copied from the source byte for byte.
+
+The objects mimic the small part of the app API the scripts use (font.kerning, font.masters, glyph.layers, layer.width/LSB/RSB, customParameters, …), so the script logic in this package runs on them as well."""
+
+import bisect
+import collections
+import math
+import mmap
+import os
+import re
+import shutil
+import tempfile
+
+try:
+  from collections.abc import MutableMapping, MutableSequence
+except ImportError:
+  from collections import MutableMapping, MutableSequence
+
+from fkett import bezier
+
+class GlyphsFileError(ValueError):
+  pass
+
+# parser
+# -----
+
+TOKEN = re.compile(br'\s*(?:(?P<punct>[{}();=,])|"(?P<string>(?:[^"\\]|\\.)*)"|<(?P<data>[0-9A-Fa-f\s]*)>|(?P<bare>[^\s{}();=,"<>]+))', re.S)
+STRING = re.compile(br'"(?:[^"\\]|\\.)*"', re.S)
+BRACKET = re.compile(br'[{}()"]')
+CLOSING_LINE = re.compile(br'\n[)}]')
+ESCAPE = re.compile(r'\\(?:([0-7]{1,3})|U([0-9A-Fa-f]{4})|(.))', re.S)
+INTEGER = re.compile(r'-?(?:0|[1-9][0-9]*)\Z')
+FLOAT = re.compile(r'-?[0-9]+\.[0-9]+(?:[eE][-+]?[0-9]+)?\Z')
+BARE = re.compile(r'[A-Za-z0-9_.]+\Z')
+
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+def unescape(match):
+  octal, unicode, other = match.groups()
+  if octal:
+    return chr(int(octal, 8))
+  if unicode:
+    return chr(int(unicode, 16))
+  return ESCAPES.get(other, other)
+
+def nextToken(source, pos):
+  match = TOKEN.match(source, pos)
+  if match is None or match.end() == match.start():
+    raise GlyphsFileError('Unexpected %s at offset %d' % ('end of file' if pos >= len(source) else 'character', pos))
+  return match
+
+def tokenValue(match, isKey = False):
+  if match.group('string') is not None:
+    s = match.group('string').decode('utf-8')
+    return ESCAPE.sub(unescape, s) if '\\' in s else s
+  if match.group('bare') is not None:
+    s = match.group('bare').decode('utf-8')
+    if not isKey:
+      if INTEGER.match(s):
+        return int(s)
+      if FLOAT.match(s):
+        return float(s)
+    return s
+  if match.group('data') is not None:
+    return bytes(bytearray.fromhex(match.group('data').decode('ascii')))
+  raise GlyphsFileError('Unexpected "%s" at offset %d' % (match.group('punct').decode('ascii'), match.start('punct')))
+
+def expect(source, pos, punct):
+  match = nextToken(source, pos)
+  if match.group('punct') != punct:
+    raise GlyphsFileError('Expected "%s" at offset %d' % (punct.decode('ascii'), match.start()))
+  return match.end()
+
+def parseValue(source, pos = 0):
+  """Parses the value at pos; returns (value, position after the value)."""
+  match = nextToken(source, pos)
+  punct = match.group('punct')
+  pos = match.end()
+
+  if punct == b'{':
+    d = collections.OrderedDict()
+    while True:
+      match = nextToken(source, pos)
+      if match.group('punct') == b'}':
+        return d, match.end()
+      key = tokenValue(match, True)
+      pos = expect(source, match.end(), b'=')
+      d[key], pos = parseValue(source, pos)
+      pos = expect(source, pos, b';')
+
+  if punct == b'(':
+    l = list()
+    match = nextToken(source, pos)
+    if match.group('punct') == b')':
+      return l, match.end()
+    while True:
+      value, pos = parseValue(source, pos)
+      l.append(value)
+      match = nextToken(source, pos)
+      if match.group('punct') == b')':
+        return l, match.end()
+      if match.group('punct') != b',':
+        raise GlyphsFileError('Expected "," or ")" at offset %d' % match.start())
+      pos = match.end()
+      # Glyphs allows a comma before the closing bracket
+      match = nextToken(source, pos)
+      if match.group('punct') == b')':
+        return l, match.end()
+
+  return tokenValue(match), pos
+
+def skipExactly(source, start):
+  """Returns the end of the container at start, following every bracket and string."""
+  depth = 0
+  pos = start
+  while True:
+    match = BRACKET.search(source, pos)
+    if match is None:
+      raise GlyphsFileError('Unexpected end of file in value starting at offset %d' % start)
+    c = match.group()
+    if c == b'"':
+      pos = STRING.match(source, match.start()).end()
+      continue
+    pos = match.end()
+    if c in (b'{', b'('):
+      depth += 1
+    else:
+      depth -= 1
+      if depth == 0:
+        return pos
+
+def bracketBalance(chunk):
+  if b'"' in chunk:
+    chunk = STRING.sub(b'""', chunk)
+  return chunk.count(b'{') + chunk.count(b'(') - chunk.count(b'}') - chunk.count(b')')
+
+def skipValue(source, pos):
+  """Returns (start, end) of the value at pos without building it."""
+  match = nextToken(source, pos)
+  start = match.start(match.lastgroup)
+  punct = match.group('punct')
+
+  if punct not in (b'{', b'('):
+    if punct is not None:
+      raise GlyphsFileError('Unexpected "%s" at offset %d' % (punct.decode('ascii'), start))
+    return (start - 1 if match.group('string') is not None or match.group('data') is not None else start), match.end()
+
+  # values that end on their first line, e.g. (1,2,l)
+  lineEnd = source.find(b'\n', start)
+  if lineEnd < 0 or bracketBalance(source[start:lineEnd]) <= 0:
+    return start, skipExactly(source, start)
+
+  # Glyphs writes the closing bracket of multi-line values at the start of a line, so the brackets
+  # are counted in chunks between such lines instead of one by one
+  depth = 0
+  chunkStart = start
+  for match in CLOSING_LINE.finditer(source, start):
+    chunk = source[chunkStart:match.end()]
+    if b'"' in chunk:
+      chunk = STRING.sub(b'', chunk)
+      if b'"' in chunk:
+        # the line break is inside a string
+        continue
+    depth += bracketBalance(chunk)
+    chunkStart = match.end()
+    if depth == 0:
+      return start, match.end()
+    if depth < 0:
+      break
+
+  # not formatted like Glyphs does it
+  return start, skipExactly(source, start)
+
+def scanDict(source, pos):
+  """Scans the dict at pos one level deep; returns (list( (key, entry start, value start, value end) ), end)."""
+  pos = expect(source, pos, b'{')
+  entries = list()
+
+  while True:
+    match = nextToken(source, pos)
+    if match.group('punct') == b'}':
+      return entries, match.end()
+    key = tokenValue(match, True)
+    entryStart = match.start(match.lastgroup) - (1 if match.group('string') is not None else 0)
+    pos = expect(source, match.end(), b'=')
+    valueStart, pos = skipValue(source, pos)
+    entries.append((key, entryStart, valueStart, pos))
+    pos = expect(source, pos, b';')
+
+def scanArray(source, pos):
+  """Scans the array at pos one level deep; returns (list( (item start, item end) ), end)."""
+  pos = expect(source, pos, b'(')
+  items = list()
+
+  while True:
+    match = nextToken(source, pos)
+    if match.group('punct') == b')':
+      return items, match.end()
+    if items:
+      if match.group('punct') != b',':
+        raise GlyphsFileError('Expected "," or ")" at offset %d' % match.start())
+      pos = match.end()
+      match = nextToken(source, pos)
+      if match.group('punct') == b')':
+        return items, match.end()
+    start, pos = skipValue(source, pos)
+    items.append((start, pos))
+
+# writer
+# -----
+
+# arrays of numbers under these keys are written on one line, like Glyphs does
+INLINE_KEYS = frozenset(('pos', 'scale', 'slant', 'origin', 'target', 'angle'))
+
+def formatNumber(value):
+  if isinstance(value, bool):
+    return '1' if value else '0'
+  if isinstance(value, float):
+    if value == int(value):
+      return str(int(value))
+    return repr(round(value, 5))
+  return str(value)
+
+def quote(s, isKey = False):
+  if s and BARE.match(s) and (isKey or not (INTEGER.match(s) or FLOAT.match(s))):
+    return s
+  return '"' + s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\012') + '"'
+
+def isScalar(value):
+  return not isinstance(value, (dict, list, tuple, LazyDict, LazyList, MutableMapping))
+
+def dumpValue(value, out, key = None, inArray = False):
+  """Appends the serialization of value to the list of byte strings out."""
+  if isinstance(value, (LazyDict, LazyList)):
+    value.dump(out)
+  elif isinstance(value, (dict, MutableMapping)):
+    out.append(b'{\n')
+    for k, v in value.items():
+      out.append(quote(str(k), True).encode('utf-8') + b' = ')
+      dumpValue(v, out, k)
+      out.append(b';\n')
+    out.append(b'}')
+  elif isinstance(value, (list, tuple)):
+    if value and (inArray or key in INLINE_KEYS) and all(isScalar(v) for v in value):
+      out.append(b'(')
+      for i, v in enumerate(value):
+        if i:
+          out.append(b',')
+        dumpValue(v, out, None, True)
+      out.append(b')')
+    elif not value:
+      out.append(b'(\n)')
+    else:
+      out.append(b'(\n')
+      for i, v in enumerate(value):
+        if i:
+          out.append(b',\n')
+        dumpValue(v, out, None, True)
+      out.append(b'\n)')
+  elif isinstance(value, bytes):
+    out.append(b'<' + value.hex().upper().encode('ascii') + b'>')
+  elif isinstance(value, (int, float)):
+    out.append(formatNumber(value).encode('ascii'))
+  elif value is None:
+    out.append(b'""')
+  else:
+    out.append(quote(str(value)).encode('utf-8'))
+
+def dumps(value):
+  out = list()
+  dumpValue(value, out)
+  return b''.join(out)
+
+# lazy containers
+# -----
+
+UNPARSED = object()
+
+class LazyDict(MutableMapping):
+  """Dict over a byte range of the source. Values are parsed when they are first read."""
+
+  def __init__(self, source = None, start = None, lazyKeys = None):
+    # lazyKeys: dict( key: factory( source, start ) ), for values that should be lazy themselves
+    self.source = source
+    self.lazyKeys = lazyKeys or dict()
+    # entries: dict( key: [entry start, value start, value end, value] )
+    self.entries = collections.OrderedDict()
+    self.start = self.end = None
+    self.structureChanged = False
+
+    if source is not None:
+      entries, self.end = scanDict(source, start)
+      self.start = start
+      for key, entryStart, valueStart, valueEnd in entries:
+        self.entries[key] = [entryStart, valueStart, valueEnd, UNPARSED]
+
+  def __getitem__(self, key):
+    entry = self.entries[key]
+    if entry[3] is UNPARSED:
+      if key in self.lazyKeys:
+        entry[3] = self.lazyKeys[key](self.source, entry[1])
+      else:
+        entry[3] = parseValue(self.source, entry[1])[0]
+    return entry[3]
+
+  def __setitem__(self, key, value):
+    if key in self.entries:
+      self.entries[key][3] = value
+    else:
+      self.entries[key] = [None, None, None, value]
+
+  def __delitem__(self, key):
+    self.structureChanged = True
+    del self.entries[key]
+
+  def __iter__(self):
+    return iter(self.entries)
+
+  def __len__(self):
+    return len(self.entries)
+
+  def isParsed(self, key):
+    return self.entries[key][3] is not UNPARSED
+
+  def dump(self, out):
+    if self.isUnchanged():
+      out.append(bytes(self.source[self.start:self.end]))
+      return
+
+    out.append(b'{\n')
+    for key, entry in self.entries.items():
+      if self.isUnchanged(key) and not isinstance(entry[3], (LazyDict, LazyList)):
+        out.append(bytes(self.source[entry[0]:entry[2]]))
+      else:
+        out.append(quote(str(key), True).encode('utf-8') + b' = ')
+        dumpValue(self[key], out, key)
+      out.append(b';\n')
+    out.append(b'}')
+
+  def isUnchanged(self, key = None):
+    """True if the value of key (or every value) would be written exactly as in the source."""
+    if key is None:
+      return self.source is not None and not self.structureChanged and all(self.isUnchanged(k) for k in self.entries)
+    entry = self.entries[key]
+    if entry[0] is None:
+      return False
+    if entry[3] is UNPARSED:
+      return True
+    if isinstance(entry[3], (LazyDict, LazyList)):
+      return entry[3].isUnchanged()
+    return entry[3] == parseValue(self.source, entry[1])[0]
+
+  def collectEdits(self, edits):
+    """Appends (start, end, replacement) for every changed region of the source."""
+    if self.source is None or self.structureChanged or any(e[0] is None for e in self.entries.values()):
+      out = list()
+      self.dump(out)
+      edits.append((self.start, self.end, b''.join(out)))
+      return
+
+    for key, entry in self.entries.items():
+      value = entry[3]
+      if value is UNPARSED:
+        continue
+      if isinstance(value, (LazyDict, LazyList)):
+        value.collectEdits(edits)
+      elif value != parseValue(self.source, entry[1])[0]:
+        out = list()
+        dumpValue(value, out, key)
+        edits.append((entry[1], entry[2], b''.join(out)))
+
+class LazyList(MutableSequence):
+  """List over a byte range of the source, whose items are created by factory( source, start ) when first read."""
+
+  def __init__(self, source, start, factory):
+    self.source = source
+    self.factory = factory
+    spans, self.end = scanArray(source, start)
+    self.start = start
+    # items: list( [item start, item end, item] )
+    self.items = [[s, e, UNPARSED] for s, e in spans]
+    self.spans = len(self.items)
+    self.structureChanged = False
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self[j] for j in range(*i.indices(len(self)))]
+    item = self.items[i]
+    if item[2] is UNPARSED:
+      item[2] = self.factory(self.source, item[0])
+    return item[2]
+
+  def __setitem__(self, i, value):
+    self.structureChanged = True
+    self.items[i] = [None, None, value]
+
+  def __delitem__(self, i):
+    self.structureChanged = True
+    del self.items[i]
+
+  def __len__(self):
+    return len(self.items)
+
+  def insert(self, i, value):
+    self.structureChanged = True
+    self.items.insert(i, [None, None, value])
+
+  def itemIsUnchanged(self, item):
+    if item[0] is None:
+      return False
+    if item[2] is UNPARSED:
+      return True
+    if isinstance(item[2], (LazyDict, LazyList)):
+      return item[2].isUnchanged()
+    return item[2] == parseValue(self.source, item[0])[0]
+
+  def isUnchanged(self):
+    return not self.structureChanged and all(self.itemIsUnchanged(item) for item in self.items)
+
+  def unload(self, i):
+    """Forgets the parsed item i if it is unchanged, so it is parsed again when read. Returns True if it was unloaded."""
+    item = self.items[i]
+    if item[2] is UNPARSED or not self.itemIsUnchanged(item):
+      return False
+    item[2] = UNPARSED
+    return True
+
+  def collectEdits(self, edits):
+    """Appends (start, end, replacement) for every changed region of the source."""
+    if self.structureChanged:
+      out = list()
+      self.dump(out)
+      edits.append((self.start, self.end, b''.join(out)))
+      return
+
+    for start, end, value in self.items:
+      if value is UNPARSED:
+        continue
+      if isinstance(value, (LazyDict, LazyList)):
+        value.collectEdits(edits)
+      elif value != parseValue(self.source, start)[0]:
+        out = list()
+        dumpValue(value, out, None, True)
+        edits.append((start, end, b''.join(out)))
+
+  def dump(self, out):
+    if self.isUnchanged():
+      out.append(bytes(self.source[self.start:self.end]))
+      return
+
+    out.append(b'(\n')
+    for i, item in enumerate(self.items):
+      if i:
+        out.append(b',\n')
+      if item[0] is not None and item[2] is UNPARSED:
+        out.append(bytes(self.source[item[0]:item[1]]))
+      else:
+        dumpValue(item[2], out, None, True)
+    out.append(b'\n)')
+
+def lazyLayer(source, start):
+  return LazyDict(source, start)
+
+def lazyLayerList(source, start):
+  return LazyList(source, start, lazyLayer)
+
+def lazyGlyph(source, start):
+  return LazyDict(source, start, {'layers': lazyLayerList})
+
+def lazyGlyphList(source, start):
+  return LazyList(source, start, lazyGlyph)
+
+# object model
+# -----
+
+class CustomParameters(object):
+  """Dict-like view on a customParameters list, like GSFont.customParameters in the app."""
+
+  def __init__(self, owner):
+    # owner: dict that holds (or will hold) the 'customParameters' list
+    self.owner = owner
+
+  def parameters(self):
+    return self.owner.get('customParameters') or list()
+
+  def find(self, name):
+    for p in self.parameters():
+      if p.get('name') == name and not p.get('disabled'):
+        return p
+    return None
+
+  def __contains__(self, name):
+    return self.find(name) is not None
+
+  def __getitem__(self, name):
+    p = self.find(name)
+    return None if p is None else p.get('value')
+
+  def __setitem__(self, name, value):
+    p = self.find(name)
+    if p is not None:
+      p['value'] = value
+      return
+    if 'customParameters' not in self.owner:
+      self.owner['customParameters'] = list()
+    self.owner['customParameters'].append(collections.OrderedDict((('name', name), ('value', value))))
+
+  def __delitem__(self, name):
+    parameters = self.parameters()
+    for i, p in enumerate(parameters):
+      if p.get('name') == name:
+        del parameters[i]
+        return
+    raise KeyError(name)
+
+  def __iter__(self):
+    return iter([p.get('name') for p in self.parameters() if not p.get('disabled')])
+
+  def items(self):
+    return [(p.get('name'), p.get('value')) for p in self.parameters() if not p.get('disabled')]
+
+class UserData(object):
+  """Dict-like view on a userData dict; missing keys read as None like in the app."""
+
+  def __init__(self, owner):
+    self.owner = owner
+
+  def __getitem__(self, key):
+    return (self.owner.get('userData') or {}).get(key)
+
+  def __setitem__(self, key, value):
+    if 'userData' not in self.owner:
+      self.owner['userData'] = collections.OrderedDict()
+    self.owner['userData'][key] = value
+
+  def __delitem__(self, key):
+    del self.owner['userData'][key]
+
+  def __contains__(self, key):
+    return key in (self.owner.get('userData') or {})
+
+class Axis(object):
+  """Font axis, readable as axis.name/axis.axisTag or axis['Name']/axis['Tag'] like the Glyphs 2 API."""
+
+  def __init__(self, name, tag):
+    self.name = name
+    self.axisTag = tag
+
+  def __getitem__(self, key):
+    return {'Name': self.name, 'Tag': self.axisTag}[key]
+
+# Glyphs 2 stores up to six axis values in fixed keys
+AXIS_KEYS_MASTER = ('weightValue', 'widthValue', 'customValue', 'customValue1', 'customValue2', 'customValue3')
+AXIS_KEYS_INSTANCE = ('interpolationWeight', 'interpolationWidth', 'interpolationCustom', 'interpolationCustom1', 'interpolationCustom2', 'interpolationCustom3')
+AXIS_DEFAULTS = (100, 100, 0, 0, 0, 0)
+
+class Master(object):
+  def __init__(self, font, data):
+    self.font = font
+    self.data = data
+    self.customParameters = CustomParameters(data)
+    self.userData = UserData(data)
+
+  @property
+  def id(self):
+    return self.data['id']
+
+  @property
+  def name(self):
+    if 'name' in self.data:
+      return self.data['name']
+    # Glyphs 2
+    parts = [self.data.get(k) for k in ('weight', 'width', 'custom')]
+    return ' '.join([p for p in parts if p and p != 'Regular']) or 'Regular'
+
+  @property
+  def axes(self):
+    if self.font.formatVersion >= 3:
+      return list(self.data.get('axesValues') or [])
+    return [self.data.get(k, d) for k, d in zip(AXIS_KEYS_MASTER, AXIS_DEFAULTS)][:len(self.font.axes)]
+
+class Instance(object):
+  def __init__(self, font, data):
+    self.font = font
+    self.data = data
+    self.customParameters = CustomParameters(data)
+
+  @property
+  def name(self):
+    return self.data.get('name', 'Regular')
+
+  @property
+  def active(self):
+    return bool(self.data.get('exports', 1))
+
+  @property
+  def axes(self):
+    if self.font.formatVersion >= 3:
+      return list(self.data.get('axesValues') or [])
+    return [self.data.get(k, d) for k, d in zip(AXIS_KEYS_INSTANCE, AXIS_DEFAULTS)][:len(self.font.axes)]
+
+def formatCoordinate(value):
+  return formatNumber(float(value))
+
+class Node(object):
+  def __init__(self, x, y, type = 'line', smooth = False, extra = None):
+    self.x = x
+    self.y = y
+    self.type = type
+    self.smooth = smooth
+    # extra: everything after the type (e.g. node userData), written back as it was
+    self.extra = extra
+
+  @property
+  def position(self):
+    return (self.x, self.y)
+
+  def __iter__(self):
+    # allows (x, y, type) unpacking, as used by fkett.bezier
+    return iter((self.x, self.y, self.type))
+
+  def __getitem__(self, i):
+    return (self.x, self.y, self.type)[i]
+
+NODE_TYPES_2 = {'LINE': 'line', 'CURVE': 'curve', 'QCURVE': 'qcurve', 'OFFCURVE': 'offcurve'}
+NODE_TYPES_3 = {'l': 'line', 'c': 'curve', 'q': 'qcurve', 'o': 'offcurve'}
+
+def parseNode(data, formatVersion):
+  if formatVersion >= 3:
+    t = data[2]
+    return Node(data[0], data[1], NODE_TYPES_3[t[0]], t.endswith('s'), data[3:] or None)
+  parts = data.split(' ')
+  return Node(float(parts[0]), float(parts[1]), NODE_TYPES_2[parts[2]], 'SMOOTH' in parts[3:], ' '.join([p for p in parts[3:] if p != 'SMOOTH']) or None)
+
+def nodeData(node, formatVersion):
+  if formatVersion >= 3:
+    t = node.type[0] if node.type != 'qcurve' else 'q'
+    if node.smooth:
+      t += 's'
+    x = int(node.x) if float(node.x).is_integer() else round(node.x, 5)
+    y = int(node.y) if float(node.y).is_integer() else round(node.y, 5)
+    return [x, y, t] + list(node.extra or [])
+  parts = [formatCoordinate(node.x), formatCoordinate(node.y), node.type.upper()]
+  if node.smooth:
+    parts.append('SMOOTH')
+  if node.extra:
+    parts.append(node.extra)
+  return ' '.join(parts)
+
+class Path(object):
+  def __init__(self, nodes = None, closed = True, data = None):
+    self.nodes = list(nodes or [])
+    self.closed = closed
+    # data: the source dict, keeps keys this module does not know about
+    self.data = data
+    self.changed = False
+
+  @property
+  def segments(self):
+    return bezier.contourSegments(self.nodes, self.closed)
+
+  @property
+  def bounds(self):
+    return bezier.unionBounds([bezier.segmentBounds(s) for s in self.segments])
+
+  def applyTransform(self, transform):
+    for n in self.nodes:
+      n.x, n.y = bezier.transformPoint((n.x, n.y), transform)
+    self.changed = True
+
+class Component(object):
+  def __init__(self, name, transform = (1, 0, 0, 1, 0, 0), data = None):
+    self.name = name
+    self.componentName = name
+    self.transform = tuple(transform)
+    self.data = data
+    self.changed = False
+
+  @property
+  def position(self):
+    return (self.transform[4], self.transform[5])
+
+  def applyTransform(self, transform):
+    self.transform = bezier.multiplyTransforms(self.transform, transform)
+    self.changed = True
+
+class Anchor(object):
+  def __init__(self, name, x = 0, y = 0, data = None):
+    self.name = name
+    self.x = x
+    self.y = y
+    self.data = data
+
+  @property
+  def position(self):
+    return (self.x, self.y)
+
+TRANSFORM_2 = re.compile(r'[-+0-9.eE]+')
+
+def parseShapes(layerData, formatVersion):
+  """Returns list( Path or Component ) in the order of the file."""
+  shapes = list()
+
+  if formatVersion >= 3:
+    for s in layerData.get('shapes') or []:
+      if 'ref' in s:
+        x, y = (list(s.get('pos') or [0, 0]) + [0, 0])[:2]
+        sx, sy = (list(s.get('scale') or [1, 1]) + [1, 1])[:2]
+        angle = math.radians(s.get('angle', 0))
+        cos, sin = math.cos(angle), math.sin(angle)
+        shapes.append(Component(s['ref'], (sx * cos, sx * sin, -sy * sin, sy * cos, x, y), s))
+      else:
+        shapes.append(Path([parseNode(n, 3) for n in s.get('nodes') or []], bool(s.get('closed', 0)), s))
+  else:
+    for p in layerData.get('paths') or []:
+      shapes.append(Path([parseNode(n, 2) for n in p.get('nodes') or []], bool(p.get('closed', 0)), p))
+    for c in layerData.get('components') or []:
+      transform = (1, 0, 0, 1, 0, 0)
+      if 'transform' in c:
+        transform = tuple(float(v) for v in TRANSFORM_2.findall(c['transform']))
+      shapes.append(Component(c['name'], transform, c))
+
+  return shapes
+
+def shapeData(shape, formatVersion):
+  if isinstance(shape, Path):
+    d = collections.OrderedDict(shape.data or ())
+    d['closed'] = 1 if shape.closed else 0
+    d['nodes'] = [nodeData(n, formatVersion) for n in shape.nodes]
+    if formatVersion >= 3:
+      # Glyphs 3 writes closed first
+      d.move_to_end('nodes')
+    return d
+
+  d = collections.OrderedDict(shape.data or ())
+  a, b, c, dd, x, y = shape.transform
+  if formatVersion >= 3:
+    d['ref'] = shape.name
+    if x or y:
+      d['pos'] = [int(v) if float(v).is_integer() else round(v, 5) for v in (x, y)]
+    else:
+      d.pop('pos', None)
+  else:
+    d['name'] = shape.name
+    if shape.transform != (1, 0, 0, 1, 0, 0):
+      d['transform'] = '{%s}' % ', '.join(formatCoordinate(v) for v in shape.transform)
+    else:
+      d.pop('transform', None)
+  return d
+
+class Layer(object):
+  def __init__(self, glyph, data):
+    self.parent = glyph
+    self.font = glyph.font
+    self.data = data
+    self.shapes = None
+    self.anchorList = None
+    self.changed = False
+
+  @property
+  def layerId(self):
+    return self.data.get('layerId')
+
+  @property
+  def associatedMasterId(self):
+    return self.data.get('associatedMasterId', self.data.get('layerId'))
+
+  @property
+  def isMasterLayer(self):
+    return 'associatedMasterId' not in self.data
+
+  @property
+  def name(self):
+    return self.data.get('name')
+
+  def loadShapes(self):
+    if self.shapes is None:
+      self.shapes = parseShapes(self.data, self.font.formatVersion)
+
+  @property
+  def paths(self):
+    self.loadShapes()
+    return [s for s in self.shapes if isinstance(s, Path)]
+
+  @paths.setter
+  def paths(self, paths):
+    self.loadShapes()
+    self.shapes = list(paths) + [s for s in self.shapes if not isinstance(s, Path)]
+    self.changed = True
+
+  @property
+  def components(self):
+    self.loadShapes()
+    return [s for s in self.shapes if isinstance(s, Component)]
+
+  @property
+  def anchors(self):
+    if self.anchorList is None:
+      self.anchorList = list()
+      for a in self.data.get('anchors') or []:
+        if self.font.formatVersion >= 3:
+          x, y = (list(a.get('pos') or [0, 0]) + [0, 0])[:2]
+        else:
+          x, y = [float(v) for v in TRANSFORM_2.findall(a.get('position', '{0, 0}'))]
+        self.anchorList.append(Anchor(a.get('name'), x, y, a))
+    return self.anchorList
+
+  @property
+  def width(self):
+    return self.data.get('width', 600)
+
+  @width.setter
+  def width(self, value):
+    self.data['width'] = value
+
+  def outlineSegments(self, depth = 0):
+    """Returns the segments of all paths and (decomposed) components."""
+    segments = list()
+    for p in self.paths:
+      segments.extend(p.segments)
+
+    if depth < 10:
+      for c in self.components:
+        layer = self.font.componentLayer(c.name, self.associatedMasterId)
+        if layer is not None:
+          segments.extend(bezier.transformSegments(layer.outlineSegments(depth + 1), c.transform))
+
+    return segments
+
+  @property
+  def bounds(self):
+    """(xMin, yMin, xMax, yMax), None for empty layers."""
+    return bezier.unionBounds([bezier.segmentBounds(s) for s in self.outlineSegments()])
+
+  @property
+  def LSB(self):
+    bounds = self.bounds
+    return 0 if bounds is None else bounds[0]
+
+  @LSB.setter
+  def LSB(self, value):
+    # empty layers behave like an outline of zero width at x = 0
+    d = value - self.LSB
+    if self.bounds is not None:
+      self.applyTransform((1, 0, 0, 1, d, 0))
+    self.width = self.width + d
+
+  @property
+  def RSB(self):
+    bounds = self.bounds
+    return self.width - (0 if bounds is None else bounds[2])
+
+  @RSB.setter
+  def RSB(self, value):
+    bounds = self.bounds
+    self.width = (0 if bounds is None else bounds[2]) + value
+
+  def applyTransform(self, transform):
+    """Transforms paths, components and anchors, like GSLayer.applyTransform."""
+    self.loadShapes()
+    for s in self.shapes:
+      s.applyTransform(transform)
+    for a in self.anchors:
+      a.x, a.y = bezier.transformPoint((a.x, a.y), transform)
+    self.changed = True
+
+  def sync(self):
+    """Writes changed shapes and anchors back into the layer data."""
+    # shapes changed on their own (e.g. component.applyTransform) count as well
+    if not self.changed and not any(s.changed for s in self.shapes or ()):
+      return
+    formatVersion = self.font.formatVersion
+
+    if formatVersion >= 3:
+      shapes = [shapeData(s, 3) for s in self.shapes]
+      if shapes or 'shapes' in self.data:
+        self.data['shapes'] = shapes
+    else:
+      paths = [shapeData(s, 2) for s in self.shapes if isinstance(s, Path)]
+      components = [shapeData(s, 2) for s in self.shapes if isinstance(s, Component)]
+      if paths or 'paths' in self.data:
+        self.data['paths'] = paths
+      if components or 'components' in self.data:
+        self.data['components'] = components
+
+    if self.anchorList is not None:
+      anchors = list()
+      for a in self.anchorList:
+        d = collections.OrderedDict(a.data or (('name', a.name),))
+        if formatVersion >= 3:
+          if a.x or a.y:
+            d['pos'] = [int(v) if float(v).is_integer() else round(v, 5) for v in (a.x, a.y)]
+        else:
+          d['position'] = '{%s, %s}' % (formatCoordinate(a.x), formatCoordinate(a.y))
+        anchors.append(d)
+      if anchors or 'anchors' in self.data:
+        self.data['anchors'] = anchors
+
+    self.changed = False
+    for s in self.shapes or ():
+      s.changed = False
+
+class Glyph(object):
+  def __init__(self, font, data):
+    self.font = font
+    self.data = data
+    self.layerList = None
+
+  @property
+  def name(self):
+    return self.data.get('glyphname')
+
+  @property
+  def id(self):
+    # kerning in .glyphs files refers to glyph names
+    return self.name
+
+  @property
+  def leftKerningGroup(self):
+    return self.data.get('kernLeft' if self.font.formatVersion >= 3 else 'leftKerningGroup')
+
+  @property
+  def rightKerningGroup(self):
+    return self.data.get('kernRight' if self.font.formatVersion >= 3 else 'rightKerningGroup')
+
+  @property
+  def layers(self):
+    if self.layerList is None:
+      self.layerList = [Layer(self, d) for d in self.data.get('layers') or []]
+    return self.layerList
+
+  def masterLayer(self, masterId):
+    for layer in self.layers:
+      if layer.isMasterLayer and layer.layerId == masterId:
+        return layer
+    return None
+
+GLYPHNAME = re.compile(br'^[ \t]*glyphname = (?P<value>"(?:[^"\\]|\\.)*"|[^\s;]+);', re.M)
+
+class GlyphList(object):
+  """Lazy list of the font's glyphs, indexable by position or glyph name."""
+
+  def __init__(self, font):
+    self.font = font
+    self.glyphs = dict()
+    self.nameIndex = None
+
+  def items(self):
+    return self.font.data['glyphs'] if 'glyphs' in self.font.data else []
+
+  def __len__(self):
+    return len(self.items())
+
+  def glyphAt(self, i):
+    if i not in self.glyphs:
+      self.glyphs[i] = Glyph(self.font, self.items()[i])
+    return self.glyphs[i]
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self.glyphAt(i)
+
+  def buildNameIndex(self):
+    """Maps glyph names to positions by searching the source for the glyphname lines, without parsing the glyphs."""
+    self.nameIndex = dict()
+    items = self.items()
+
+    if isinstance(items, LazyList) and not items.structureChanged:
+      source = self.font.source
+      starts = [item[0] for item in items.items]
+      found = set()
+      for match in GLYPHNAME.finditer(source, items.start, items.end):
+        i = bisect.bisect_right(starts, match.start()) - 1
+        if i < 0 or i in found or match.start() > items.items[i][1]:
+          continue
+        found.add(i)
+        self.nameIndex[tokenValue(TOKEN.match(source, match.start('value')))] = i
+      missing = [i for i in range(len(items)) if i not in found]
+    else:
+      missing = range(len(items))
+
+    for i in missing:
+      self.nameIndex[self.glyphAt(i).name] = i
+
+  def __getitem__(self, key):
+    if isinstance(key, int):
+      return self.glyphAt(key)
+    if self.nameIndex is None:
+      self.buildNameIndex()
+    i = self.nameIndex.get(key)
+    return None if i is None else self.glyphAt(i)
+
+  def loaded(self):
+    return self.glyphs.values()
+
+  def unload(self, glyph):
+    """Forgets a glyph if it was not changed, to keep memory flat while going through all glyphs once."""
+    i = next((i for i, g in self.glyphs.items() if g is glyph), None)
+    if i is None:
+      return
+    if glyph.layerList is not None:
+      for layer in glyph.layerList:
+        layer.sync()
+    items = self.items()
+    if not isinstance(items, LazyList) or items.unload(i):
+      del self.glyphs[i]
+
+class Font(object):
+  """A .glyphs file. Parsing happens on demand, see the module documentation."""
+
+  def __init__(self, path = None, source = None):
+    self.path = path
+    if source is None:
+      with open(path, 'rb') as f:
+        try:
+          source = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+          # empty files cannot be mapped
+          source = f.read()
+    self.source = source
+    self.data = LazyDict(source, 0, {'glyphs': lazyGlyphList})
+    self.glyphs = GlyphList(self)
+    self.customParameters = CustomParameters(self.data)
+    self.userData = UserData(self.data)
+    self.masterList = None
+    self.instanceList = None
+
+  @property
+  def formatVersion(self):
+    return self.data.get('.formatVersion', 2)
+
+  @property
+  def familyName(self):
+    return self.data.get('familyName')
+
+  @property
+  def axes(self):
+    if self.formatVersion >= 3:
+      return [Axis(a.get('name'), a.get('tag')) for a in self.data.get('axes') or []]
+    axes = self.customParameters['Axes']
+    if axes:
+      return [Axis(a.get('Name'), a.get('Tag')) for a in axes]
+    return [Axis('Weight', 'wght'), Axis('Width', 'wdth')]
+
+  @property
+  def masters(self):
+    if self.masterList is None:
+      self.masterList = [Master(self, d) for d in self.data.get('fontMaster') or []]
+    return self.masterList
+
+  @property
+  def instances(self):
+    if self.instanceList is None:
+      self.instanceList = [Instance(self, d) for d in self.data.get('instances') or []]
+    return self.instanceList
+
+  @property
+  def kerningKey(self):
+    return 'kerningLTR' if self.formatVersion >= 3 else 'kerning'
+
+  @property
+  def kerning(self):
+    if self.kerningKey not in self.data:
+      self.data[self.kerningKey] = collections.OrderedDict()
+    return self.data[self.kerningKey]
+
+  @kerning.setter
+  def kerning(self, value):
+    self.data[self.kerningKey] = value
+
+  def componentLayer(self, glyphName, masterId):
+    glyph = self.glyphs[glyphName]
+    return None if glyph is None else glyph.masterLayer(masterId)
+
+  def dumps(self):
+    """Returns the file contents as bytes."""
+    for glyph in self.glyphs.loaded():
+      if glyph.layerList is not None:
+        for layer in glyph.layerList:
+          layer.sync()
+
+    if self.kerningKey in self.data and self.data.isParsed(self.kerningKey) and not self.data[self.kerningKey] and not self.data.isUnchanged(self.kerningKey):
+      # do not add an empty kerning table
+      if self.data.entries[self.kerningKey][0] is None:
+        del self.data[self.kerningKey]
+
+    edits = list()
+    self.data.collectEdits(edits)
+    edits.sort()
+
+    # splice the changed regions into the source
+    out = list()
+    pos = 0
+    for start, end, replacement in edits:
+      out.append(self.source[pos:start])
+      out.append(replacement)
+      pos = end
+    out.append(self.source[pos:])
+
+    return b''.join(out)
+
+  def save(self, path = None):
+    """Writes the file. The source stays mapped, so the new file is written next to it and moved into place."""
+    data = self.dumps()
+    path = path or self.path
+    folder = os.path.dirname(os.path.abspath(path))
+
+    handle, temporaryPath = tempfile.mkstemp(dir = folder, suffix = '.glyphs')
+    try:
+      with os.fdopen(handle, 'wb') as f:
+        f.write(data)
+      if os.path.exists(path):
+        shutil.copymode(path, temporaryPath)
+      os.replace(temporaryPath, path)
+    except BaseException:
+      os.remove(temporaryPath)
+      raise
+
+  def close(self):
+    if isinstance(self.source, mmap.mmap):
+      self.source.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
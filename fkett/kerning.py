@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""Headless kerning engine. Works on plain kerning tables as stored in font.kerning:
+
+  dict( master id: dict( left key: dict( right key: value ) ) )
+
+Left and right keys are either glyph ids or kerning groups (@MMK_L_… and @MMK_R_…)."""
+
+import array
+import concurrent.futures
+import json
+import zlib
+
+def flattenKerning(masterKerning):
+  """Flattens the kerning of one master into three parallel lists (left keys, right keys, values)."""
+  lefts = list()
+  rights = list()
+  values = list()
+
+  for leftId, kerningPair in masterKerning.items():
+    for rightId, kerningValue in kerningPair.items():
+      lefts.append(leftId)
+      rights.append(rightId)
+      values.append(kerningValue)
+
+  return lefts, rights, values
+
+def nestKerning(lefts, rights, values):
+  """Builds the nested kerning of one master from three parallel lists."""
+  masterKerning = dict()
+
+  for leftId, rightId, kerningValue in zip(lefts, rights, values):
+    masterKerning.setdefault(leftId, dict())[rightId] = kerningValue
+
+  return masterKerning
+
+def quantizeRound(value, step):
+  # Python's round(), halves go to the even multiple
+  return round(value / step) * step
+
+def quantizeHalfAwayFromZero(value, step):
+  if value < 0:
+    return -((-value * 2 + step) // (2 * step)) * step
+  return ((value * 2 + step) // (2 * step)) * step
+
+def quantizeFloor(value, step):
+  return (value // step) * step
+
+def quantizeCeil(value, step):
+  return -((-value) // step) * step
+
+def quantizeTowardZero(value, step):
+  if value < 0:
+    return quantizeCeil(value, step)
+  return quantizeFloor(value, step)
+
+QUANTIZE_MODES = {
+  'round': quantizeRound,
+  'halfAwayFromZero': quantizeHalfAwayFromZero,
+  'floor': quantizeFloor,
+  'ceil': quantizeCeil,
+  'towardZero': quantizeTowardZero,
+}
+
+class Quantizer(object):
+  """Snaps values to a grid of step. Every distinct value is computed once and then served from a lookup."""
+
+  def __init__(self, step = 5, mode = 'round'):
+    if mode not in QUANTIZE_MODES:
+      raise ValueError('Unknown quantize mode "%s", use one of: %s' % (mode, ', '.join(sorted(QUANTIZE_MODES))))
+
+    self.step = step
+    self.mode = mode
+    self.function = QUANTIZE_MODES[mode]
+    self.lookup = dict()
+
+  def __call__(self, value):
+    try:
+      return self.lookup[value]
+    except KeyError:
+      newValue = self.function(value, self.step) if value % self.step else value
+      self.lookup[value] = newValue
+      return newValue
+
+# quantizers: dict( (step, mode): Quantizer ), shared by all policies
+quantizers = dict()
+
+def getQuantizer(step = 5, mode = 'round'):
+  """Returns the shared quantizer for step and mode, so the lookups survive between calls."""
+  key = (step, mode)
+
+  if key not in quantizers:
+    quantizers[key] = Quantizer(step, mode)
+
+  return quantizers[key]
+
+class QuantizePolicy(object):
+  """Describes how kerning values are quantized and which pairs are removed afterwards."""
+
+  def __init__(self, step = 5, mode = 'round', pairSteps = None, removeZero = False, threshold = None):
+    # step:       default grid
+    # mode:       key of QUANTIZE_MODES
+    # pairSteps:  dict( (left key, right key): step ), overrides the default grid for single (class) pairs
+    # removeZero: remove pairs that end up at 0
+    # threshold:  remove pairs whose absolute value ends up below threshold
+
+    self.quantizer = getQuantizer(step, mode)
+    self.pairQuantizers = dict()
+    self.removeZero = bool(removeZero)
+    self.threshold = threshold
+
+    if pairSteps:
+      for pair, pairStep in pairSteps.items():
+        self.pairQuantizers[tuple(pair)] = getQuantizer(pairStep, mode)
+
+  def signature(self):
+    """Returns a string that changes whenever the policy would give different results."""
+    pairSteps = sorted((pair, q.step) for pair, q in self.pairQuantizers.items())
+    return repr((self.quantizer.step, self.quantizer.mode, pairSteps, self.removeZero, self.threshold))
+
+  def keeps(self, value):
+    if self.removeZero and value == 0:
+      return False
+    if self.threshold is not None and abs(value) < self.threshold:
+      return False
+    return True
+
+  def quantize(self, lefts, rights, values):
+    """Returns the quantized values of the parallel lists; removed pairs are None."""
+    quantizer = self.quantizer
+    keeps = self.keeps
+
+    if self.pairQuantizers:
+      pairQuantizers = self.pairQuantizers
+      newValues = [pairQuantizers.get((l, r), quantizer)(v) for l, r, v in zip(lefts, rights, values)]
+    else:
+      newValues = [quantizer(v) for v in values]
+
+    if self.removeZero or self.threshold is not None:
+      newValues = [v if keeps(v) else None for v in newValues]
+
+    return newValues
+
+def quantizeKerning(kerning, masterIds = None, policy = None, log = None):
+  """Returns a new kerning table with the values of the given masters quantized according to policy."""
+  # kerning:   dict( master id: dict( left key: dict( right key: value ) ) )
+  # masterIds: list( master id ), None for all masters of the table
+  # policy:    QuantizePolicy, None for rounding to the nearest 5
+  # log:       file-like object, receives one line per changed or removed pair
+
+  if masterIds is None:
+    masterIds = list(kerning.keys())
+  if policy is None:
+    policy = QuantizePolicy()
+
+  newKerning = dict()
+
+  for masterId in masterIds:
+    lefts, rights, values = flattenKerning(kerning[masterId])
+    newValues = policy.quantize(lefts, rights, values)
+
+    if log is not None:
+      for leftId, rightId, kerningValue, newKerningValue in zip(lefts, rights, values, newValues):
+        if newKerningValue is None:
+          log.write('%s%s: was %s, now removed\n' % (leftId, rightId, kerningValue))
+        elif kerningValue != newKerningValue:
+          log.write('%s%s: was %s, now %s\n' % (leftId, rightId, kerningValue, newKerningValue))
+
+    kept = [i for i, v in enumerate(newValues) if v is not None]
+    if len(kept) != len(newValues):
+      lefts = [lefts[i] for i in kept]
+      rights = [rights[i] for i in kept]
+      newValues = [newValues[i] for i in kept]
+
+    newKerning[masterId] = nestKerning(lefts, rights, newValues)
+
+  return newKerning
+
+def packMasterKerning(masterKerning):
+  """Packs the kerning of one master into a compact form for sending it to a worker process."""
+  # returns (keys, left indices, right indices, values), the indices point into keys
+
+  lefts, rights, values = flattenKerning(masterKerning)
+  keys = sorted(set(lefts) | set(rights))
+  keyIndex = dict((k, i) for i, k in enumerate(keys))
+
+  return keys, array.array('l', [keyIndex[k] for k in lefts]), array.array('l', [keyIndex[k] for k in rights]), values
+
+def quantizePackedMaster(task):
+  """Worker: quantizes one packed master and returns only the diffs as list( (pair index, new value or None) )."""
+  keys, leftIndices, rightIndices, values, policy = task
+  newValues = policy.quantize([keys[i] for i in leftIndices], [keys[i] for i in rightIndices], values)
+
+  return [(i, v) for i, (kerningValue, v) in enumerate(zip(values, newValues)) if v is None or v != kerningValue]
+
+def quantizeKerningParallel(kerning, masterIds = None, policy = None, log = None, workers = None):
+  """Like quantizeKerning, but quantizes every master in its own worker process. Only masters with changes are returned."""
+  # workers: number of processes, None for one per CPU, 1 to run everything in this process
+
+  if masterIds is None:
+    masterIds = list(kerning.keys())
+  if policy is None:
+    policy = QuantizePolicy()
+
+  packed = [packMasterKerning(kerning[masterId]) for masterId in masterIds]
+  tasks = [p + (policy,) for p in packed]
+
+  if workers == 1 or len(tasks) < 2:
+    results = [quantizePackedMaster(t) for t in tasks]
+  else:
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+      results = list(executor.map(quantizePackedMaster, tasks))
+
+  # apply all diffs in one batch on this side
+  newKerning = dict()
+
+  for masterId, (keys, leftIndices, rightIndices, values), diffs in zip(masterIds, packed, results):
+    if not diffs:
+      continue
+
+    newMasterKerning = dict((leftId, dict(kerningPair)) for leftId, kerningPair in kerning[masterId].items())
+
+    for i, newKerningValue in diffs:
+      leftId = keys[leftIndices[i]]
+      rightId = keys[rightIndices[i]]
+
+      if newKerningValue is None:
+        del newMasterKerning[leftId][rightId]
+        if not newMasterKerning[leftId]:
+          del newMasterKerning[leftId]
+      else:
+        newMasterKerning[leftId][rightId] = newKerningValue
+
+      if log is not None:
+        log.write('%s%s: was %s, now %s\n' % (leftId, rightId, values[i], 'removed' if newKerningValue is None else newKerningValue))
+
+    newKerning[masterId] = newMasterKerning
+
+  return newKerning
+
+def roundKerning(kerning, masterIds = None, precision = 5, log = None):
+  """Returns a new kerning table with the values of the given masters rounded to the nearest multiple of precision."""
+  return quantizeKerning(kerning, masterIds, QuantizePolicy(precision), log)
+
+def isGroupKey(key):
+  return key.startswith('@')
+
+def buildGroupIndex(glyphs):
+  """Returns the kerning group keys of all glyphs as (leftGroups, rightGroups)."""
+  # leftGroups:  dict( glyph id: '@MMK_L_…' ), the key a glyph kerns with on the left side of a pair
+  # rightGroups: dict( glyph id: '@MMK_R_…' ), the key a glyph kerns with on the right side of a pair
+
+  leftGroups = dict()
+  rightGroups = dict()
+
+  for glyph in glyphs:
+    if glyph.rightKerningGroup:
+      leftGroups[glyph.id] = '@MMK_L_' + glyph.rightKerningGroup
+    if glyph.leftKerningGroup:
+      rightGroups[glyph.id] = '@MMK_R_' + glyph.leftKerningGroup
+
+  return leftGroups, rightGroups
+
+def inheritedValue(masterKerning, leftId, rightId, leftGroups, rightGroups):
+  """Returns the value a pair would get without its own entry, or None if that is ambiguous."""
+  leftGroup = None if isGroupKey(leftId) else leftGroups.get(leftId)
+  rightGroup = None if isGroupKey(rightId) else rightGroups.get(rightId)
+
+  # glyph exceptions fall back to glyph/group pairs first, then to the group/group pair
+  candidates = list()
+  if rightGroup:
+    candidates.append((leftId, rightGroup))
+  if leftGroup:
+    candidates.append((leftGroup, rightId))
+
+  values = set()
+  for l, r in candidates:
+    if r in masterKerning.get(l, ()):
+      values.add(masterKerning[l][r])
+
+  if not values and leftGroup and rightGroup and rightGroup in masterKerning.get(leftGroup, ()):
+    values.add(masterKerning[leftGroup][rightGroup])
+
+  if len(values) > 1:
+    # glyph/group and group/glyph pair disagree, keep the exception
+    return None
+
+  return values.pop() if values else 0
+
+def dependentLeftIds(masterKerning, leftIds, leftGroups):
+  """Returns leftIds with the glyph rows that inherit from one of its group rows, as a changed group row can make their exceptions redundant. None stays None (all rows)."""
+  # leftIds: set( left key ) of one master, e.g. the changed rows of an incremental run
+  if leftIds is None:
+    return None
+  groups = set(l for l in leftIds if isGroupKey(l))
+  if not groups:
+    return set(leftIds)
+  return set(leftIds) | set(l for l in masterKerning if not isGroupKey(l) and leftGroups.get(l) in groups)
+
+def compactKerning(kerning, leftGroups, rightGroups, masterIds = None, log = None, leftIds = None):
+  """Returns (new kerning table, number of removed pairs) without the exceptions that equal the value they would inherit anyway."""
+  # kerning:     dict( master id: dict( left key: dict( right key: value ) ) )
+  # leftGroups:  see buildGroupIndex
+  # rightGroups: see buildGroupIndex
+  # masterIds:   list( master id ), None for all masters of the table
+  # log:         file-like object, receives one line per removed pair
+  # leftIds:     set( left key ), only look at pairs in these rows, None for all rows, see dependentLeftIds
+
+  if masterIds is None:
+    masterIds = list(kerning.keys())
+
+  newKerning = dict()
+  removed = 0
+
+  for masterId in masterIds:
+    masterKerning = kerning[masterId]
+    newMasterKerning = dict()
+
+    for leftId, kerningPair in masterKerning.items():
+      if leftIds is not None and leftId not in leftIds:
+        newMasterKerning[leftId] = kerningPair
+        continue
+
+      leftIsGroup = isGroupKey(leftId)
+      newKerningPair = dict()
+
+      for rightId, kerningValue in kerningPair.items():
+        if not (leftIsGroup and isGroupKey(rightId)) and kerningValue == inheritedValue(masterKerning, leftId, rightId, leftGroups, rightGroups):
+          removed += 1
+          if log is not None:
+            log.write('%s%s: was %s, now removed (same as inherited value)\n' % (leftId, rightId, kerningValue))
+        else:
+          newKerningPair[rightId] = kerningValue
+
+      if newKerningPair:
+        newMasterKerning[leftId] = newKerningPair
+
+    newKerning[masterId] = newMasterKerning
+
+  return newKerning, removed
+
+def rowFingerprint(kerningPair):
+  """Returns a checksum of one row (all pairs of one left key) that is stable between sessions."""
+  # keys are sorted and values formatted with %g, so the checksum does not depend on how the app orders and stores the row
+  rightIds = sorted(kerningPair)
+  return zlib.crc32(('%s\t%s' % (' '.join(rightIds), ' '.join(['%g' % kerningPair[r] for r in rightIds]))).encode('utf-8'))
+
+def kerningFingerprint(masterKerning):
+  """Returns dict( left key: row checksum ) of the kerning of one master."""
+  return dict((leftId, rowFingerprint(kerningPair)) for leftId, kerningPair in masterKerning.items())
+
+def normalizeFingerprints(fingerprints):
+  """Converts fingerprints read back from font.userData or a sidecar file into plain dicts."""
+  # fingerprints: dict( 'policy': signature, 'masters': dict( master id: dict( left key: checksum ) ) )
+  if not fingerprints:
+    return {'policy': None, 'masters': {}}
+
+  masters = dict()
+  for masterId, fingerprint in (fingerprints.get('masters') or {}).items():
+    masters[str(masterId)] = dict((str(leftId), int(checksum)) for leftId, checksum in fingerprint.items())
+
+  return {'policy': fingerprints.get('policy') and str(fingerprints.get('policy')), 'masters': masters}
+
+def loadFingerprints(path):
+  """Reads fingerprints from a sidecar JSON file; returns empty fingerprints if there is none."""
+  try:
+    with open(path) as f:
+      return normalizeFingerprints(json.load(f))
+  except (IOError, OSError, ValueError):
+    return normalizeFingerprints(None)
+
+def saveFingerprints(path, fingerprints):
+  with open(path, 'w') as f:
+    json.dump(fingerprints, f, sort_keys = True)
+
+def quantizeKerningIncremental(kerning, fingerprints, masterIds = None, policy = None, log = None):
+  """Quantizes only the rows that changed since the fingerprints were taken.
+
+  Returns (new kerning table of the masters with changes, dirty left keys per master, new fingerprints)."""
+  # fingerprints: see normalizeFingerprints, from the last run; rows are only skipped if the policy is the same
+
+  if masterIds is None:
+    masterIds = list(kerning.keys())
+  if policy is None:
+    policy = QuantizePolicy()
+
+  fingerprints = normalizeFingerprints(fingerprints)
+  if fingerprints['policy'] != policy.signature():
+    fingerprints = normalizeFingerprints(None)
+
+  newKerning = dict()
+  dirtyLeftIds = dict()
+  newFingerprints = {'policy': policy.signature(), 'masters': dict(fingerprints['masters'])}
+
+  for masterId in masterIds:
+    masterKerning = kerning[masterId]
+    fingerprint = kerningFingerprint(masterKerning)
+    oldFingerprint = fingerprints['masters'].get(masterId, {})
+
+    dirty = dict((leftId, masterKerning[leftId]) for leftId, checksum in fingerprint.items() if oldFingerprint.get(leftId) != checksum)
+    dirtyLeftIds[masterId] = set(dirty)
+
+    if dirty:
+      newRows = quantizeKerning({masterId: dirty}, [masterId], policy, log)[masterId]
+      newMasterKerning = dict(masterKerning)
+      for leftId in dirty:
+        if leftId in newRows:
+          newMasterKerning[leftId] = newRows[leftId]
+          fingerprint[leftId] = rowFingerprint(newRows[leftId])
+        else:
+          del newMasterKerning[leftId]
+          del fingerprint[leftId]
+      newKerning[masterId] = newMasterKerning
+
+    newFingerprints['masters'][masterId] = fingerprint
+
+  return newKerning, dirtyLeftIds, newFingerprints
+
+def refreshFingerprints(fingerprints, kerning, leftIds):
+  """Updates the checksums of the given rows after the table was changed again (e.g. by compactKerning)."""
+  # leftIds: dict( master id: set( left key ) )
+  for masterId, masterLeftIds in leftIds.items():
+    if masterId not in kerning:
+      continue
+    fingerprint = fingerprints['masters'].setdefault(masterId, dict())
+    for leftId in masterLeftIds:
+      if leftId in kerning[masterId]:
+        fingerprint[leftId] = rowFingerprint(kerning[masterId][leftId])
+      else:
+        fingerprint.pop(leftId, None)
+
+def applyKerning(font, newKerning):
+  """Writes the kerning of every master in newKerning back to the font with one assignment per master."""
+  for masterId, masterKerning in newKerning.items():
+    font.kerning[masterId] = masterKerning
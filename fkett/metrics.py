@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Glyph metrics helpers shared by the Metrics scripts. They work on app layers and on fkett.glyphsfile layers alike."""
+
+def symmetricShift(width, targetWidth):
+  """Returns the horizontal shift of the outline that distributes targetWidth - width evenly on LSB and RSB; an odd unit goes to the LSB."""
+  d = int(targetWidth) - width
+  return d - d // 2
+
+def masterLayers(glyphs, masterIds = None):
+  """Returns the master layers of glyphs, only those of masterIds if given, glyph by glyph."""
+  layers = list()
+  for glyph in glyphs:
+    for layer in glyph.layers:
+      if layer.layerId == layer.associatedMasterId and (masterIds is None or layer.layerId in masterIds):
+        layers.append(layer)
+  return layers
+
+def widthShifts(layers, widths):
+  """Returns list( (layer, width, shift) ) for the layers whose width changes, computed before anything is changed."""
+  # widths: one width for all layers or list( width ) in the order of layers
+
+  layers = list(layers)
+  if isinstance(widths, (int, float)):
+    widths = [widths] * len(layers)
+
+  return [(layer, int(w), symmetricShift(layer.width, w)) for layer, w in zip(layers, widths) if int(w) != layer.width]
+
+def applyWidthShifts(shifts):
+  # one translation and one width assignment per layer
+  for layer, width, dx in shifts:
+    if dx:
+      layer.applyTransform((1, 0, 0, 1, dx, 0))
+    layer.width = width
+
+def changeWidthsSymmetrically(layers, widths):
+  """Changes the width of all layers symmetrically, with one translation and one width assignment per layer. Returns the number of changed layers."""
+  shifts = widthShifts(layers, widths)
+  applyWidthShifts(shifts)
+  return len(shifts)
+
+def changeWidthsWithComponents(layers, widths, graph, glyphs):
+  """Like changeWidthsSymmetrically, then moves the composites of the changed glyphs along (see fkett.components.ComponentGraph), bases first. Returns the number of changed layers."""
+  # glyphs: glyph by name, e.g. font.glyphs
+
+  shifts = widthShifts(layers, widths)
+  # moved: dict( (glyph name, master id): (shift, width change) )
+  moved = dict(((layer.parent.name, layer.layerId), (dx, width - layer.width)) for layer, width, dx in shifts)
+  applyWidthShifts(shifts)
+
+  changed = len(shifts)
+  for name in graph.affected(set(name for name, _ in moved)):
+    glyph = glyphs[name]
+    if glyph is None:
+      continue
+
+    for layer in glyph.layers:
+      masterId = layer.layerId
+      if masterId != layer.associatedMasterId:
+        continue
+
+      components = [(c, moved.get((c.componentName, masterId))) for c in layer.components]
+      components = [(c, m) for c, m in components if m is not None and (m[0] or m[1])]
+      if not components:
+        continue
+
+      own = moved.get((name, masterId))
+      if own is None:
+        # follow the base, i.e. the first component
+        first = layer.components[0]
+        base = components[0][1] if components[0][0] is first else (0, 0)
+        own = (first.transform[0] * base[0], base[1])
+        if own[0]:
+          layer.applyTransform((1, 0, 0, 1, own[0], 0))
+        if own[1]:
+          layer.width = layer.width + own[1]
+        moved[(name, masterId)] = own
+        changed += 1
+
+      # the outlines of changed components moved with their glyph already, shift them back so the composite moves as a whole
+      for component, (dx, _) in components:
+        a, b = component.transform[0], component.transform[1]
+        if dx:
+          component.applyTransform((1, 0, 0, 1, -a * dx, -b * dx))
+
+  return changed
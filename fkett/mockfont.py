@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""In-memory stand-in for the parts of Glyphs.font the scripts use, for running and benchmarking them outside the app.
+
+Every assignment that would go through a proxy object in the app (kerning, layer metrics, custom parameters) is counted in MockFont.writes."""
+
+import random
+import types
+
+class WriteCounter(object):
+  def __init__(self):
+    self.count = 0
+
+class CountingDict(dict):
+  """Dict that counts assignments and converts nested dicts, so font.kerning[m][l][r] = v is counted as well."""
+
+  def __init__(self, counter, *args, **kwargs):
+    self.counter = counter
+    super(CountingDict, self).__init__()
+    for key, value in dict(*args, **kwargs).items():
+      dict.__setitem__(self, key, self.wrap(value))
+
+  def wrap(self, value):
+    if isinstance(value, dict) and not isinstance(value, CountingDict):
+      return CountingDict(self.counter, value)
+    return value
+
+  def __setitem__(self, key, value):
+    self.counter.count += 1
+    dict.__setitem__(self, key, self.wrap(value))
+
+  def __delitem__(self, key):
+    self.counter.count += 1
+    dict.__delitem__(self, key)
+
+class UserData(CountingDict):
+  """Like userData in the app, missing keys read as None."""
+
+  def __missing__(self, key):
+    return None
+
+class MockMaster(object):
+  def __init__(self, counter, id, name, axes = None, customParameters = None):
+    self.id = id
+    self.name = name
+    self.axes = list(axes or [])
+    self.customParameters = CountingDict(counter, customParameters or {})
+
+class MockInstance(object):
+  def __init__(self, counter, name, axes = None, active = True, customParameters = None):
+    self.name = name
+    self.axes = list(axes or [])
+    self.active = active
+    self.customParameters = CountingDict(counter, customParameters or {})
+
+class MockNode(object):
+  def __init__(self, position = (0, 0), type = 'line'):
+    self.x, self.y = position
+    self.type = type
+    self.smooth = False
+
+class MockPath(object):
+  def __init__(self, nodes = None, closed = True):
+    self.nodes = list(nodes or [])
+    self.closed = closed
+
+class MockLayer(object):
+  """Layer with width and sidebearings. The outline is reduced to its horizontal extent (xMin, xMax); paths are only used by the outline scripts and do not move with it."""
+
+  def __init__(self, counter, parent, associatedMasterId, width, xMin, xMax):
+    self.counter = counter
+    self.parent = parent
+    self.associatedMasterId = associatedMasterId
+    self.layerId = associatedMasterId
+    self._width = width
+    self.xMin = xMin
+    self.xMax = xMax
+    self._paths = list()
+    self.components = list()
+
+  @property
+  def paths(self):
+    return self._paths
+
+  @paths.setter
+  def paths(self, value):
+    self.counter.count += 1
+    self._paths = list(value)
+
+  def addPath_(self, path):
+    self.counter.count += 1
+    self._paths.append(path)
+
+  def checkConnections(self):
+    pass
+
+  @property
+  def width(self):
+    return self._width
+
+  @width.setter
+  def width(self, value):
+    self.counter.count += 1
+    self._width = value
+
+  @property
+  def LSB(self):
+    return self.xMin
+
+  @LSB.setter
+  def LSB(self, value):
+    self.counter.count += 1
+    d = value - self.xMin
+    self.xMin += d
+    self.xMax += d
+    self._width += d
+
+  @property
+  def RSB(self):
+    return self._width - self.xMax
+
+  @RSB.setter
+  def RSB(self, value):
+    self.counter.count += 1
+    self._width = self.xMax + value
+
+  def applyTransform(self, transform):
+    # only translations are supported
+    self.counter.count += 1
+    self.xMin += transform[4]
+    self.xMax += transform[4]
+
+class MockGlyph(object):
+  def __init__(self, id, name, leftKerningGroup = None, rightKerningGroup = None):
+    self.id = id
+    self.name = name
+    self.leftKerningGroup = leftKerningGroup
+    self.rightKerningGroup = rightKerningGroup
+    self.layers = list()
+
+class MockFont(object):
+  def __init__(self, familyName = 'Mock'):
+    self.counter = WriteCounter()
+    self.familyName = familyName
+    self.masters = list()
+    self.instances = list()
+    self.axes = list()
+    self.glyphs = list()
+    self.customParameters = CountingDict(self.counter)
+    self.userData = UserData(self.counter)
+    self._kerning = CountingDict(self.counter)
+    self.filepath = None
+    self.selectedFontMaster = None
+    self.selectedLayers = list()
+    self.tabs = list()
+
+  @property
+  def kerning(self):
+    return self._kerning
+
+  @kerning.setter
+  def kerning(self, value):
+    self.counter.count += 1
+    self._kerning = CountingDict(self.counter, value)
+
+  @property
+  def writes(self):
+    return self.counter.count
+
+  def resetWrites(self):
+    self.counter.count = 0
+
+  def newTab(self, text = ''):
+    self.tabs.append(text)
+
+def mockGlyphsModule(font):
+  """Returns a stand-in for the GlyphsApp module with Glyphs.font set to font."""
+  module = types.ModuleType('GlyphsApp')
+  module.Glyphs = types.SimpleNamespace(font = font, fonts = [font])
+  module.Font = font
+  module.LINE = 'line'
+  module.CURVE = 'curve'
+  module.OFFCURVE = 'offcurve'
+  module.GSNode = MockNode
+  module.GSPath = MockPath
+  module.Message = lambda message, title = '', OKButton = None: None
+  return module
+
+def syntheticContour(x, y, size, loop = False):
+  """Returns the nodes (x, y, type, smooth) of a counter-clockwise contour with a line bottom and right side and a curved top; with loop, the top right corner crosses itself on the outside."""
+  nodes = [(x, y, 'line', False), (x + size, y, 'line', False)]
+  if loop:
+    nodes += [(x + size, y + 1.1 * size, 'line', False), (x + 1.1 * size, y + size, 'line', False)]
+  else:
+    nodes += [(x + size, y + size, 'line', False)]
+  nodes += [(x + 0.66 * size, y + 1.2 * size, 'offcurve', False), (x + 0.33 * size, y + 1.2 * size, 'offcurve', False), (x, y + size, 'curve', True)]
+  return nodes
+
+def syntheticFont(masters = 2, glyphs = 500, pairs = 10000, groups = 50, seed = 0, contours = 0, loops = 0.1, instances = None):
+  """Builds a MockFont with random metrics, a kerning table of pairs pairs per master, contours contours per master and instances instances with Axis Locations for the avar and GASP logic."""
+  # groups: number of kerning groups per side, glyphs are assigned to them round robin
+  # loops: share of the contours with an outside loop
+  # instances: spread evenly over the weight axis, default: one per master
+
+  r = random.Random(seed)
+  font = MockFont('Synthetic %d' % pairs)
+  c = font.counter
+
+  for m in range(masters):
+    weight = 100 + m * (800 // max(1, masters - 1))
+    font.masters.append(MockMaster(c, 'master%02d' % m, 'Master %d' % m, [weight], {'Axis Location': [{'Axis': 'Weight', 'Location': weight}]}))
+  font.axes.append({'Name': 'Weight', 'Tag': 'wght'})
+  font.customParameters['Variable Font Origin'] = font.masters[0].id
+  if instances is None:
+    for m in font.masters:
+      font.instances.append(MockInstance(c, m.name, m.axes))
+  else:
+    low, high = font.masters[0].axes[0], font.masters[-1].axes[0]
+    for i in range(instances):
+      font.instances.append(MockInstance(c, 'Instance %d' % i, [low + (high - low) * i / float(max(1, instances - 1))]))
+
+  for g in range(glyphs):
+    glyph = MockGlyph('glyph%05d' % g, 'g%05d' % g, 'group%03d' % (g % groups), 'group%03d' % (g % groups))
+    for m in font.masters:
+      xMin = r.randint(0, 100)
+      xMax = xMin + r.randint(100, 600)
+      glyph.layers.append(MockLayer(c, glyph, m.id, xMax + r.randint(0, 100), xMin, xMax))
+    font.glyphs.append(glyph)
+
+  # contours are dealt to the glyphs round robin, side by side
+  for i in range(contours):
+    glyph = font.glyphs[i % glyphs]
+    x = (i // glyphs) * 300
+    loop = r.random() < loops
+    for layer in glyph.layers:
+      path = MockPath()
+      for nx, ny, nodeType, smooth in syntheticContour(x, 0, 200, loop):
+        node = MockNode((nx, ny), nodeType)
+        node.smooth = smooth
+        path.nodes.append(node)
+      layer._paths.append(path)
+
+  lefts = ['@MMK_L_group%03d' % i for i in range(groups)] + [g.id for g in font.glyphs]
+  rights = ['@MMK_R_group%03d' % i for i in range(groups)] + [g.id for g in font.glyphs]
+  if pairs > len(lefts) * len(rights):
+    raise ValueError('%d pairs do not fit into %d x %d keys, use more glyphs' % (pairs, len(lefts), len(rights)))
+
+  kerning = dict()
+  for m in font.masters:
+    masterKerning = dict()
+    for p in r.sample(range(len(lefts) * len(rights)), pairs):
+      masterKerning.setdefault(lefts[p // len(rights)], dict())[rights[p % len(rights)]] = r.randint(-150, 50)
+    kerning[m.id] = masterKerning
+  font._kerning = CountingDict(c, kerning)
+
+  font.selectedFontMaster = font.masters[0]
+  font.selectedLayers = [g.layers[0] for g in font.glyphs]
+
+  return font
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""Finds and removes outside self-intersections of contours, without the Glyphs app.
+
+An outside self-intersection is a small loop where a contour crosses itself, typically at a corner after interpolating or offsetting. The loop runs against the direction of its contour, so its area has the opposite sign. Loops that run with the contour (overlaps on the inside) are kept.
+
+Contours are node lists like in fkett.bezier, (x, y, type) with an optional 4th item for smooth. Most contours cannot cross themselves, which is checked cheaply first (see mayIntersect). Otherwise the segments are flattened into edges, and edges that can cross are found with a sweep over their x extent. Every crossing is refined on the curves themselves (Newton), and the curves are split there."""
+
+import array
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+
+from fkett import bezier
+
+# flattening tolerance in units
+TOLERANCE = 0.5
+# loops removed from one contour at most
+MAX_LOOPS = 32
+EPSILON = 1e-9
+# on-curve nodes closer than this are the same node
+DUPLICATE_DISTANCE = 1e-3
+
+# node types in packed contours, upper case for smooth nodes
+NODE_CODES = {'line': 'l', 'curve': 'c', 'qcurve': 'q', 'offcurve': 'o'}
+NODE_TYPES = dict((code, nodeType) for nodeType, code in NODE_CODES.items())
+
+# hashes of layers that are known to be clean: dict( key chosen by the caller: contoursHash ), kept as long as the module is loaded (in the app until it quits)
+cleanLayers = dict()
+
+def contourEdges(segments, tolerance = TOLERANCE):
+  """Returns the flattened contour as list( (x0, y0, x1, y1, segment index, t0, t1) ) in contour order."""
+  edges = list()
+  for i, segment in enumerate(segments):
+    points = bezier.flattenSegment(segment, tolerance)
+    for (t0, p0), (t1, p1) in zip(points, points[1:]):
+      edges.append((p0[0], p0[1], p1[0], p1[1], i, t0, t1))
+  return edges
+
+def edgeCrossing(e, f):
+  """Returns (u, v), the fractions along e and f where they cross, or None. Parallel edges do not cross."""
+  rx, ry = e[2] - e[0], e[3] - e[1]
+  sx, sy = f[2] - f[0], f[3] - f[1]
+  d = rx * sy - ry * sx
+  if abs(d) < EPSILON:
+    return None
+  qx, qy = f[0] - e[0], f[1] - e[1]
+  u = (qx * sy - qy * sx) / d
+  v = (qx * ry - qy * rx) / d
+  if 0 <= u <= 1 and 0 <= v <= 1:
+    return u, v
+  return None
+
+def refineCrossing(s1, t1, s2, t2):
+  """Improves the parameters of a crossing of two segments with a few Newton steps."""
+  p, q = bezier.pointAt(s1, t1), bezier.pointAt(s2, t2)
+  fx, fy = p[0] - q[0], p[1] - q[1]
+
+  for _ in range(4):
+    if abs(fx) + abs(fy) < EPSILON:
+      break
+    a, c = bezier.derivativeAt(s1, t1)
+    b, d = bezier.derivativeAt(s2, t2)
+    det = b * c - a * d
+    if abs(det) < EPSILON:
+      break
+    n1 = t1 + (fx * d - b * fy) / det
+    n2 = t2 + (c * fx - a * fy) / det
+    if not (0 <= n1 <= 1 and 0 <= n2 <= 1):
+      break
+    p, q = bezier.pointAt(s1, n1), bezier.pointAt(s2, n2)
+    nx, ny = p[0] - q[0], p[1] - q[1]
+    if abs(nx) + abs(ny) >= abs(fx) + abs(fy):
+      break
+    t1, t2, fx, fy = n1, n2, nx, ny
+
+  return t1, t2
+
+def findSelfIntersections(segments, tolerance = TOLERANCE):
+  """Returns list( (i, ti, j, tj, point) ) where segment i at ti crosses segment j at tj, (i, ti) before (j, tj) along the contour. The contour is closed."""
+  edges = contourEdges(segments, tolerance)
+  count = len(edges)
+  order = sorted(range(count), key = lambda k: min(edges[k][0], edges[k][2]))
+
+  crossings = list()
+  seen = set()
+  active = list()
+
+  for k in order:
+    e = edges[k]
+    xMin = min(e[0], e[2])
+    yMin, yMax = min(e[1], e[3]), max(e[1], e[3])
+    # sweep: drop the edges that end left of this one
+    active = [a for a in active if max(edges[a][0], edges[a][2]) >= xMin]
+
+    for a in active:
+      if abs(a - k) == 1 or abs(a - k) == count - 1:
+        # neighbours share a point
+        continue
+      f = edges[a]
+      if max(f[1], f[3]) < yMin or min(f[1], f[3]) > yMax:
+        continue
+      hit = edgeCrossing(f, e)
+      if hit is None:
+        continue
+
+      first, second = (f, e) if a < k else (e, f)
+      u, v = hit if a < k else (hit[1], hit[0])
+      i, j = first[4], second[4]
+      ti = first[5] + u * (first[6] - first[5])
+      tj = second[5] + v * (second[6] - second[5])
+      ti, tj = refineCrossing(segments[i], ti, segments[j], tj)
+
+      key = (i, round(ti, 4), j, round(tj, 4))
+      if key in seen or (i == j and abs(ti - tj) < EPSILON):
+        continue
+      seen.add(key)
+      crossings.append((i, ti, j, tj, bezier.pointAt(segments[i], ti)))
+
+    active.append(k)
+
+  return crossings
+
+def monotonePieces(segments):
+  """Returns the segments split at their x and y extrema as list( (xMin, yMin, xMax, yMax, is line, start, end) ). Each piece lies within the box of its end points."""
+  pieces = list()
+  for segment in segments:
+    if len(segment) == 2:
+      points = segment
+    else:
+      ts = sorted(set(t for t in bezier.extremaParameters(segment, 0) + bezier.extremaParameters(segment, 1) if EPSILON < t < 1 - EPSILON))
+      points = [segment[0]] + [bezier.pointAt(segment, t) for t in ts] + [segment[-1]]
+
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+      pieces.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1), len(segment) == 2, (x0, y0), (x1, y1)))
+  return pieces
+
+def linesMeet(p0, p1, q0, q1):
+  """Returns True if the lines p0-p1 and q0-q1 have a point in common."""
+  def side(a, b, c):
+    d = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    return 0 if abs(d) < EPSILON else (1 if d > 0 else -1)
+
+  d1, d2, d3, d4 = side(q0, q1, p0), side(q0, q1, p1), side(p0, p1, q0), side(p0, p1, q1)
+  if d1 * d2 < 0 and d3 * d4 < 0:
+    return True
+  # touching or collinear, the boxes overlap already
+  return 0 in (d1, d2, d3, d4)
+
+def mayIntersect(segments):
+  """Returns False if a closed contour cannot cross itself: no two of its monotone pieces have overlapping boxes, apart from neighbours meeting at their common point."""
+  pieces = monotonePieces(segments)
+  count = len(pieces)
+  order = sorted(range(count), key = lambda k: pieces[k][0])
+  active = list()
+
+  for k in order:
+    xMin, yMin, xMax, yMax, line, start, end = pieces[k]
+    active = [a for a in active if pieces[a][2] >= xMin]
+
+    for a in active:
+      p = pieces[a]
+      if p[1] > yMax or p[3] < yMin:
+        continue
+      neighbours = abs(a - k) == 1 or abs(a - k) == count - 1
+
+      if line and p[4]:
+        # two lines are tested exactly, neighbours only meet at their common point
+        if not neighbours and linesMeet(start, end, p[5], p[6]):
+          return True
+        continue
+
+      if min(xMax, p[2]) - max(xMin, p[0]) > EPSILON and min(yMax, p[3]) - max(yMin, p[1]) > EPSILON:
+        return True
+      if min(xMax - xMin, yMax - yMin, p[2] - p[0], p[3] - p[1]) <= EPSILON:
+        # a flat box may be crossed anywhere
+        if not neighbours:
+          return True
+        continue
+      # boxes that only touch: a monotone piece reaches the border of its box only at its end points
+      if not neighbours and (start in (p[5], p[6]) or end in (p[5], p[6])):
+        return True
+
+    active.append(k)
+
+  return False
+
+def isDegenerate(segment):
+  x, y = segment[0]
+  return all(abs(p[0] - x) < EPSILON and abs(p[1] - y) < EPSILON for p in segment[1:])
+
+def withEnds(segment, start = None, end = None):
+  segment = list(segment)
+  if start is not None:
+    segment[0] = start
+  if end is not None:
+    segment[-1] = end
+  return tuple(segment)
+
+def splitContour(segments, i, ti, j, tj, point):
+  """Returns (loop, rest): the segments from (i, ti) to (j, tj) and the others, both closed at point. rest keeps the start of the contour."""
+  if i == j:
+    loop = [bezier.segmentPart(segments[i], ti, tj)]
+  else:
+    loop = [bezier.segmentPart(segments[i], ti, 1)] + list(segments[i + 1:j]) + [bezier.segmentPart(segments[j], 0, tj)]
+  rest = list(segments[:i]) + [bezier.segmentPart(segments[i], 0, ti)] + [bezier.segmentPart(segments[j], tj, 1)] + list(segments[j + 1:])
+
+  # both parts meet exactly at the crossing
+  loop[0] = withEnds(loop[0], start = point)
+  loop[-1] = withEnds(loop[-1], end = point)
+  rest[i] = withEnds(rest[i], end = point)
+  rest[i + 1] = withEnds(rest[i + 1], start = point)
+
+  return [s for s in loop if not isDegenerate(s)], [s for s in rest if not isDegenerate(s)]
+
+def removeLoop(segments, tolerance = TOLERANCE):
+  """Removes the smallest outside loop. Returns the new segments or None if there is none."""
+  area = bezier.segmentsArea(segments, tolerance)
+  if abs(area) < EPSILON:
+    return None
+
+  best = None
+  for i, ti, j, tj, point in findSelfIntersections(segments, tolerance):
+    loop, rest = splitContour(segments, i, ti, j, tj, point)
+    if not loop or not rest:
+      continue
+    loopArea = bezier.segmentsArea(loop, tolerance)
+    restArea = area - loopArea
+
+    # an outside loop runs against the contour and is the smaller part
+    if loopArea * area < 0 and abs(loopArea) < abs(restArea):
+      candidate = (abs(loopArea), rest)
+    elif restArea * area < 0 and abs(restArea) < abs(loopArea):
+      candidate = (abs(restArea), loop)
+    else:
+      continue
+    if best is None or candidate[0] < best[0]:
+      best = candidate
+
+  return None if best is None else best[1]
+
+def segmentsToNodes(segments, smooth = None):
+  """Returns the nodes of a closed contour as list( (x, y, type, smooth) ); smooth: set( (x, y) ) of smooth on-curve points. Segments keep the type of the nodes they came from, see bezier.contourSegments."""
+  smooth = smooth or set()
+  nodes = list()
+  for segment in segments:
+    for p in segment[1:-1]:
+      nodes.append((p[0], p[1], 'offcurve', False))
+    p = segment[-1]
+    nodeType = 'line' if len(segment) == 2 else ('qcurve' if len(segment) == 3 else 'curve')
+    nodes.append((p[0], p[1], nodeType, (p[0], p[1]) in smooth))
+  return nodes
+
+def dropDuplicateNodes(nodes):
+  """Removes line nodes that repeat the on-curve node before them (zero-length lines, e.g. a duplicated closing node) from a closed contour, in place. Returns the number of removed nodes."""
+  removed = 0
+  i = len(nodes) - 1
+  while i >= 0 and len(nodes) > 2:
+    node = nodes[i]
+    previous = nodes[i - 1]
+    if node[2] == 'line' and previous[2] != 'offcurve' and abs(node[0] - previous[0]) < DUPLICATE_DISTANCE and abs(node[1] - previous[1]) < DUPLICATE_DISTANCE:
+      del nodes[i]
+      removed += 1
+    i -= 1
+  return removed
+
+def removeOutsideLoops(nodes, closed = True, tolerance = TOLERANCE, stats = None):
+  """Returns (nodes, number of removed loops). nodes is returned as it was if nothing was removed; open contours are never changed."""
+  # stats: collections.Counter, counts 'skipped' contours that cannot cross themselves (open ones included) and 'processed' ones
+  if not closed or len(nodes) < 3:
+    if stats is not None:
+      stats['skipped'] += 1
+    return nodes, 0
+
+  segments = bezier.contourSegments(nodes, closed)
+  if not mayIntersect(segments):
+    if stats is not None:
+      stats['skipped'] += 1
+    return nodes, 0
+  if stats is not None:
+    stats['processed'] += 1
+
+  removed = 0
+  while removed < MAX_LOOPS:
+    result = removeLoop(segments, tolerance)
+    if result is None:
+      break
+    segments = result
+    removed += 1
+
+  if not removed:
+    return nodes, 0
+
+  smooth = set((n[0], n[1]) for n in nodes if len(n) > 3 and n[3] and n[2] != 'offcurve')
+  newNodes = segmentsToNodes(segments, smooth)
+  # a crossing right at a node leaves a zero-length line behind
+  dropDuplicateNodes(newNodes)
+  return newNodes, removed
+
+def packContours(contours):
+  """Packs the contours of one layer into a compact form for sending them to a worker process."""
+  # contours: list( (nodes, closed) )
+  # returns (coordinates, node types, node counts, closed flags)
+
+  coordinates = array.array('d')
+  types = list()
+  counts = array.array('l')
+  closedFlags = list()
+
+  for nodes, closed in contours:
+    for n in nodes:
+      coordinates.append(n[0])
+      coordinates.append(n[1])
+      code = NODE_CODES[n[2]]
+      types.append(code.upper() if len(n) > 3 and n[3] else code)
+    counts.append(len(nodes))
+    closedFlags.append('1' if closed else '0')
+
+  return coordinates, ''.join(types), counts, ''.join(closedFlags)
+
+def contoursHash(contours):
+  """Returns a hash of the node coordinates, types and smoothness of contours, list( (nodes, closed) ). Much cheaper than comparing layer strings."""
+  coordinates, types, counts, closedFlags = packContours(contours)
+  h = hashlib.blake2b(digest_size = 16)
+  h.update(coordinates.tobytes())
+  h.update(counts.tobytes())
+  h.update(('%s|%s' % (types, closedFlags)).encode('ascii'))
+  return h.hexdigest()
+
+def unpackContours(packed):
+  coordinates, types, counts, closedFlags = packed
+  contours = list()
+  start = 0
+  for count, closed in zip(counts, closedFlags):
+    nodes = list()
+    for i in range(start, start + count):
+      code = types[i]
+      nodes.append((coordinates[2 * i], coordinates[2 * i + 1], NODE_TYPES[code.lower()], code.isupper()))
+    contours.append((nodes, closed == '1'))
+    start += count
+  return contours
+
+def contourArea(nodes, closed = True):
+  """Returns the signed area of a contour, positive if counter-clockwise."""
+  return bezier.segmentsArea(bezier.contourSegments(nodes, closed)) if closed else 0.0
+
+def cleanPackedLayer(task):
+  """Worker: removes the outside loops of one packed layer and returns (changes, skipped, processed), changes: list( (contour index, nodes, loops, area change) )."""
+  packed, tolerance = task
+  stats = collections.Counter()
+  changes = list()
+
+  for i, (nodes, closed) in enumerate(unpackContours(packed)):
+    newNodes, loops = removeOutsideLoops(nodes, closed, tolerance, stats)
+    if loops:
+      changes.append((i, newNodes, loops, contourArea(newNodes) - contourArea(nodes)))
+
+  return changes, stats['skipped'], stats['processed']
+
+def iterCleanLayers(items, workers = None, tolerance = TOLERANCE, stats = None):
+  """Yields (key, changes) for every (key, contours) in items, in their order, see cleanPackedLayer. Items are read and cleaned in batches, so any number of layers can be streamed through."""
+  # contours: list( (nodes, closed) )
+  # workers: number of processes, None for one per CPU, 1 to run everything in this process
+  # the results do not depend on workers, every layer is cleaned by the same code from the same packed data
+
+  items = iter(items)
+  executor = None if workers == 1 else concurrent.futures.ProcessPoolExecutor(max_workers = workers)
+  batchSize = 1 if executor is None else (workers or os.cpu_count() or 1) * 64
+
+  try:
+    while True:
+      batch = list(itertools.islice(items, batchSize))
+      if not batch:
+        break
+      tasks = [(packContours(contours), tolerance) for _, contours in batch]
+      if executor is None or len(tasks) < 2:
+        results = [cleanPackedLayer(t) for t in tasks]
+      else:
+        # bigger chunks, as a single layer is quick
+        results = executor.map(cleanPackedLayer, tasks, chunksize = max(1, batchSize // 64))
+
+      for (key, _), (changes, skipped, processed) in zip(batch, results):
+        if stats is not None:
+          stats['skipped'] += skipped
+          stats['processed'] += processed
+        yield key, changes
+  finally:
+    if executor is not None:
+      executor.shutdown()
+
+def writeReport(f, glyphName, masterId, layerId, contours, changes):
+  """Writes one JSON line per changed contour of a layer to the text file f."""
+  # the hash of the contour before the change lets applyReport find out if it was edited since
+  for i, nodes, loops, areaChange in changes:
+    record = {
+      'glyph': glyphName,
+      'master': masterId,
+      'layer': layerId,
+      'contour': i,
+      'loops': loops,
+      'area_delta': round(areaChange, 3),
+      'hash': contoursHash([contours[i]]),
+    }
+    f.write(json.dumps(record, sort_keys = True) + '\n')
+
+def readReport(f):
+  """Yields ((glyph name, layer id), list( record )) for every layer in a report written by writeReport, one layer at a time."""
+  records = (json.loads(line) for line in f if line.strip())
+  for key, group in itertools.groupby(records, lambda r: (r['glyph'], r['layer'])):
+    yield key, list(group)
+
+def applyReport(contours, records, tolerance = TOLERANCE):
+  """Cleans only the contours listed in the report records of one layer. Returns (changes, stale records), a record is stale if its contour was edited since the report was written."""
+  changes = list()
+  stale = list()
+  for record in records:
+    i = record['contour']
+    if i >= len(contours) or contoursHash([contours[i]]) != record['hash']:
+      stale.append(record)
+      continue
+    nodes, closed = contours[i]
+    newNodes, loops = removeOutsideLoops(nodes, closed, tolerance)
+    if loops:
+      changes.append((i, newNodes, loops, contourArea(newNodes) - contourArea(nodes)))
+  return changes, stale
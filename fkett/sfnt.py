@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Reads and replaces single tables of TrueType/OpenType (sfnt) font files, without decompiling the rest of the font. The other tables are copied in chunks, only the table directory and the head checksum adjustment are rewritten."""
+
+import os
+import shutil
+import struct
+import tempfile
+
+HEADER = struct.Struct('>4sHHHH')
+TABLE_RECORD = struct.Struct('>4sLLL')
+CHECKSUM_MAGIC = 0xB1B0AFBA
+CHUNK_SIZE = 1 << 20
+
+class SfntError(ValueError):
+  pass
+
+def tableChecksum(data, checksum = 0):
+  """Returns the sfnt checksum of data, the sum of its big-endian uint32, zero padded to a multiple of 4."""
+  # data: bytes, starting on a multiple of 4 within the table
+  if len(data) % 4:
+    data = data + b'\0' * (4 - len(data) % 4)
+  return (checksum + sum(struct.unpack('>%dL' % (len(data) // 4), data))) & 0xFFFFFFFF
+
+def padding(length):
+  return -length % 4
+
+def searchParameters(numTables):
+  # searchRange, entrySelector, rangeShift of the table directory
+  entrySelector = max(numTables.bit_length() - 1, 0)
+  searchRange = (1 << entrySelector) * 16
+  return searchRange, entrySelector, numTables * 16 - searchRange
+
+def readTableDirectory(f):
+  """Returns (sfntVersion, dict( tag: (checksum, offset, length) )) of an open font file."""
+  f.seek(0)
+  header = f.read(HEADER.size)
+  if len(header) < HEADER.size:
+    raise SfntError('Not a font file')
+  sfntVersion, numTables = HEADER.unpack(header)[:2]
+  if sfntVersion not in (b'\0\1\0\0', b'OTTO', b'true'):
+    raise SfntError('Unsupported font file (%r), only single TTF/OTF files can be changed' % sfntVersion)
+
+  tables = dict()
+  records = f.read(numTables * TABLE_RECORD.size)
+  for i in range(numTables):
+    tag, checksum, offset, length = TABLE_RECORD.unpack_from(records, i * TABLE_RECORD.size)
+    tables[tag.decode('latin-1')] = (checksum, offset, length)
+  return sfntVersion, tables
+
+def readTable(path, tag):
+  """Returns the data of one table of a font file or None."""
+  with open(path, 'rb') as f:
+    _, tables = readTableDirectory(f)
+    if tag not in tables:
+      return None
+    _, offset, length = tables[tag]
+    f.seek(offset)
+    return f.read(length)
+
+def copyTable(source, target, offset, length):
+  # streams one table from source to target, returns its checksum
+  source.seek(offset)
+  checksum = 0
+  remaining = length
+  while remaining:
+    chunk = source.read(min(CHUNK_SIZE, remaining))
+    if not chunk:
+      raise SfntError('Table at offset %d is truncated' % offset)
+    target.write(chunk)
+    checksum = tableChecksum(chunk, checksum)
+    remaining -= len(chunk)
+  target.write(b'\0' * padding(length))
+  return checksum
+
+def replaceTable(path, tag, data, output = None):
+  """Writes the font at path with table tag replaced (or added) to output, default: path. The other tables are copied as they are."""
+  output = output or path
+  folder = os.path.dirname(os.path.abspath(output))
+
+  with open(path, 'rb') as source:
+    sfntVersion, tables = readTableDirectory(source)
+    tables = dict((t, (offset, length)) for t, (_, offset, length) in tables.items())
+    tables[tag] = None
+
+    # the directory is sorted by tag, the tables keep their order in the file and the new one goes last
+    tags = sorted(tables)
+    order = sorted([t for t in tags if tables[t] is not None], key = lambda t: tables[t][0]) + [tag]
+
+    directorySize = HEADER.size + len(tags) * TABLE_RECORD.size
+    offsets = dict()
+    position = directorySize + padding(directorySize)
+    for t in order:
+      length = len(data) if t == tag else tables[t][1]
+      offsets[t] = (position, length)
+      position += length + padding(length)
+
+    handle, temporaryPath = tempfile.mkstemp(dir = folder, suffix = os.path.splitext(output)[1])
+    try:
+      with os.fdopen(handle, 'w+b') as target:
+        target.seek(offsets[order[0]][0])
+        checksums = dict()
+        for t in order:
+          if t == tag:
+            target.write(data + b'\0' * padding(len(data)))
+            checksums[t] = tableChecksum(data)
+          else:
+            checksums[t] = copyTable(source, target, *tables[t])
+
+        if 'head' in offsets:
+          # the head checksum is computed with checkSumAdjustment set to 0
+          headOffset = offsets['head'][0]
+          target.seek(headOffset + 8)
+          adjustment = struct.unpack('>L', target.read(4))[0]
+          checksums['head'] = (checksums['head'] - adjustment) & 0xFFFFFFFF
+          target.seek(headOffset + 8)
+          target.write(b'\0\0\0\0')
+
+        directory = [HEADER.pack(sfntVersion, len(tags), *searchParameters(len(tags)))]
+        for t in tags:
+          directory.append(TABLE_RECORD.pack(t.encode('latin-1'), checksums[t], *offsets[t]))
+        directory = b''.join(directory)
+        target.seek(0)
+        target.write(directory + b'\0' * padding(len(directory)))
+
+        if 'head' in offsets:
+          fileChecksum = sum(checksums.values(), tableChecksum(directory)) & 0xFFFFFFFF
+          target.seek(offsets['head'][0] + 8)
+          target.write(struct.pack('>L', (CHECKSUM_MAGIC - fileChecksum) & 0xFFFFFFFF))
+    except BaseException:
+      os.remove(temporaryPath)
+      raise
+
+  if os.path.exists(output):
+    shutil.copymode(output, temporaryPath)
+  os.replace(temporaryPath, output)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Rules that map glyph names to target widths, for changing many widths at once (see fkett.metrics).
+
+A rule maps a glyph name, or a regular expression between slashes, to a width. The width can be a number or an expression, given for all masters or per master (by name or id, '*' for the others):
+
+  {
+    "space": 600,
+    "/.*\\\\.tf/": "master_width * 1.05",
+    "/.*\\\\.mono/": {"Regular": 600, "Bold": "glyph_width('zero.tf')"}
+  }
+
+The same as CSV: the first column is the glyph name or pattern, a 'width' column applies to all masters, any other column to the master it is named after. Empty cells are skipped.
+
+  glyph,width,Bold
+  space,600,
+  /.*\\.tf/,master_width * 1.05,620
+
+Expressions may use master_width (the current width of the glyph in the master), glyph_width('name') (the current width of another glyph in the same master), numbers, + - * / // %, round, int, min, max and abs.
+
+Glyph names are looked up in a dict and all patterns are combined into one regular expression, so each glyph is matched once, no matter how many rules there are. Exact names win over patterns, patterns are tried in the order of the rules. Because of that, patterns cannot use named groups, backreferences, conditionals or global flags like (?i); scoped flags like (?i:zero) work."""
+
+import ast
+import csv
+import io
+import json
+import os
+import re
+
+FUNCTIONS = {'round': round, 'int': int, 'min': min, 'max': max, 'abs': abs}
+NAMES = ('master_width', 'glyph_width')
+
+ALLOWED_NODES = (
+  ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.USub, ast.UAdd,
+)
+
+class WidthRuleError(ValueError):
+  pass
+
+class WidthExpression(object):
+  """A width expression, checked and compiled once."""
+
+  def __init__(self, source):
+    self.source = source
+    try:
+      tree = ast.parse(source.strip(), mode = 'eval')
+    except SyntaxError as e:
+      raise WidthRuleError('Invalid width expression "%s": %s' % (source, e.msg))
+
+    for node in ast.walk(tree):
+      if not isinstance(node, ALLOWED_NODES):
+        raise WidthRuleError('Not allowed in width expression "%s": %s' % (source, type(node).__name__))
+      if isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in NAMES:
+        raise WidthRuleError('Unknown name in width expression "%s": %s' % (source, node.id))
+      if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str)):
+        raise WidthRuleError('Not allowed in width expression "%s": %r' % (source, node.value))
+      if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+        raise WidthRuleError('Only plain calls of %s are allowed in width expression "%s"' % (', '.join(sorted(FUNCTIONS)), source))
+
+    self.code = compile(tree, '<width expression>', 'eval')
+    self.usesGlyphWidth = 'glyph_width' in [n.id for n in ast.walk(tree) if isinstance(n, ast.Name)]
+
+  def evaluate(self, masterWidth, glyphWidth = None):
+    names = dict(FUNCTIONS)
+    names['__builtins__'] = {}
+    names['master_width'] = masterWidth
+    names['glyph_width'] = glyphWidth
+    try:
+      width = eval(self.code, names)
+    except WidthRuleError:
+      raise
+    except Exception as e:
+      raise WidthRuleError('Width expression "%s" failed: %s' % (self.source, e))
+    if isinstance(width, bool) or not isinstance(width, (int, float)):
+      raise WidthRuleError('Width expression "%s" is not a number: %r' % (self.source, width))
+    return width
+
+def parseWidth(value):
+  """Returns a number or a WidthExpression."""
+  if isinstance(value, bool):
+    raise WidthRuleError('Invalid width: %r' % value)
+  if isinstance(value, (int, float)):
+    return value
+  if isinstance(value, str):
+    try:
+      return float(value) if '.' in value else int(value)
+    except ValueError:
+      return WidthExpression(value)
+  raise WidthRuleError('Invalid width: %r' % (value,))
+
+class WidthRule(object):
+  def __init__(self, pattern, widths):
+    # widths: dict( master name or id or '*': number or WidthExpression )
+    self.pattern = pattern
+    self.widths = widths
+
+  def widthFor(self, masterId, masterName):
+    for key in (masterId, masterName, '*'):
+      if key in self.widths:
+        return self.widths[key]
+    return None
+
+# backreferences, global inline flags and conditionals, which change their meaning once the patterns are joined; escapes are skipped
+UNJOINABLE = re.compile(r'\\([1-9])|\\.|(\(\?[aiLmsux]+\))|(\(\?\()')
+
+def checkPattern(pattern):
+  """Raises WidthRuleError if the regular expression of a /pattern/ rule is invalid or cannot be joined with the others."""
+  try:
+    compiled = re.compile(pattern[1:-1])
+  except re.error as e:
+    raise WidthRuleError('Invalid pattern %s: %s' % (pattern, e))
+  if compiled.groupindex:
+    raise WidthRuleError('Invalid pattern %s: named groups are not supported' % pattern)
+  for m in UNJOINABLE.finditer(pattern[1:-1]):
+    if m.group(1):
+      raise WidthRuleError('Invalid pattern %s: backreferences are not supported' % pattern)
+    if m.group(2):
+      raise WidthRuleError('Invalid pattern %s: global flags like %s are not supported, use (?i:...)' % (pattern, m.group(2)))
+    if m.group(3):
+      raise WidthRuleError('Invalid pattern %s: conditional groups are not supported' % pattern)
+
+class WidthRules(object):
+  """Compiled rules: one dict for glyph names, one regular expression for all patterns."""
+
+  def __init__(self, rules):
+    # rules: list( (glyph name or /pattern/, width or dict( master: width )) )
+    self.names = dict()
+    self.patterns = list()
+
+    for pattern, value in rules:
+      if isinstance(value, dict):
+        widths = dict((str(k), parseWidth(v)) for k, v in value.items())
+      else:
+        widths = {'*': parseWidth(value)}
+      rule = WidthRule(pattern, widths)
+
+      if len(pattern) > 1 and pattern.startswith('/') and pattern.endswith('/'):
+        checkPattern(pattern)
+        self.patterns.append(rule)
+      else:
+        self.names.setdefault(pattern, rule)
+
+    self.regex = None
+    if self.patterns:
+      try:
+        self.regex = re.compile('|'.join('(?P<r%d>%s)' % (i, r.pattern[1:-1]) for i, r in enumerate(self.patterns)))
+      except re.error as e:
+        raise WidthRuleError('Invalid patterns: %s' % e)
+
+  def __len__(self):
+    return len(self.names) + len(self.patterns)
+
+  def match(self, glyphName):
+    """Returns the rule for glyphName or None."""
+    rule = self.names.get(glyphName)
+    if rule is not None or self.regex is None:
+      return rule
+
+    m = self.regex.fullmatch(glyphName)
+    if m is None:
+      return None
+    # the outermost group of the first matching alternative is the last one closed
+    return self.patterns[int(m.lastgroup[1:])]
+
+def readRules(text, format):
+  """Returns the rules in text, format is 'json' or 'csv'."""
+  if format == 'json':
+    data = json.loads(text)
+    if not isinstance(data, dict):
+      raise WidthRuleError('Width rules must be a JSON object')
+    return WidthRules(list(data.items()))
+
+  if format == 'csv':
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+      return WidthRules(list())
+    header = [h.strip() for h in rows[0]]
+    rules = list()
+    for row in rows[1:]:
+      if not row or not row[0].strip() or row[0].startswith('#'):
+        continue
+      widths = dict()
+      for column, cell in zip(header[1:], row[1:]):
+        if cell.strip():
+          widths['*' if column.lower() == 'width' else column] = cell.strip()
+      rules.append((row[0].strip(), widths))
+    return WidthRules(rules)
+
+  raise WidthRuleError('Unknown width rules format: %s' % format)
+
+def loadRules(path):
+  """Reads width rules from a .json or .csv file."""
+  format = os.path.splitext(path)[1][1:].lower()
+  with io.open(path, encoding = 'utf-8-sig') as f:
+    return readRules(f.read(), format)
+
+def targetWidths(rules, glyphs, masters, allGlyphs = None):
+  """Returns (layers, widths) for the master layers of glyphs that a rule applies to, all widths computed before anything is changed."""
+  # masters: list( master ), only their layers are considered
+  # allGlyphs: the glyphs glyph_width() can refer to, default: glyphs
+
+  masterNames = dict((m.id, m.name) for m in masters)
+  layers = list()
+  widths = list()
+  widthIndex = None
+
+  for glyph in glyphs:
+    rule = rules.match(glyph.name)
+    if rule is None:
+      continue
+
+    for layer in glyph.layers:
+      masterId = layer.layerId
+      if masterId != layer.associatedMasterId or masterId not in masterNames:
+        continue
+      width = rule.widthFor(masterId, masterNames[masterId])
+      if width is None:
+        continue
+
+      if isinstance(width, WidthExpression):
+        if width.usesGlyphWidth and widthIndex is None:
+          widthIndex = dict((g.name, g) for g in (glyphs if allGlyphs is None else allGlyphs))
+        width = width.evaluate(layer.width, lambda name, m = masterId: glyphWidth(widthIndex, name, m))
+
+      layers.append(layer)
+      widths.append(int(round(width)))
+
+  return layers, widths
+
+def glyphWidth(glyphs, name, masterId):
+  glyph = glyphs.get(name)
+  if glyph is not None:
+    for layer in glyph.layers:
+      if layer.layerId == masterId:
+        return layer.width
+  raise WidthRuleError('glyph_width: no glyph %s in master %s' % (name, masterId))
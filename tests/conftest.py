@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import os
+import struct
+import sys
+
+import pytest
+
+# the shared fkett package lives next to the script folders
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fkett import sfnt
+
+def fvarTable(tags):
+  """A minimal fvar table with one axis per tag, 100 … 400 … 900, and no instances."""
+  out = [struct.pack('>HHHHHHHH', 1, 0, 16, 2, len(tags), 20, 0, 4 + 4 * len(tags))]
+  for tag in tags:
+    out.append(struct.pack('>4slllHH', tag.encode('latin-1'), 100 << 16, 400 << 16, 900 << 16, 0, 256))
+  return b''.join(out)
+
+def headTable():
+  # version 1.0, fontRevision, checkSumAdjustment, magicNumber, then zeros up to the 54 bytes of the table
+  return struct.pack('>LLLL', 0x00010000, 0x00010000, 0, 0x5F0F3CF5) + b'\0' * 38
+
+@pytest.fixture
+def makeFont(tmp_path):
+  """Returns a function that writes a font file with the given dict( tag: data ) and returns its path. The tables are stored in reverse tag order, the directory is sorted."""
+  def write(tables, name = 'font.ttf'):
+    tags = sorted(tables)
+    directorySize = sfnt.HEADER.size + len(tags) * sfnt.TABLE_RECORD.size
+    offset = directorySize + sfnt.padding(directorySize)
+    offsets = dict()
+    for tag in reversed(tags):
+      offsets[tag] = offset
+      offset += len(tables[tag]) + sfnt.padding(len(tables[tag]))
+
+    out = [sfnt.HEADER.pack(b'\0\1\0\0', len(tags), *sfnt.searchParameters(len(tags)))]
+    for tag in tags:
+      out.append(sfnt.TABLE_RECORD.pack(tag.encode('latin-1'), sfnt.tableChecksum(tables[tag]), offsets[tag], len(tables[tag])))
+    out.append(b'\0' * sfnt.padding(directorySize))
+    for tag in reversed(tags):
+      out.append(tables[tag] + b'\0' * sfnt.padding(len(tables[tag])))
+
+    path = str(tmp_path / name)
+    with open(path, 'wb') as f:
+      f.write(b''.join(out))
+    return path
+  return write
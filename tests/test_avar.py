@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import struct
+
+import pytest
+
+from fkett import avar, sfnt
+
+from conftest import fvarTable, headTable
+
+def master(i, name, design, location):
+  return {'id': 'm%02d' % i, 'name': name, 'axes': [design], 'customParameters': {'Axis Location': [{'Axis': 'Weight', 'Location': location}]}}
+
+def instance(name, design, active = True):
+  return {'name': name, 'active': active, 'axes': [design]}
+
+def fontData(masters, instances):
+  return {
+    'axes': [{'name': 'Weight', 'tag': 'wght'}],
+    'customParameters': {'Variable Font Origin': 'm01'},
+    'masters': masters,
+    'instances': instances,
+  }
+
+def weightFont():
+  # design coordinates are stem widths, the Axis Locations CSS weights
+  masters = [master(0, 'Thin', 20, 100), master(1, 'Regular', 80, 400), master(2, 'Black', 200, 900)]
+  instances = [instance('Thin', 20), instance('Light', 50), instance('Regular', 80), instance('Bold', 150), instance('Black', 200), instance('Hairline', 10, False)]
+  return fontData(masters, instances)
+
+def mappings(ttx):
+  return [l.strip() for l in ttx.splitlines() if '<mapping' in l]
+
+def test_default_target_values():
+  data = weightFont()
+  assert avar.defaultTargetValues(data) == [{0: 100, 1: 300, 2: 400, 3: 700, 4: 900}]
+
+def test_checklist():
+  data = weightFont()
+  assert avar.hasVariableFontOrigin(data)
+  assert avar.hasAxisLocationOnOrigin(data)
+  assert avar.hasAxisLocationOnExtremes(data)
+  del data['masters'][2]['customParameters']['Axis Location']
+  assert not avar.hasAxisLocationOnExtremes(data)
+  data['customParameters']['Variable Font Origin'] = 'm09'
+  with pytest.raises(avar.AvarError):
+    avar.hasAxisLocationOnOrigin(data)
+
+def test_solve_and_verify():
+  data = weightFont()
+  mapping = avar.solveAvar(data)
+  # Light and Bold are mapped, the extremes and the origin are the default factors
+  assert [(sorted(i), round(f.fromValue, 6), round(f.toValue, 6)) for i, f in mapping[0]] == [
+    ([0], -1, -1),
+    ([1], round(-100 / 300.0, 6), -0.5),
+    ([2], 0, 0),
+    ([3], 0.6, round(70 / 120.0, 6)),
+    ([4], 1, 1),
+  ]
+  checks = avar.verifyAvar(data, mapping)
+  assert len(checks) == 5
+  assert max(c.error for c in checks) <= avar.TOLERANCE
+  assert len(avar.verificationReport(data, checks)) == 1
+
+def test_verify_finds_wrong_mapping():
+  data = weightFont()
+  targetValues = avar.defaultTargetValues(data)
+  mapping = avar.solveAvar(data, targetValues)
+  targetValues[0][3] = 800
+  lines = avar.verificationReport(data, avar.verifyAvar(data, mapping, targetValues))
+  assert len(lines) == 2 and lines[1].startswith('Bold, wght')
+
+def test_master_and_instance_on_one_axis_location():
+  # SemiBold master at 120 and SemiBold instance at 130 both have the Axis Location 600, the instance wins
+  masters = [master(0, 'Thin', 20, 100), master(1, 'Regular', 80, 400), master(3, 'SemiBold', 120, 600), master(2, 'Black', 200, 900)]
+  instances = [instance('Thin', 20), instance('Regular', 80), instance('SemiBold', 130), instance('Black', 200)]
+  data = fontData(masters, instances)
+  mapping = avar.solveAvar(data)
+
+  ttx = mappings(avar.avarTTX(data, mapping))
+  assert len(ttx) == 4
+  assert ttx[2] == '<mapping from="0.400000" to="0.416667"/>   <!-- SemiBold -->'
+  assert len(avar.segmentMap(mapping[0])) == 4
+  assert max(c.error for c in avar.verifyAvar(data, mapping)) <= avar.TOLERANCE
+
+def test_master_between_the_extremes_is_mapped():
+  masters = [master(0, 'Thin', 20, 100), master(1, 'Regular', 80, 400), master(3, 'SemiBold', 120, 600), master(2, 'Black', 200, 900)]
+  data = fontData(masters, [instance('Regular', 80)])
+  mapping = avar.solveAvar(data)
+  assert mappings(avar.avarTTX(data, mapping))[2] == '<mapping from="0.400000" to="0.333333"/>   <!--  -->'
+
+def test_conflicting_instances():
+  data = weightFont()
+  targetValues = avar.defaultTargetValues(data)
+  targetValues[0][3] = 300
+  with pytest.raises(avar.AvarError, match = 'Light and Bold map Weight 300'):
+    avar.solveAvar(data, targetValues)
+
+def test_axis_without_range():
+  data = fontData([master(0, 'Regular', 80, 400), master(1, 'Regular 2', 80, 400)], [instance('Regular', 80)])
+  with pytest.raises(avar.AvarError, match = 'no range'):
+    avar.solveAvar(data)
+
+def test_decreasing_axis_locations():
+  data = weightFont()
+  data['masters'][2]['customParameters']['Axis Location'][0]['Location'] = 300
+  with pytest.raises(avar.AvarError, match = 'decrease'):
+    avar.solveAvar(data)
+
+def test_f2dot14():
+  assert avar.f2Dot14(1) == 16384
+  assert avar.f2Dot14(-0.5) == -8192
+  assert avar.f2Dot14(2.5) == 0x7FFF
+
+def test_compile():
+  data = weightFont()
+  mapping = avar.solveAvar(data)
+  table = avar.compileAvar(data, mapping, ['wdth', 'wght'])
+  assert struct.unpack_from('>HHHH', table) == (1, 0, 0, 2)
+  # wdth has no mapping, it keeps the identity of the default factors
+  assert struct.unpack_from('>Hhhhhhh', table, 8) == (3, -16384, -16384, 0, 0, 16384, 16384)
+  count, = struct.unpack_from('>H', table, 22)
+  pairs = [struct.unpack_from('>hh', table, 24 + 4 * i) for i in range(count)]
+  assert pairs == avar.segmentMap(mapping[0])
+  assert pairs[0] == (-16384, -16384) and pairs[2] == (0, 0) and pairs[-1] == (16384, 16384)
+  assert len(table) == 24 + 4 * count
+
+def test_inject(makeFont):
+  data = weightFont()
+  mapping = avar.solveAvar(data)
+  path = makeFont({'head': headTable(), 'fvar': fvarTable(['wdth', 'wght'])})
+  assert avar.injectAvar(path, data, mapping) == ['wdth', 'wght']
+  assert sfnt.readTable(path, 'avar') == avar.compileAvar(data, mapping, ['wdth', 'wght'])
+
+def test_inject_needs_the_axes(makeFont):
+  data = weightFont()
+  mapping = avar.solveAvar(data)
+  with pytest.raises(avar.AvarError, match = 'no fvar'):
+    avar.injectAvar(makeFont({'head': headTable()}), data, mapping)
+  with pytest.raises(avar.AvarError, match = 'no axis wght'):
+    avar.injectAvar(makeFont({'head': headTable(), 'fvar': fvarTable(['wdth'])}, 'wdth.ttf'), data, mapping)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import types
+
+import pytest
+
+from fkett.components import ComponentCycleError, ComponentGraph
+
+def glyph(name, components = (), layerComponents = None):
+  # one master layer and one brace layer, which does not count
+  master = types.SimpleNamespace(layerId = 'm01', associatedMasterId = 'm01', components = [types.SimpleNamespace(componentName = c) for c in components])
+  brace = types.SimpleNamespace(layerId = 'brace', associatedMasterId = 'm01', components = [types.SimpleNamespace(componentName = c) for c in layerComponents or ()])
+  return types.SimpleNamespace(name = name, layers = [master, brace])
+
+def test_bases_come_first():
+  graph = ComponentGraph([
+    glyph('Aringacute', ['Aring', 'acutecomb.case']),
+    glyph('Aring', ['A', 'ringcomb.case']),
+    glyph('Aacute', ['A', 'acutecomb.case']),
+    glyph('A'),
+    glyph('acutecomb.case', ['acutecomb']),
+    glyph('B'),
+  ])
+  assert graph.affected(['A']) == ['A', 'Aacute', 'Aring', 'Aringacute']
+  assert graph.affected(['acutecomb']) == ['acutecomb', 'acutecomb.case', 'Aacute', 'Aringacute']
+  assert graph.affected(['B']) == ['B']
+
+def test_order_does_not_depend_on_input_order():
+  glyphs = [glyph('A'), glyph('Aacute', ['A']), glyph('Agrave', ['A']), glyph('Abreve', ['A'])]
+  assert ComponentGraph(glyphs).affected(['A']) == ComponentGraph(list(reversed(glyphs))).affected(['A']) == ['A', 'Aacute', 'Abreve', 'Agrave']
+
+def test_only_master_layers():
+  graph = ComponentGraph([glyph('A'), glyph('B', layerComponents = ['A'])])
+  assert graph.affected(['A']) == ['A']
+
+def test_cycle():
+  graph = ComponentGraph([glyph('A', ['B']), glyph('B', ['A']), glyph('C', ['A'])])
+  with pytest.raises(ComponentCycleError, match = 'A, B'):
+    graph.affected(['A'])
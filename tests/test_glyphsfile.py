@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from fkett.glyphsfile import Font, GlyphsFileError
+
+FORMAT_2 = b'''{
+.appVersion = "1342";
+customParameters = (
+{
+name = Axes;
+value = (
+{
+Name = Weight;
+Tag = wght;
+}
+);
+}
+);
+familyName = "Old Sans";
+fontMaster = (
+{
+id = "3E7589AA-8194-470F-8E2E-13C1C581BE24";
+weight = Light;
+weightValue = 50;
+}
+);
+glyphs = (
+{
+glyphname = A;
+lastChange = "2020-01-01 10:00:00 +0000";
+layers = (
+{
+anchors = (
+{
+name = top;
+position = "{300, 700}";
+}
+);
+components = (
+{
+name = V;
+transform = "{1, 0, 0, 1, 10, 0}";
+}
+);
+layerId = "3E7589AA-8194-470F-8E2E-13C1C581BE24";
+paths = (
+{
+closed = 1;
+nodes = (
+"50 0 LINE",
+"300 700 LINE SMOOTH",
+"550 0 LINE"
+);
+}
+);
+width = 600;
+}
+);
+leftKerningGroup = A;
+rightKerningGroup = A;
+unicode = 0041;
+},
+{
+glyphname = V;
+layers = (
+{
+layerId = "3E7589AA-8194-470F-8E2E-13C1C581BE24";
+paths = (
+{
+closed = 1;
+nodes = (
+"20 700 LINE",
+"300 0 LINE",
+"580 700 LINE"
+);
+}
+);
+width = 600;
+}
+);
+unicode = 0056;
+}
+);
+kerning = {
+"3E7589AA-8194-470F-8E2E-13C1C581BE24" = {
+"@MMK_L_A" = {
+V = -33;
+};
+};
+};
+unitsPerEm = 1000;
+}
+'''
+
+FORMAT_3 = b'''{
+.appVersion = "3151";
+.formatVersion = 3;
+axes = (
+{
+name = Weight;
+tag = wght;
+}
+);
+familyName = "Test Sans";
+fontMaster = (
+{
+axesValues = (
+400
+);
+id = m01;
+name = Regular;
+}
+);
+glyphs = (
+{
+glyphname = A;
+kernLeft = A;
+kernRight = A;
+layers = (
+{
+anchors = (
+{
+name = top;
+pos = (300,700);
+}
+);
+layerId = m01;
+shapes = (
+{
+closed = 1;
+nodes = (
+(40,0,l),
+(100,350,o),
+(200,700,o),
+(300,700,cs),
+(560,0,l)
+);
+}
+);
+width = 600;
+}
+);
+note = "a \\"quoted\\" note
+over two lines";
+unicode = 65;
+},
+{
+glyphname = Aacute;
+layers = (
+{
+layerId = m01;
+shapes = (
+{
+ref = A;
+},
+{
+pos = (250,0);
+ref = acutecomb;
+}
+);
+width = 600;
+}
+);
+unicode = 193;
+}
+);
+kerningLTR = {
+m01 = {
+"@MMK_L_A" = {
+"@MMK_R_A" = -12;
+};
+};
+};
+unitsPerEm = 1000;
+}
+'''
+
+# both glyphs end a string in an escaped backslash, a quote parity check would pair the wrong quotes
+ESCAPED_BACKSLASHES = b'''{
+glyphs = (
+{
+glyphname = a;
+note = "line1
+ends \\\\";
+layers = (
+{
+width = 500;
+}
+);
+},
+{
+glyphname = b;
+note = "line1
+ends \\\\";
+layers = (
+{
+width = 510;
+}
+);
+}
+);
+}
+'''
+
+@pytest.mark.parametrize('source', [FORMAT_2, FORMAT_3])
+def test_unedited_round_trip(source):
+  font = Font(source = source)
+  assert font.dumps() == source
+
+@pytest.mark.parametrize('source', [FORMAT_2, FORMAT_3])
+def test_read_round_trip(source):
+  # reading every part parses it, but writes nothing back
+  font = Font(source = source)
+  for glyph in font.glyphs:
+    for layer in glyph.layers:
+      layer.paths, layer.components, layer.anchors, layer.width, layer.bounds
+  dict(font.kerning)
+  [(m.id, m.name, m.axes) for m in font.masters]
+  assert font.dumps() == source
+
+def test_format_2():
+  font = Font(source = FORMAT_2)
+  assert font.formatVersion == 2
+  assert [a['Tag'] for a in font.axes] == ['wght']
+  glyph = font.glyphs['A']
+  assert glyph.leftKerningGroup == 'A'
+  layer = glyph.layers[0]
+  assert [tuple(n)[:3] for n in layer.paths[0].nodes] == [(50, 0, 'line'), (300, 700, 'line'), (550, 0, 'line')]
+  assert layer.paths[0].nodes[1].smooth
+  assert layer.components[0].name == 'V'
+  assert (layer.anchors[0].x, layer.anchors[0].y) == (300, 700)
+
+def test_format_3():
+  font = Font(source = FORMAT_3)
+  assert font.formatVersion == 3
+  assert font.glyphs['A'].data['note'] == 'a "quoted" note\nover two lines'
+  layer = font.glyphs['Aacute'].layers[0]
+  assert [c.name for c in layer.components] == ['A', 'acutecomb']
+  assert font.kerning['m01']['@MMK_L_A']['@MMK_R_A'] == -12
+
+def test_kerning_edit_is_spliced():
+  font = Font(source = FORMAT_2)
+  font.kerning['3E7589AA-8194-470F-8E2E-13C1C581BE24'] = {'@MMK_L_A': {'V': -35}}
+  assert font.dumps() == FORMAT_2.replace(b'V = -33;', b'V = -35;')
+
+@pytest.mark.parametrize('source', [FORMAT_2, FORMAT_3])
+def test_width_edit_is_spliced(source):
+  font = Font(source = source)
+  font.glyphs['A'].layers[0].width = 610
+  assert font.dumps() == source.replace(b'width = 600;', b'width = 610;', 1)
+
+def test_path_edit_format_2():
+  font = Font(source = FORMAT_2)
+  layer = font.glyphs['V'].layers[0]
+  layer.applyTransform((1, 0, 0, 1, 10, 0))
+  data = font.dumps()
+  assert b'"30 700 LINE",\n"310 0 LINE",\n"590 700 LINE"' in data
+  # the other glyph is copied as it was
+  start = FORMAT_2.index(b'glyphname = A;')
+  end = FORMAT_2.index(b'glyphname = V;')
+  assert FORMAT_2[start:end] in data
+
+def test_path_edit_format_3(tmp_path):
+  font = Font(source = FORMAT_3)
+  layer = font.glyphs['A'].layers[0]
+  layer.applyTransform((1, 0, 0, 1, 10, 0))
+  path = str(tmp_path / 'font.glyphs')
+  font.save(path)
+
+  with Font(path) as saved:
+    layer = saved.glyphs['A'].layers[0]
+    assert [tuple(n)[:3] for n in layer.paths[0].nodes] == [(50, 0, 'line'), (110, 350, 'offcurve'), (210, 700, 'offcurve'), (310, 700, 'curve'), (570, 0, 'line')]
+    assert layer.paths[0].nodes[3].smooth
+    assert (layer.anchors[0].x, layer.anchors[0].y) == (310, 700)
+    # the components of the other glyph are not parsed or written
+    assert saved.glyphs['Aacute'].layers[0].components[1].transform[4] == 250
+
+def test_glyph_lookup_skips_strings():
+  font = Font(source = ESCAPED_BACKSLASHES)
+  assert font.glyphs['b'].layers[0].width == 510
+  assert font.glyphs['c'] is None
+  assert font.dumps() == ESCAPED_BACKSLASHES
+
+def test_invalid_file():
+  with pytest.raises(GlyphsFileError):
+    Font(source = b'{\nglyphs = (\n').glyphs['a']
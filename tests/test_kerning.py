@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import io
+
+import pytest
+
+from fkett import kerning
+
+LEFT_GROUPS = {'a': '@MMK_L_a', 'aacute': '@MMK_L_a'}
+RIGHT_GROUPS = {'v': '@MMK_R_v'}
+
+def table():
+  return {'m01': {'@MMK_L_a': {'@MMK_R_v': -22, 'w': 13}, 'a': {'v': -7, 'w': 17}}, 'm02': {'a': {'v': 23}}}
+
+@pytest.mark.parametrize('mode, value, expected', [
+  ('round', -7, -5),
+  ('round', 12.5, 10),
+  ('round', 17.5, 20),
+  ('halfAwayFromZero', -12.5, -15),
+  ('halfAwayFromZero', 12.5, 15),
+  ('floor', -7, -10),
+  ('ceil', -7, -5),
+  ('towardZero', -7, -5),
+  ('towardZero', 7, 5),
+])
+def test_quantize_modes(mode, value, expected):
+  assert kerning.Quantizer(5, mode)(value) == expected
+
+def test_unknown_mode():
+  with pytest.raises(ValueError):
+    kerning.Quantizer(5, 'nearest')
+
+def test_quantize_kerning():
+  log = io.StringIO()
+  newKerning = kerning.quantizeKerning(table(), ['m01'], kerning.QuantizePolicy(5), log)
+  assert newKerning == {'m01': {'@MMK_L_a': {'@MMK_R_v': -20, 'w': 15}, 'a': {'v': -5, 'w': 15}}}
+  assert 'av: was -7, now -5' in log.getvalue()
+
+def test_quantize_policy_removes_pairs():
+  policy = kerning.QuantizePolicy(10, 'round', {('a', 'w'): 5}, removeZero = True, threshold = 15)
+  newKerning = kerning.quantizeKerning(table(), ['m01'], policy)
+  # -7 is rounded to -10 and dropped by the threshold, a/w uses its own step
+  assert newKerning == {'m01': {'@MMK_L_a': {'@MMK_R_v': -20}, 'a': {'w': 15}}}
+
+def test_parallel_matches_serial():
+  policy = kerning.QuantizePolicy(5, 'floor', removeZero = True)
+  serial = kerning.quantizeKerning(table(), None, policy)
+  parallel = kerning.quantizeKerningParallel(table(), None, policy, workers = 1)
+  assert parallel == serial
+
+def test_compact_removes_inherited_exceptions():
+  kerningTable = {'m01': {'@MMK_L_a': {'@MMK_R_v': -20}, 'a': {'v': -20, '@MMK_R_v': -20}, 'aacute': {'v': -30}}}
+  compacted, removed = kerning.compactKerning(kerningTable, LEFT_GROUPS, RIGHT_GROUPS)
+  # a/v and a/@v equal the group pair, aacute/v is a real exception
+  assert removed == 2
+  assert compacted == {'m01': {'@MMK_L_a': {'@MMK_R_v': -20}, 'aacute': {'v': -30}}}
+
+def test_compact_keeps_ambiguous_exceptions():
+  kerningTable = {'m01': {'@MMK_L_a': {'v': -10}, 'a': {'@MMK_R_v': -20, 'v': -10}}}
+  compacted, removed = kerning.compactKerning(kerningTable, LEFT_GROUPS, RIGHT_GROUPS)
+  # a/v would inherit -20 from a/@v or -10 from @a/v
+  assert removed == 0
+  assert compacted == kerningTable
+
+def test_compact_only_given_rows():
+  kerningTable = {'m01': {'@MMK_L_a': {'@MMK_R_v': -20}, 'a': {'v': -20}, 'aacute': {'v': -20}}}
+  compacted, removed = kerning.compactKerning(kerningTable, LEFT_GROUPS, RIGHT_GROUPS, leftIds = {'a'})
+  assert removed == 1
+  assert compacted['m01']['aacute'] == {'v': -20}
+
+def test_dependent_left_ids():
+  masterKerning = {'@MMK_L_a': {}, 'a': {}, 'aacute': {}, 'v': {}}
+  assert kerning.dependentLeftIds(masterKerning, {'@MMK_L_a'}, LEFT_GROUPS) == {'@MMK_L_a', 'a', 'aacute'}
+  assert kerning.dependentLeftIds(masterKerning, {'v'}, LEFT_GROUPS) == {'v'}
+  assert kerning.dependentLeftIds(masterKerning, None, LEFT_GROUPS) is None
+
+def incrementalRun(kerningTable, fingerprints, policy = None):
+  # like the script: quantize the changed rows, compact them and the rows that depend on them, refresh the fingerprints
+  newKerning, dirtyLeftIds, fingerprints = kerning.quantizeKerningIncremental(kerningTable, fingerprints, None, policy)
+  for masterId in list(newKerning.keys()):
+    dirtyLeftIds[masterId] = kerning.dependentLeftIds(newKerning[masterId], dirtyLeftIds[masterId], LEFT_GROUPS)
+    compacted, _ = kerning.compactKerning(newKerning, LEFT_GROUPS, RIGHT_GROUPS, [masterId], None, dirtyLeftIds[masterId])
+    newKerning[masterId] = compacted[masterId]
+  kerning.refreshFingerprints(fingerprints, newKerning, dirtyLeftIds)
+  kerningTable = dict(kerningTable)
+  kerningTable.update(newKerning)
+  return kerningTable, dirtyLeftIds, fingerprints
+
+def test_incremental_skips_unchanged_rows():
+  kerningTable, dirty, fingerprints = incrementalRun(table(), None)
+  assert dirty['m01'] == {'@MMK_L_a', 'a'}
+  # a/w is rounded to the value it inherits from @a/w and compacted
+  assert kerningTable['m01']['a'] == {'v': -5}
+
+  _, dirty, _ = incrementalRun(kerningTable, fingerprints)
+  assert dirty == {'m01': set(), 'm02': set()}
+
+def test_incremental_rounds_changed_rows():
+  kerningTable, _, fingerprints = incrementalRun(table(), None)
+  kerningTable['m02'] = dict(kerningTable['m02'], v = {'a': -12})
+  kerningTable, dirty, fingerprints = incrementalRun(kerningTable, fingerprints)
+  assert dirty['m02'] == {'v'}
+  assert kerningTable['m02'] == {'a': {'v': 25}, 'v': {'a': -10}}
+
+def test_incremental_compacts_rows_of_changed_groups():
+  kerningTable = {'m01': {'@MMK_L_a': {'@MMK_R_v': -10}, 'a': {'@MMK_R_v': -20}}}
+  kerningTable, _, fingerprints = incrementalRun(kerningTable, None)
+  kerningTable['m01'] = dict(kerningTable['m01'], **{'@MMK_L_a': {'@MMK_R_v': -20}})
+  kerningTable, dirty, fingerprints = incrementalRun(kerningTable, fingerprints)
+  assert kerningTable['m01'] == {'@MMK_L_a': {'@MMK_R_v': -20}}
+  assert fingerprints['masters']['m01'] == kerning.kerningFingerprint(kerningTable['m01'])
+
+def test_incremental_policy_change_redoes_everything():
+  kerningTable, _, fingerprints = incrementalRun(table(), None)
+  _, dirty, _ = incrementalRun(kerningTable, fingerprints, kerning.QuantizePolicy(10))
+  assert dirty['m02'] == {'a'}
+
+def test_fingerprints_sidecar(tmp_path):
+  path = str(tmp_path / 'fingerprints.json')
+  assert kerning.loadFingerprints(path) == {'policy': None, 'masters': {}}
+  _, _, fingerprints = incrementalRun(table(), None)
+  kerning.saveFingerprints(path, fingerprints)
+  assert kerning.loadFingerprints(path) == fingerprints
+
+def test_row_fingerprint_ignores_order():
+  assert kerning.rowFingerprint({'v': -5, 'w': 10}) == kerning.rowFingerprint({'w': 10, 'v': -5})
+  assert kerning.rowFingerprint({'v': -5}) != kerning.rowFingerprint({'v': -10})
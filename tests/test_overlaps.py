@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import collections
+import io
+
+from fkett import bezier, overlaps
+
+def square(loop = False, curve = 'curve', offcurves = 2):
+  """A counter-clockwise square with a curved top; with loop, its top right corner crosses itself on the outside."""
+  nodes = [(0, 0, 'line', False), (100, 0, 'line', False)]
+  if loop:
+    nodes += [(100, 110, 'line', False), (110, 100, 'line', False)]
+  else:
+    nodes += [(100, 100, 'line', False)]
+  if offcurves == 2:
+    nodes += [(66, 120, 'offcurve', False), (33, 120, 'offcurve', False)]
+  else:
+    nodes += [(50, 130, 'offcurve', False)]
+  nodes += [(0, 100, curve, True)]
+  return nodes
+
+def nodeTypes(nodes):
+  return set(n[2] for n in nodes)
+
+def test_removes_outside_loop():
+  nodes = square(loop = True)
+  newNodes, loops = overlaps.removeOutsideLoops(nodes)
+  assert loops == 1
+  assert len(newNodes) == len(nodes) - 1
+  assert nodeTypes(newNodes) == {'line', 'offcurve', 'curve'}
+  # the loop ran against the contour, so the area grows by its size
+  assert overlaps.contourArea(newNodes) > overlaps.contourArea(nodes)
+  # the corner is cut at the crossing on the right side
+  assert newNodes[2][0] == 100 and 100 < newNodes[2][1] < 110
+  assert newNodes[-1] == (0, 100, 'curve', True)
+
+def test_clean_contour_is_skipped():
+  stats = collections.Counter()
+  nodes = square()
+  newNodes, loops = overlaps.removeOutsideLoops(nodes, stats = stats)
+  assert (newNodes, loops) == (nodes, 0)
+  assert stats == {'skipped': 1}
+
+def test_open_and_tiny_contours_are_skipped():
+  stats = collections.Counter()
+  nodes = square(loop = True)
+  assert overlaps.removeOutsideLoops(nodes, closed = False, stats = stats) == (nodes, 0)
+  assert overlaps.removeOutsideLoops(nodes[:2], stats = stats) == (nodes[:2], 0)
+  overlaps.removeOutsideLoops(nodes, stats = stats)
+  assert stats == {'skipped': 2, 'processed': 1}
+
+def test_cubic_with_single_offcurve_stays_cubic():
+  newNodes, loops = overlaps.removeOutsideLoops(square(loop = True, offcurves = 1))
+  assert loops == 1
+  assert 'qcurve' not in nodeTypes(newNodes)
+  assert [n[2] for n in newNodes[-3:]] == ['offcurve', 'offcurve', 'curve']
+
+def test_quadratic_stays_quadratic():
+  newNodes, loops = overlaps.removeOutsideLoops(square(loop = True, curve = 'qcurve', offcurves = 1))
+  assert loops == 1
+  assert [n[2] for n in newNodes[-2:]] == ['offcurve', 'qcurve']
+
+def test_elevated_quadratic_is_the_same_curve():
+  quadratic = ((0, 0), (50, 100), (100, 0))
+  cubic = bezier.elevateQuadratic(quadratic)
+  for t in (0.1, 0.5, 0.9):
+    q, c = bezier.pointAt(quadratic, t), bezier.pointAt(cubic, t)
+    assert abs(q[0] - c[0]) < 1e-9 and abs(q[1] - c[1]) < 1e-9
+
+def test_pack_round_trip():
+  contours = [(square(loop = True), True), ([(0, 0, 'line', False), (10, 10, 'line', False)], False)]
+  assert overlaps.unpackContours(overlaps.packContours(contours)) == contours
+  assert overlaps.contoursHash(contours) == overlaps.contoursHash(overlaps.unpackContours(overlaps.packContours(contours)))
+  assert overlaps.contoursHash(contours) != overlaps.contoursHash(contours[:1])
+
+def test_clean_layers_in_order():
+  items = [('clean', [(square(), True)]), ('loop', [(square(), True), (square(loop = True), True)])]
+  stats = collections.Counter()
+  results = list(overlaps.iterCleanLayers(items, 1, stats = stats))
+  assert [key for key, _ in results] == ['clean', 'loop']
+  assert results[0][1] == []
+  assert [(i, loops) for i, _, loops, _ in results[1][1]] == [(1, 1)]
+  assert stats == {'skipped': 2, 'processed': 1}
+
+def test_report_round_trip():
+  contours = [(square(), True), (square(loop = True), True)]
+  newNodes, loops = overlaps.removeOutsideLoops(contours[1][0])
+  changes = [(1, newNodes, loops, overlaps.contourArea(newNodes) - overlaps.contourArea(contours[1][0]))]
+  f = io.StringIO()
+  overlaps.writeReport(f, 'A', 'm01', 'm01', contours, changes)
+  f.seek(0)
+
+  layers = list(overlaps.readReport(f))
+  assert [key for key, _ in layers] == [('A', 'm01')]
+  applied, stale = overlaps.applyReport(contours, layers[0][1])
+  assert stale == []
+  assert applied == changes
+
+def test_report_skips_edited_contours():
+  contours = [(square(loop = True), True)]
+  f = io.StringIO()
+  newNodes, loops = overlaps.removeOutsideLoops(contours[0][0])
+  overlaps.writeReport(f, 'A', 'm01', 'm01', contours, [(0, newNodes, loops, 0)])
+  f.seek(0)
+  records = list(overlaps.readReport(f))[0][1]
+
+  edited = [([(x + 1, y, t, s) for x, y, t, s in contours[0][0]], True)]
+  applied, stale = overlaps.applyReport(edited, records)
+  assert applied == []
+  assert stale == records
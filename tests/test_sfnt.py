@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import struct
+
+import pytest
+
+from fkett import sfnt
+
+from conftest import fvarTable, headTable
+
+def fileChecksum(path):
+  with open(path, 'rb') as f:
+    return sfnt.tableChecksum(f.read())
+
+def checkDirectory(path):
+  """Returns dict( tag: data ) after checking the checksums of every table."""
+  with open(path, 'rb') as f:
+    _, tables = sfnt.readTableDirectory(f)
+    data = dict()
+    for tag, (checksum, offset, length) in tables.items():
+      assert offset % 4 == 0
+      f.seek(offset)
+      data[tag] = f.read(length)
+      if tag == 'head':
+        # the checksum of head is taken with checkSumAdjustment set to 0
+        assert checksum == sfnt.tableChecksum(data[tag][:8] + b'\0\0\0\0' + data[tag][12:])
+      else:
+        assert checksum == sfnt.tableChecksum(data[tag])
+  return data
+
+def test_table_checksum():
+  assert sfnt.tableChecksum(b'\0\0\0\1\0\0\0\2') == 3
+  # zero padded to a multiple of 4
+  assert sfnt.tableChecksum(b'\1') == 0x01000000
+  assert sfnt.tableChecksum(b'\xff\xff\xff\xff\0\0\0\2') == 1
+
+def test_search_parameters():
+  assert sfnt.searchParameters(1) == (16, 0, 0)
+  assert sfnt.searchParameters(9) == (128, 3, 16)
+
+@pytest.mark.parametrize('tag', ['avar', 'name'])
+def test_replace_table(makeFont, tag):
+  tables = {'head': headTable(), 'fvar': fvarTable(['wght']), 'name': b'original name', 'avar': b'old'}
+  path = makeFont(tables)
+  newData = b'a new table, 31 bytes long.....'
+  sfnt.replaceTable(path, tag, newData)
+
+  data = checkDirectory(path)
+  assert sorted(data) == sorted(tables)
+  assert data[tag] == newData
+  for t in tables:
+    if t not in (tag, 'head'):
+      assert data[t] == tables[t]
+  assert data['head'][12:] == tables['head'][12:]
+  assert fileChecksum(path) == sfnt.CHECKSUM_MAGIC
+  assert sfnt.readTable(path, tag) == newData
+
+def test_add_table(makeFont, tmp_path):
+  tables = {'head': headTable(), 'fvar': fvarTable(['wght', 'wdth'])}
+  path = makeFont(tables)
+  output = str(tmp_path / 'output.ttf')
+  sfnt.replaceTable(path, 'avar', b'\0\1\0\0', output)
+
+  data = checkDirectory(output)
+  assert data['avar'] == b'\0\1\0\0'
+  assert data['fvar'] == tables['fvar']
+  assert fileChecksum(output) == sfnt.CHECKSUM_MAGIC
+  # the source is left as it was
+  assert sfnt.readTable(path, 'avar') is None
+
+def test_not_a_font(tmp_path):
+  path = str(tmp_path / 'font.ttc')
+  with open(path, 'wb') as f:
+    f.write(b'ttcf' + struct.pack('>HHHH', 0, 1, 0, 0))
+  with pytest.raises(sfnt.SfntError):
+    sfnt.readTable(path, 'head')
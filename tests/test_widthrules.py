@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from fkett.mockfont import MockFont, MockGlyph, MockLayer, MockMaster
+from fkett.widthrules import WidthExpression, WidthRuleError, WidthRules, loadRules, readRules, targetWidths
+
+def glyphFont(widths):
+  # widths: dict( glyph name: list( width per master ) )
+  font = MockFont()
+  font.masters = [MockMaster(font.counter, 'm01', 'Regular'), MockMaster(font.counter, 'm02', 'Bold')]
+  for name, masterWidths in widths.items():
+    glyph = MockGlyph(name, name)
+    for m, width in zip(font.masters, masterWidths):
+      glyph.layers.append(MockLayer(font.counter, glyph, m.id, width, 0, width))
+    font.glyphs.append(glyph)
+  return font
+
+def test_expressions():
+  assert WidthExpression('master_width * 1.05').evaluate(600) == pytest.approx(630)
+  assert WidthExpression('max(500, round(master_width / 3))').evaluate(1800) == 600
+  assert WidthExpression("glyph_width('zero') + 10").evaluate(0, lambda name: 590) == 600
+
+@pytest.mark.parametrize('source', ['master_width ** 99', '__import__("os")', 'master_width.real', '[1, 2]', 'open("x")', 'master_width if 1 else 2', 'max(1, key = abs)'])
+def test_rejected_expressions(source):
+  with pytest.raises(WidthRuleError):
+    WidthExpression(source)
+
+def test_expression_errors():
+  with pytest.raises(WidthRuleError, match = 'failed'):
+    WidthExpression('master_width / 0').evaluate(600)
+  with pytest.raises(WidthRuleError, match = 'not a number'):
+    WidthExpression("'600'").evaluate(600)
+
+def test_json_rules():
+  rules = readRules('{"space": 600, "/.*\\\\.tf/": "master_width + 10", "/zero.*/": {"Bold": 650}}', 'json')
+  assert len(rules) == 3
+  assert rules.match('space').widthFor('m01', 'Regular') == 600
+  assert rules.match('one.tf').widthFor('m01', 'Regular').source == 'master_width + 10'
+  # the first matching pattern wins
+  assert rules.match('zero.tf').pattern == '/.*\\.tf/'
+  assert rules.match('zero').widthFor('m01', 'Regular') is None
+  assert rules.match('zero').widthFor('m02', 'Bold') == 650
+  assert rules.match('one') is None
+
+def test_csv_rules():
+  rules = readRules('glyph,width,Bold\n# comment\nspace,600,\n/.*\\.tf/,master_width * 1.05,620\n', 'csv')
+  assert len(rules) == 2
+  assert rules.match('space').widths == {'*': 600}
+  assert rules.match('one.tf').widthFor('m02', 'Bold') == 620
+
+def test_names_win_over_patterns():
+  rules = WidthRules([('/.*/', '500'), ('space', '600')])
+  assert rules.match('space').widthFor('m01', 'Regular') == 600
+  assert rules.match('a').widthFor('m01', 'Regular') == 500
+
+@pytest.mark.parametrize('pattern, message', [
+  ('/(?i)zero.*/', 'global flags'),
+  ('/(?P<name>zero)/', 'named groups'),
+  ('/(zero)\\1/', 'backreferences'),
+  ('/(a)?(?(1)b|c)/', 'conditional'),
+  ('/zero(/', 'Invalid pattern'),
+])
+def test_rejected_patterns(pattern, message):
+  with pytest.raises(WidthRuleError, match = message):
+    WidthRules([('/a.*/', '500'), (pattern, '600')])
+
+def test_scoped_flags_and_groups():
+  rules = WidthRules([('/(?i:zero)\\.(tf|osf)/', '600'), ('/(one|two)/', '500')])
+  assert rules.match('ZERO.tf').pattern.startswith('/(?i:zero)')
+  assert rules.match('two').pattern == '/(one|two)/'
+
+def test_invalid_rules():
+  with pytest.raises(WidthRuleError):
+    readRules('[600]', 'json')
+  with pytest.raises(WidthRuleError):
+    readRules('', 'xml')
+  with pytest.raises(WidthRuleError):
+    WidthRules([('a', True)])
+
+def test_target_widths():
+  font = glyphFont({'zero': [590, 640], 'zero.tf': [500, 520], 'a': [480, 500]})
+  rules = WidthRules([('/.*\\.tf/', "glyph_width('zero')"), ('a', {'Bold': 'master_width + 10.4'})])
+  layers, widths = targetWidths(rules, font.glyphs, font.masters)
+  assert [(l.parent.name, l.layerId) for l in layers] == [('zero.tf', 'm01'), ('zero.tf', 'm02'), ('a', 'm02')]
+  assert widths == [590, 640, 510]
+
+def test_target_widths_unknown_glyph():
+  font = glyphFont({'zero.tf': [500, 520]})
+  with pytest.raises(WidthRuleError, match = 'no glyph zero'):
+    targetWidths(WidthRules([('zero.tf', "glyph_width('zero')")]), font.glyphs, font.masters)
+
+def test_load_rules(tmp_path):
+  path = tmp_path / 'widths.csv'
+  path.write_bytes(b'\xef\xbb\xbfglyph,width\nspace,600\n')
+  assert loadRules(str(path)).match('space').widths == {'*': 600}